@@ -0,0 +1,309 @@
+# benchmarks/app_suite.py
+"""End-to-end benchmark suite for the trading app's hot paths.
+
+Builds a throwaway SQLite database from generated fixtures (users, symbols and years of
+HistoricalPrice), serves market data from an in-process synthetic provider, and drives
+the real views through Django's test client. Every scenario reports latency percentiles
+and queries per request; --json saves the results and --compare diffs them against a
+saved run, so numbers can be tracked across commits.
+
+    python benchmarks/app_suite.py
+    python benchmarks/app_suite.py --iterations 200 --json bench.json
+    python benchmarks/app_suite.py --compare bench.json --only home stock_details_warm
+
+Scenarios: home, stock_details_cold (no stored history, empty quote cache),
+stock_details_warm, buy_sell, history_first_page and history_deep_page (an account
+with --transactions rows), ingest (full-history upsert of a new symbol).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_trader.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from trading.api_utils import PriceColumns  # noqa: E402
+from trading.history import encode_cursor, transaction_history  # noqa: E402
+from trading.indicators import reset_indicator_engine  # noqa: E402
+from trading.ingest import upsert_historical_prices  # noqa: E402
+from trading.market_calendar import MARKET_TZ, latest_expected_bar, trading_days_after  # noqa: E402
+from trading.market_data import MarketDataProvider, reset_provider  # noqa: E402
+from trading.models import Holding, Stock, Transaction, UserProfile  # noqa: E402
+from trading.price_store import reset_price_store  # noqa: E402
+
+BENCHMARK_DB = os.path.join(settings.BASE_DIR, 'benchmark_db.sqlite3')
+
+
+# Fixture generators. Prices are a seeded random walk per symbol, so every run (and the
+# synthetic provider) sees the same data for the same arguments.
+
+def trading_days(years, end=None):
+    end = end or latest_expected_bar()
+    return list(trading_days_after(end - timedelta(days=round(365.25 * years)), end))
+
+def synthetic_bars(symbol, days):
+    """(open, high, low, close, volume) arrays for symbol over days, the same on every call."""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(days))))
+    open_ = close * (1 + rng.normal(0, 0.004, len(days)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.006, len(days))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.006, len(days))))
+    volume = rng.integers(100_000, 5_000_000, len(days))
+    return np.round(open_, 2), np.round(high, 2), np.round(low, 2), np.round(close, 2), volume
+
+def price_columns_for(symbol, days):
+    opens, highs, lows, closes, volumes = synthetic_bars(symbol, days)
+    cents = lambda column: [Decimal(f'{value:.2f}') for value in column.tolist()]  # noqa: E731
+    return PriceColumns(list(days), cents(opens), cents(highs), cents(lows), cents(closes), volumes.tolist())
+
+def generate_stocks(prefix, count):
+    return Stock.objects.bulk_create([Stock(symbol=f'{prefix}{i:03d}', name=f'{prefix} Corp {i}') for i in range(count)])
+
+def generate_prices(stocks, years):
+    days = trading_days(years)
+    total = 0
+    for stock in stocks:
+        total += upsert_historical_prices(stock, price_columns_for(stock.symbol, days), batch_size=2000).inserted
+    return total
+
+def generate_users(count, stocks, holdings_per_user, cash=Decimal('1000000.00')):
+    # Scenarios sign in with force_login, so no password hashing here.
+    User.objects.bulk_create([User(username=f'bench{i:05d}', password='!') for i in range(count)])
+    users = list(User.objects.filter(username__startswith='bench').order_by('pk'))
+    profiles = UserProfile.objects.bulk_create([UserProfile(user=user, cash_balance=cash) for user in users])
+    rng = np.random.default_rng(7)
+    holdings = []
+    for profile in profiles:
+        for index in rng.choice(len(stocks), size=min(holdings_per_user, len(stocks)), replace=False).tolist():
+            holdings.append(Holding(user_profile=profile, stock=stocks[index], quantity=int(rng.integers(1, 500))))
+    Holding.objects.bulk_create(holdings, batch_size=2000)
+    return profiles
+
+def generate_transactions(profile, stocks, count, years):
+    """count transactions for profile, spread evenly over the last years years."""
+    rng = np.random.default_rng(11)
+    start = datetime.now(MARKET_TZ) - timedelta(days=365.25 * years)
+    offsets = np.sort(rng.uniform(0, 365.25 * years * 86400, count))
+    stock_index = rng.integers(0, len(stocks), count)
+    # auto_now_add would stamp every row with the current time; history needs them spread out.
+    field = Transaction._meta.get_field('transaction_date')
+    field.auto_now_add = False
+    try:
+        batch = []
+        for offset, index in zip(offsets.tolist(), stock_index.tolist()):
+            batch.append(Transaction(
+                user_profile=profile, stock=stocks[index], transaction_type='BUY' if index % 3 else 'SELL',
+                quantity=1 + index % 20, price=Decimal('100.00'), transaction_date=start + timedelta(seconds=offset),
+            ))
+            if len(batch) == 5000:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        Transaction.objects.bulk_create(batch)
+    finally:
+        field.auto_now_add = True
+    return count
+
+class SyntheticProvider(MarketDataProvider):
+    """Stub market data: the synthetic random walk for any symbol, optionally after a fixed delay."""
+
+    latency = 0.0
+    years = 10
+
+    def daily_history(self, symbol, outputsize='full'):
+        time.sleep(self.latency)
+        days = trading_days(self.years)
+        columns = price_columns_for(symbol.upper(), days)
+        return columns[-100:] if outputsize == 'compact' else columns
+
+    def latest_price(self, symbol):
+        time.sleep(self.latency)
+        return price_columns_for(symbol.upper(), trading_days(0.1))[-1]['close_price']
+
+
+class QueryCounter:
+    """connection.execute_wrapper hook that counts statements without turning on the debug cursor."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(request, iterations):
+    samples = []
+    for i in range(iterations):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = request(i)
+            elapsed = time.perf_counter() - started
+        if getattr(response, 'status_code', 200) >= 400:
+            raise RuntimeError(f'Request {i} failed with {response.status_code}: {response.content[:200]!r}')
+        samples.append((elapsed, counter.count))
+    return samples
+
+def summarize(name, samples, rows=None):
+    seconds = np.array([elapsed for elapsed, _ in samples])
+    queries = np.array([count for _, count in samples])
+    p50, p90, p99 = np.percentile(seconds, [50, 90, 99]) * 1000
+    result = {
+        'scenario': name, 'requests': len(samples),
+        'p50_ms': round(p50, 3), 'p90_ms': round(p90, 3), 'p99_ms': round(p99, 3), 'max_ms': round(seconds.max() * 1000, 3),
+        'per_second': round(len(samples) / seconds.sum(), 1),
+        'queries_mean': round(float(queries.mean()), 2), 'queries_max': int(queries.max()),
+    }
+    if rows:
+        result['rows_per_second'] = round(rows / seconds.sum())
+    return result
+
+
+def build_world(args):
+    started = time.perf_counter()
+    stocks = generate_stocks('S', args.symbols)
+    prices = generate_prices(stocks, args.years)
+    profiles = generate_users(args.users, stocks, args.holdings)
+    heavy = profiles[0]
+    generate_transactions(heavy, stocks, args.transactions, args.years)
+    print(f"Fixtures: {args.users} users, {args.symbols} symbols, {prices} prices, "
+          f"{args.transactions} transactions in {time.perf_counter() - started:.1f}s")
+    return stocks, profiles
+
+def client_for(profile):
+    client = Client()
+    client.force_login(profile.user)
+    return client
+
+def run_scenarios(args, stocks, profiles):
+    results = []
+    wanted = lambda name: not args.only or name in args.only  # noqa: E731
+    client = client_for(profiles[1 % len(profiles)])
+    heavy_client = client_for(profiles[0])
+    warm = stocks[0].symbol
+
+    if wanted('home'):
+        results.append(summarize('home', measure(lambda i: client.get('/home/'), args.iterations)))
+
+    if wanted('stock_details_cold'):
+        cold = generate_stocks('C', args.iterations)
+
+        def cold_request(i):
+            caches['quotes'].clear()
+            return client.get(f'/api/stock_details/{cold[i].symbol}/')
+        results.append(summarize('stock_details_cold', measure(cold_request, args.iterations)))
+
+    if wanted('stock_details_warm'):
+        client.get(f'/api/stock_details/{warm}/')
+        results.append(summarize('stock_details_warm', measure(lambda i: client.get(f'/api/stock_details/{warm}/'), args.iterations)))
+
+    if wanted('buy_sell'):
+        client.get(f'/api/stock_details/{warm}/')  # Quote cached, as it is right after a user looks a stock up
+
+        def trade(i):
+            return client.post('/buy/' if i % 2 == 0 else '/sell/', {'symbol': warm, 'quantity': 1})
+        results.append(summarize('buy_sell', measure(trade, args.iterations)))
+
+    if wanted('history_first_page'):
+        results.append(summarize('history_first_page', measure(lambda i: heavy_client.get('/history/'), args.iterations)))
+
+    if wanted('history_deep_page'):
+        middle = transaction_history(profiles[0])[args.transactions // 2]
+        cursor = encode_cursor(middle)
+        results.append(summarize('history_deep_page', measure(lambda i: heavy_client.get('/history/', {'cursor': cursor}), args.iterations)))
+
+    if wanted('ingest'):
+        new = generate_stocks('I', args.ingest_iterations)
+        days = trading_days(args.years)
+        batches = [price_columns_for(stock.symbol, days) for stock in new]
+        samples = measure(lambda i: upsert_historical_prices(new[i], batches[i], batch_size=2000), args.ingest_iterations)
+        results.append(summarize('ingest', samples, rows=len(days) * args.ingest_iterations))
+    return results
+
+
+def print_results(results, baseline=None):
+    previous = {row['scenario']: row for row in (baseline or {}).get('results', [])}
+    if baseline:
+        print(f"Baseline: {baseline.get('revision')} from {baseline.get('date')}")
+    print(f"{'scenario':<20} {'n':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'req/s':>8} {'queries':>8}  vs baseline p50")
+    for row in results:
+        line = (f"{row['scenario']:<20} {row['requests']:>5} {row['p50_ms']:>9.2f} {row['p90_ms']:>9.2f} "
+                f"{row['p99_ms']:>9.2f} {row['per_second']:>8.1f} {row['queries_mean']:>8.1f}")
+        if row.get('rows_per_second'):
+            line += f"  ({row['rows_per_second']:,} rows/s)"
+        old = previous.get(row['scenario'])
+        if old:
+            line += f"  {100 * (row['p50_ms'] / old['p50_ms'] - 1):+.1f}%"
+            if old['queries_mean'] != row['queries_mean']:
+                line += f" queries {old['queries_mean']} -> {row['queries_mean']}"
+        print(line)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--years', type=float, default=10, help="Years of daily prices per symbol.")
+    parser.add_argument('--holdings', type=int, default=20, help="Holdings per user.")
+    parser.add_argument('--transactions', type=int, default=100_000, help="Transactions in the history scenarios' account.")
+    parser.add_argument('--iterations', type=int, default=50, help="Requests per scenario.")
+    parser.add_argument('--ingest-iterations', type=int, default=5)
+    parser.add_argument('--upstream-latency', type=float, default=0.0, help="Seconds the stub provider waits per call.")
+    parser.add_argument('--only', nargs='+', metavar='SCENARIO')
+    parser.add_argument('--json', metavar='PATH', help="Save the results here.")
+    parser.add_argument('--compare', metavar='PATH', help="A saved --json run to compare against.")
+    args = parser.parse_args()
+
+    SyntheticProvider.latency = args.upstream_latency
+    SyntheticProvider.years = args.years
+    settings.MARKET_DATA_PROVIDER = f'{__name__}.SyntheticProvider'
+    reset_provider()
+    reset_price_store()
+    reset_indicator_engine()
+    setup_test_environment(debug=False)
+    connection.settings_dict['TEST']['NAME'] = BENCHMARK_DB
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        stocks, profiles = build_world(args)
+        results = run_scenarios(args, stocks, profiles)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    if baseline and baseline.get('arguments', {}) | {'json': None, 'compare': None} != vars(args) | {'json': None, 'compare': None}:
+        print("Note: the baseline was run with different arguments.")
+    print_results(results, baseline)
+    if args.json:
+        report = {'revision': git_revision(), 'date': date.today().isoformat(), 'arguments': vars(args), 'results': results}
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
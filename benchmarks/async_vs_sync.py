@@ -0,0 +1,101 @@
+# benchmarks/async_vs_sync.py
+"""Compares concurrent quote lookups on the WSGI (threads + requests) and ASGI (asyncio + pooled aiohttp) paths.
+
+A local stub stands in for Alpha Vantage and answers every request after a fixed delay,
+so the numbers measure how many upstream calls each path keeps in flight, not the network.
+
+    python benchmarks/async_vs_sync.py --lookups 200 --threads 8 --latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_trader.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from trading.api_utils import fetch_current_price  # noqa: E402
+from trading.async_client import aclose_session, afetch_current_price  # noqa: E402
+
+BODY = json.dumps({
+    'Meta Data': {},
+    'Time Series (Daily)': {
+        '2024-07-05': {'1. open': '1.0', '2. high': '1.0', '3. low': '1.0', '4. close': '123.45', '5. volume': '100'},
+    },
+}).encode()
+
+
+def start_stub_upstream(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 1024  # the default backlog of 5 would throttle the async client
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_sync(symbols, threads):
+    # A WSGI worker with `threads` threads: each lookup pins a thread for the whole upstream call.
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(fetch_current_price, symbols))
+
+async def run_async(symbols):
+    try:
+        return await asyncio.gather(*(afetch_current_price(symbol) for symbol in symbols))
+    finally:
+        await aclose_session()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8, help="Threads per WSGI worker.")
+    parser.add_argument('--latency', type=float, default=0.1, help="Stub upstream latency in seconds.")
+    args = parser.parse_args()
+
+    server = start_stub_upstream(args.latency)
+    settings.ALPHA_VANTAGE_URL = f"http://127.0.0.1:{server.server_port}/query"
+    settings.MARKET_DATA_PROVIDER = 'trading.market_data.AlphaVantageProvider'
+    symbols = [f"SYM{i}" for i in range(args.lookups)]
+
+    started = time.perf_counter()
+    assert all(run_sync(symbols, args.threads))
+    sync_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    assert all(asyncio.run(run_async(symbols)))
+    async_seconds = time.perf_counter() - started
+
+    server.shutdown()
+    print(f"{args.lookups} lookups, {args.latency * 1000:.0f} ms upstream latency")
+    print(f"  WSGI, {args.threads} threads: {sync_seconds:6.2f}s  {args.lookups / sync_seconds:8.1f} lookups/s")
+    print(f"  ASGI, 1 thread:   {async_seconds:6.2f}s  {args.lookups / async_seconds:8.1f} lookups/s")
+    print(f"  speedup: {sync_seconds / async_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
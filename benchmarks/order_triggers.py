@@ -0,0 +1,86 @@
+# benchmarks/order_triggers.py
+"""Times the order trigger engine against a scan of every open order, at 100k open orders.
+
+Orders and prices are random and held in memory; fills are counted, not executed, so the
+numbers isolate the cost of deciding which orders a price update triggers.
+
+    python benchmarks/order_triggers.py --orders 100000 --symbols 500 --ticks 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_trader.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from trading.models import Order  # noqa: E402
+from trading.orders import TriggerEngine  # noqa: E402
+
+
+def random_orders(count, symbols, rng):
+    orders = []
+    for order_id in range(1, count + 1):
+        symbol = f'S{rng.randrange(symbols):03d}'
+        side = rng.choice(('BUY', 'SELL'))
+        order_type = rng.choice((Order.LIMIT, Order.STOP, Order.STOP_LIMIT))
+        level = round(100 * rng.uniform(0.7, 1.3), 2)
+        limit = level if order_type != Order.STOP else None
+        stop = level if order_type != Order.LIMIT else None
+        orders.append((order_id, symbol, side, order_type, limit, stop))
+    return orders
+
+
+def crosses(order, price):
+    _, _, side, order_type, limit, stop = order
+    if order_type == Order.LIMIT:
+        return price <= limit if side == 'BUY' else price >= limit
+    return price >= stop if side == 'BUY' else price <= stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--ticks', type=int, default=50_000)
+    parser.add_argument('--scan-ticks', type=int, default=200, help="Ticks to time the full-scan baseline on.")
+    args = parser.parse_args()
+    rng = random.Random(7)
+    orders = random_orders(args.orders, args.symbols, rng)
+    # Prices random-walk around 100 so a steady trickle of orders triggers.
+    prices = {f'S{i:03d}': 100.0 for i in range(args.symbols)}
+    ticks = []
+    for _ in range(args.ticks):
+        symbol = f'S{rng.randrange(args.symbols):03d}'
+        prices[symbol] = round(prices[symbol] * (1 + rng.gauss(0, 0.01)), 2)
+        ticks.append((symbol, prices[symbol]))
+
+    engine = TriggerEngine()
+    started = time.perf_counter()
+    for order in orders:
+        engine.add(*order)
+    print(f"Loaded {len(engine)} open orders in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    triggered = 0
+    for symbol, price in ticks:
+        fills, activated = engine.on_price(symbol, price)
+        triggered += len(fills)
+    elapsed = time.perf_counter() - started
+    print(f"Heaps: {len(ticks)} ticks in {elapsed:.2f}s ({elapsed / len(ticks) * 1e6:.1f} us/tick), "
+          f"{triggered} fills, {len(engine)} orders still open")
+
+    started = time.perf_counter()
+    for symbol, price in ticks[:args.scan_ticks]:
+        sum(1 for order in orders if order[1] == symbol and crosses(order, price))
+    elapsed = time.perf_counter() - started
+    print(f"Full scan: {args.scan_ticks} ticks in {elapsed:.2f}s ({elapsed / args.scan_ticks * 1e6:.1f} us/tick)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/parse_history.py
+"""Times parsing a full-history TIME_SERIES_DAILY response, in rows/sec per stage.
+
+The fixture is a 25-year (6,456 bar) outputsize=full body in Alpha Vantage's format.
+Each stage is timed on its own and for the whole path from response bytes to the
+{date: values} mapping the ingest upsert compares against the table:
+
+    decode      bytes -> dict (stdlib json vs orjson when installed)
+    parse       dict -> rows (per-row strptime + try/except vs column-wise PriceColumns)
+    normalize   rows -> rounded bulk-insert tuples (per-row dicts vs whole columns)
+
+    python benchmarks/parse_history.py --repeat 20
+    python benchmarks/parse_history.py --fixture market_data/IBM.json
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_trader.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from trading import api_utils  # noqa: E402
+from trading.ingest import _normalize, _normalize_columns  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'IBM_full.json.gz')
+
+
+def legacy_parse(data, symbol):
+    """The parser before the column-wise path: strptime and five constructors per row."""
+    historical_data = []
+    for date_str, values in data['Time Series (Daily)'].items():
+        try:
+            historical_data.append({
+                'date': datetime.strptime(date_str, '%Y-%m-%d').date(),
+                'open_price': Decimal(values['1. open']),
+                'high_price': Decimal(values['2. high']),
+                'low_price': Decimal(values['3. low']),
+                'close_price': Decimal(values['4. close']),
+                'volume': int(values['5. volume']),
+            })
+        except Exception as e:
+            print(f"Error processing data for {symbol} on {date_str}: {e}")
+    return historical_data
+
+
+def best(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixture', default=FIXTURE, help="A saved response (.json or .json.gz).")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    opener = gzip.open if args.fixture.endswith('.gz') else open
+    with opener(args.fixture, 'rb') as f:
+        body = f.read()
+    data = json.loads(body)
+    rows = len(data['Time Series (Daily)'])
+    legacy_rows, columns = legacy_parse(data, 'IBM'), api_utils.parse_daily_series(data, 'IBM')
+    assert {row['date']: _normalize(row) for row in legacy_rows} == _normalize_columns(columns)
+
+    stages = [
+        ('decode', 'json', lambda: json.loads(body)),
+        ('decode', 'orjson' if api_utils.orjson else 'json (orjson not installed)', lambda: api_utils.loads(body)),
+        ('parse', 'per-row', lambda: legacy_parse(data, 'IBM')),
+        ('parse', 'column-wise', lambda: api_utils.parse_daily_series(data, 'IBM')),
+        ('normalize', 'per-row', lambda: {row['date']: _normalize(row) for row in legacy_rows}),
+        ('normalize', 'column-wise', lambda: _normalize_columns(columns)),
+        ('end to end', 'before', lambda: {row['date']: _normalize(row) for row in legacy_parse(json.loads(body), 'IBM')}),
+        ('end to end', 'after', lambda: _normalize_columns(api_utils.parse_daily_series(api_utils.loads(body), 'IBM'))),
+    ]
+    print(f"{rows} bars, {len(body) / 1e6:.1f} MB, best of {args.repeat}")
+    for stage, variant, fn in stages:
+        seconds = best(fn, args.repeat)
+        print(f"  {stage:<11} {variant:<30} {seconds * 1000:8.2f} ms  {rows / seconds:12,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,62 @@
-import requests
-import json # Import json to pretty-print the data
-from django.conf import settings # If you're loading from settings
-
-api_key = settings.ALPHA_VANTAGE_API_KEY # Make sure settings is configured for this
-
-symbol = 'IBM'
-url = f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={symbol}&outputsize=compact&apikey={api_key}"
-
-print(f"Requesting URL: {url}")
-response = requests.get(url)
-data = response.json()
-
-# <<< CAREFULLY INSPECT THIS OUTPUT >>>
-print(json.dumps(data, indent=2)) # This will pretty-print the JSON
-
-# Now, try to access the keys you expect
-# What are the top-level keys?
-print("\nTop-level keys in response:")
-for key in data.keys():
-    print(f"- {key}")
-
-# Check for the expected "Time Series" key
-time_series_key = None
-for key in data.keys():
-    if "Time Series" in key:
-        time_series_key = key
-        break
-
-if time_series_key:
-    print(f"\nFound time series data under key: '{time_series_key}'")
-    first_date_data = data[time_series_key][sorted(data[time_series_key].keys(), reverse=True)[0]]
-    print(f"Data for latest date: {first_date_data}")
-    print(f"Close price key name: {first_date_data.keys()}")
-else:
-    print("\n'Time Series' key not found in the response! This is the problem.")
\ No newline at end of file
+# stock_trader/api_test.py
+"""Checks the configured market data provider and, optionally, records Alpha Vantage responses.
+
+    python stock_trader/api_test.py IBM AAPL
+    python stock_trader/api_test.py IBM --record market_data
+
+With --record, the raw TIME_SERIES_DAILY response for each symbol is saved as SYMBOL.json
+in that directory, ready to be served by trading.market_data.ReplayProvider.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_trader.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from trading.api_utils import parse_daily_series  # noqa: E402
+from trading.market_data import AlphaVantageProvider, get_provider  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--record', metavar='DIR', help="Save the raw Alpha Vantage responses here.")
+    parser.add_argument('--outputsize', choices=('compact', 'full'), default='compact')
+    args = parser.parse_args()
+
+    if args.record:
+        provider = AlphaVantageProvider()
+        Path(args.record).mkdir(parents=True, exist_ok=True)
+        for symbol in (s.upper() for s in args.symbols):
+            data = provider.fetch_json(symbol, args.outputsize)
+            rows = parse_daily_series(data, symbol) if data is not None else None
+            if not rows:
+                print(f"{symbol}: nothing recorded")
+                continue
+            path = Path(args.record) / f"{symbol}.json"
+            path.write_text(json.dumps(data, indent=2))
+            print(f"{symbol}: {len(rows)} bars -> {path}")
+        return
+
+    provider = get_provider()
+    print(f"Provider: {settings.MARKET_DATA_PROVIDER}")
+    for symbol in (s.upper() for s in args.symbols):
+        rows = provider.daily_history(symbol, args.outputsize)
+        if not rows:
+            print(f"{symbol}: no data")
+            continue
+        latest = max(rows, key=lambda row: row['date'])
+        print(f"{symbol}: {len(rows)} bars, {min(r['date'] for r in rows)} to {latest['date']}, "
+              f"latest close {latest['close_price']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_trader.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """Django's ASGI app, plus the lifespan protocol so worker shutdown closes the Alpha Vantage pool."""
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+    from trading.async_client import aclose_session
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await aclose_session()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
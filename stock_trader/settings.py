@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'trading.metrics.MetricsMiddleware', # First, so its timings include every other middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -127,3 +128,66 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 ALPHA_VANTAGE_API_KEY = 'AT' 
+ALPHA_VANTAGE_CALLS_PER_MINUTE = 5 # Free-tier quota; sync_market_data stays under it
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+ALPHA_VANTAGE_TIMEOUT = 10 # Seconds
+ALPHA_VANTAGE_MAX_CONNECTIONS = 100 # Keep-alive pool size per worker
+
+# Where quotes and history come from. Use 'trading.market_data.ReplayProvider' to serve
+# recorded SYMBOL.json / SYMBOL.csv files from MARKET_DATA_REPLAY_DIR instead of the network.
+MARKET_DATA_PROVIDER = 'trading.market_data.AlphaVantageProvider'
+MARKET_DATA_REPLAY_DIR = BASE_DIR / 'market_data'
+
+# Set to False when `manage.py sync_market_data --interval ...` keeps history fresh,
+# so the stock details view never blocks on an Alpha Vantage call for it.
+SYNC_HISTORY_IN_REQUESTS = True
+HISTORY_RECHECK_SECONDS = 900 # Seconds before a stock whose latest bar was missing upstream is fetched again
+
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Quotes live in their own cache so every worker process shares them. Point the
+# 'quotes' alias at Redis/Memcached in production; the file backend works on one host.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'quotes': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'quotes',
+    },
+}
+
+QUOTE_CACHE_ALIAS = 'quotes'
+QUOTE_CACHE_TTL = 60 # Seconds a quote is served without going upstream
+QUOTE_CACHE_STALE_TTL = 300 # Extra seconds a quote is served while it refreshes in the background
+QUOTE_CACHE_LOCK_TIMEOUT = 10 # Seconds one fetch may hold the per-symbol lock
+QUOTE_CACHE_FETCH_WORKERS = 8 # Parallel upstream fetches for one batch quote lookup
+QUOTE_CACHE_REFRESH_WORKERS = 2 # Threads per process refreshing stale quotes in the background
+FRAGMENT_CACHE_ALIAS = 'quotes' # Shared cache for rendered page fragments, so a trade in one worker retires them in all
+HOME_FRAGMENT_TTL = 300 # Seconds a user's cached portfolio fragment lives without a trade
+SEARCH_INDEX_CACHE_ALIAS = 'quotes' # Shared cache holding the symbol index version, so every worker sees stock changes
+SEARCH_RESULTS_LIMIT = 10 # Most results /api/search/ returns
+QUOTES_MAX_SYMBOLS = 100 # Largest ?symbols= list /api/quotes/ and /api/quotes/stream/ accept
+QUOTE_STREAM_INTERVAL = 5 # Seconds between polls of each streamed symbol, however many clients watch it
+QUOTE_STREAM_HEARTBEAT = 15 # Seconds of silence before the stream sends a keep-alive comment
+CHART_DEFAULT_POINTS = 1000 # Daily chart points returned when the client doesn't ask for a number
+ORDER_BATCH_MAX_LEGS = 100 # Largest leg list /api/orders/batch/ accepts
+ORDER_STOP_RESERVE_MARGIN = 0.05 # Extra cash a stop buy reserves above its stop, since it fills at the market
+ORDER_MATCHER_RESYNC_SECONDS = 30 # How often the trigger engine reconciles with every OPEN order
+TRANSACTION_HISTORY_PAGE_SIZE = 50 # Rows per page of /history/
+ARCHIVE_TRANSACTIONS_ON_RESET = False # Copy an account's transactions to ArchivedTransaction when it is reset
+TRANSACTION_EXPORT_CHUNK_SIZE = 2000 # Rows per keyset query while streaming /history/export/
+
+# Columnar HistoricalPrice read store: memory-mapped snapshots shared by all worker processes.
+PRICE_STORE_DIR = BASE_DIR / '.cache' / 'prices'
+PRICE_STORE_MAX_SYMBOLS = 256 # Series kept resident per process
+INDICATOR_MEMO_MAX_ENTRIES = 1024 # Memoized (symbol, indicator, params) results per process
+INDICATOR_MAX_WINDOW = 10000 # Largest window or span, in bars, an indicator request may ask for
+
+# Request metrics, served in Prometheus text format at /metrics (per worker process).
+METRICS_TOKEN = None # Bearer token /metrics requires ("Authorization: Bearer <token>"); unset, /metrics is a 404
+METRICS_PROFILE_SAMPLE_RATE = 0 # Fraction of requests run under the sampling profiler; 0 turns it off
+METRICS_PROFILE_INTERVAL = 0.005 # Seconds between stack samples of a profiled request
+METRICS_SLOW_REQUEST_SECONDS = 1.0 # Profiled requests at least this slow have their stacks saved
+METRICS_PROFILE_DIR = BASE_DIR / '.cache' / 'profiles' # Where slow-request profiles (.folded files) go
@@ -0,0 +1,32 @@
+# stock_trader/test_settings.py
+# Run the test suite without MySQL:
+#   python manage.py test --settings=stock_trader.test_settings
+from .settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        # BEGIN IMMEDIATE takes SQLite's write lock up front, the closest it gets to
+        # SELECT ... FOR UPDATE; the concurrent trade tests rely on it.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        # An on-disk test database so threads in TransactionTestCase get their own connections.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'quotes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'quotes',
+    },
+}
+
+PRICE_STORE_DIR = None # Tests that need snapshots pass their own temporary directory
+
+# Tests never touch the network: quotes and history are replayed from recorded files.
+MARKET_DATA_PROVIDER = 'trading.market_data.ReplayProvider'
+MARKET_DATA_REPLAY_DIR = BASE_DIR / 'trading' / 'fixtures' / 'market_data'
@@ -2,7 +2,8 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views # Import Django's auth views
-from trading.views import home_view, logout_view, buy_stock, sell_stock, reset_account, transaction_history_view, get_stock_details
+from trading.views import home_view, logout_view, buy_stock, sell_stock, orders_view, batch_orders_view, cancel_order_view, reset_account, transaction_history_view, export_transactions_view, get_stock_details, quotes_view, search_view, portfolio_view, portfolio_history_view, indicators_view, metrics_view
+from trading.async_views import async_buy_stock, async_sell_stock, async_get_stock_details, quote_stream_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,7 +12,22 @@ urlpatterns = [
     path('home/', home_view, name='home'),
     path('buy/', buy_stock, name='buy_stock'),
     path('sell/', sell_stock, name='sell_stock'),
+    path('api/orders/', orders_view, name='orders'),
+    path('api/orders/batch/', batch_orders_view, name='batch_orders'),
+    path('api/orders/<int:order_id>/cancel/', cancel_order_view, name='cancel_order'),
     path('reset_account/', reset_account, name='reset_account'),
     path('history/', transaction_history_view, name='transaction_history'),
+    path('history/export/', export_transactions_view, name='export_transactions'),
     path('api/stock_details/<str:symbol>/', get_stock_details, name='get_stock_details'),
+    path('api/quotes/', quotes_view, name='quotes'),
+    path('api/search/', search_view, name='search'),
+    path('api/portfolio/', portfolio_view, name='portfolio'),
+    path('api/portfolio/history/', portfolio_history_view, name='portfolio_history'),
+    path('api/indicators/<str:symbol>/', indicators_view, name='indicators'),
+    path('metrics', metrics_view, name='metrics'),
+    # Async variants; serve them from stock_trader.asgi under an ASGI server.
+    path('async/buy/', async_buy_stock, name='async_buy_stock'),
+    path('async/sell/', async_sell_stock, name='async_sell_stock'),
+    path('api/async/stock_details/<str:symbol>/', async_get_stock_details, name='async_get_stock_details'),
+    path('api/quotes/stream/', quote_stream_view, name='quote_stream'),
 ]
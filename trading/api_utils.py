@@ -1,20 +1,36 @@
 # trading/api_utils.py
-import requests
-from datetime import datetime
+import json
+from collections.abc import Sequence
+from datetime import date
 from django.conf import settings
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+from .metrics import timed_upstream
 
-def fetch_daily_historical_data(symbol):
-    """Fetches daily historical data from Alpha Vantage."""
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib decoder gives the same result, a few times slower.
+    orjson = None
+
+SERIES_FIELDS = ('1. open', '2. high', '3. low', '4. close', '5. volume')
+
+
+def loads(payload):
+    """Decodes a JSON body (bytes or str), with orjson when it's installed."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+def daily_series_url(symbol, outputsize):
     api_key = settings.ALPHA_VANTAGE_API_KEY
-    url = f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={symbol}&outputsize=full&apikey={api_key}"
-    response = requests.get(url)
-    data = response.json()
+    base_url = getattr(settings, 'ALPHA_VANTAGE_URL', 'https://www.alphavantage.co/query')
+    return f"{base_url}?function=TIME_SERIES_DAILY&symbol={symbol}&outputsize={outputsize}&apikey={api_key}"
 
+def _time_series(data, symbol):
+    """Returns the daily time series dict from an API response, or None if it's missing."""
     if "Time Series (Daily)" not in data:
         print(f"Error fetching data for {symbol}: {data.get('Note') or data.get('Error Message')}")
         return None
-    
+
     time_series_key = None
     for key in data.keys():
         if "Time Series" in key and "(Daily)" in key: # Make sure this is robust
@@ -24,18 +40,86 @@ def fetch_daily_historical_data(symbol):
     if not time_series_key or time_series_key not in data:
         print(f"DEBUG: 'Time Series (Daily)' key not found in response for {symbol}. Full API Response: {data}")
         return None
+    return data[time_series_key]
+
+def make_price_row(day, open_price, high_price, low_price, close_price, volume):
+    """One HistoricalPrice-shaped dict from the string fields of a daily bar."""
+    return {
+        'date': date.fromisoformat(day),
+        'open_price': Decimal(open_price),
+        'high_price': Decimal(high_price),
+        'low_price': Decimal(low_price),
+        'close_price': Decimal(close_price),
+        'volume': int(volume),
+    }
+
+
+class PriceColumns(Sequence):
+    """Daily bars held as parallel columns in date order.
+
+    Indexing or iterating yields HistoricalPrice-shaped dicts, so it stands in for the list
+    of rows fetch_daily_historical_data used to return; bulk consumers (the ingest upsert)
+    read the columns directly instead.
+    """
+
+    __slots__ = ('dates', 'open_price', 'high_price', 'low_price', 'close_price', 'volume')
+    FIELDS = ('open_price', 'high_price', 'low_price', 'close_price', 'volume')
+
+    def __init__(self, dates, open_price, high_price, low_price, close_price, volume):
+        self.dates = dates
+        self.open_price = open_price
+        self.high_price = high_price
+        self.low_price = low_price
+        self.close_price = close_price
+        self.volume = volume
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = sorted(rows, key=lambda row: row['date'])
+        return cls([row['date'] for row in rows], *([row[field] for row in rows] for field in cls.FIELDS))
+
+    def columns(self):
+        return (self.dates, self.open_price, self.high_price, self.low_price, self.close_price, self.volume)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __iter__(self):
+        keys = ('date',) + self.FIELDS
+        for values in zip(*self.columns()):
+            yield dict(zip(keys, values))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PriceColumns(*(column[index] for column in self.columns()))
+        return dict(zip(('date',) + self.FIELDS, (column[index] for column in self.columns())))
 
+    def __repr__(self):
+        span = f"{self.dates[0]} to {self.dates[-1]}" if self.dates else "empty"
+        return f"<PriceColumns: {len(self)} bars, {span}>"
+
+
+def price_columns(days, opens, highs, lows, closes, volumes):
+    """Converts the string columns of a daily series in bulk, one map() per column.
+
+    Raises ValueError, TypeError or InvalidOperation if any value is malformed; callers
+    fall back to parsing row by row so one bad bar doesn't cost the whole series.
+    """
+    return PriceColumns(
+        list(map(date.fromisoformat, days)),
+        list(map(Decimal, opens)),
+        list(map(Decimal, highs)),
+        list(map(Decimal, lows)),
+        list(map(Decimal, closes)),
+        list(map(int, volumes)),
+    )
+
+def _parse_rows(time_series, symbol):
+    """The per-bar path: skips (and reports) each bar that can't be parsed."""
     historical_data = []
-    for date_str, values in data[time_series_key].items():
+    for date_str, values in time_series.items():
         try:
-            historical_data.append({
-                'date': datetime.strptime(date_str, '%Y-%m-%d').date(),
-                'open_price': Decimal(values['1. open']),
-                'high_price': Decimal(values['2. high']),
-                'low_price': Decimal(values['3. low']),
-                'close_price': Decimal(values['4. close']),
-                'volume': int(values['5. volume']),
-            })
+            historical_data.append(make_price_row(date_str, *(values[field] for field in SERIES_FIELDS)))
         except KeyError as e:
             # This means a *specific sub-key* like '1. open' was missing for a date
             print(f"Missing expected key '{e}' for {symbol} on {date_str}. Skipping this data point.")
@@ -43,29 +127,44 @@ def fetch_daily_historical_data(symbol):
         except Exception as e:
             print(f"Error processing data for {symbol} on {date_str}: {e}")
             continue
-    return historical_data
+    return PriceColumns.from_rows(historical_data)
 
-def fetch_current_price(symbol):
-    """Fetches the latest available daily close price from Alpha Vantage."""
-    api_key = settings.ALPHA_VANTAGE_API_KEY
-    url = f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={symbol}&outputsize=compact&apikey={api_key}"
-    response = requests.get(url)
-    data = response.json()
+def parse_daily_series(data, symbol):
+    """Turns a TIME_SERIES_DAILY response into PriceColumns, oldest bar first.
 
-    if "Time Series (Daily)" not in data:
-        print(f"Error fetching current price for {symbol}: {data.get('Note') or data.get('Error Message')}")
+    The whole series is converted column-wise in one pass; only a response with a
+    malformed bar goes through the slower per-bar path that reports and skips it.
+    """
+    time_series = _time_series(data, symbol)
+    if time_series is None:
         return None
 
-    time_series_key = None
-    for key in data.keys():
-        if "Time Series" in key and "(Daily)" in key: # Make sure this is robust
-            time_series_key = key
-            break
+    days = sorted(time_series)  # ISO dates sort chronologically; the API sends newest first
+    try:
+        bars = [time_series[day] for day in days]
+        return price_columns(days, *([bar[field] for bar in bars] for field in SERIES_FIELDS))
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        return _parse_rows(time_series, symbol)
 
-    if not time_series_key or time_series_key not in data:
-        print(f"DEBUG: 'Time Series (Daily)' key not found in response for {symbol}. Full API Response: {data}")
+def parse_latest_close(data, symbol):
+    """Returns the close of the newest bar in a TIME_SERIES_DAILY response."""
+    time_series = _time_series(data, symbol)
+    if time_series is None:
         return None
+    latest_date = max(time_series.keys())
+    return Decimal(time_series[latest_date]['4. close'])
 
-    latest_date = sorted(data[time_series_key].keys(), reverse=True)[0]
-    return Decimal(data[time_series_key][latest_date]['4. close'])
+@timed_upstream('history')
+def fetch_daily_historical_data(symbol, outputsize='full'):
+    """Fetches daily historical data from the configured market data provider.
 
+    outputsize='compact' returns only the latest 100 data points; 'full' returns the whole history.
+    """
+    from .market_data import get_provider
+    return get_provider().daily_history(symbol, outputsize)
+
+@timed_upstream('quote')
+def fetch_current_price(symbol):
+    """Fetches the latest available daily close price from the configured market data provider."""
+    from .market_data import get_provider
+    return get_provider().latest_price(symbol)
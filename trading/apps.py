@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class TradingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trading'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from .metrics import install_db_hook
+        from .search import stock_deleted, stock_saved
+        connection_created.connect(install_db_hook, dispatch_uid='trading.metrics.install_db_hook')
+        post_save.connect(stock_saved, sender='trading.Stock', dispatch_uid='trading.search.stock_saved')
+        post_delete.connect(stock_deleted, sender='trading.Stock', dispatch_uid='trading.search.stock_deleted')
@@ -0,0 +1,58 @@
+# trading/async_client.py
+import asyncio
+import weakref
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .api_utils import loads
+from .market_data import get_provider
+from .metrics import timed_upstream
+
+# One pooled session per event loop: an aiohttp.ClientSession can't be shared across loops.
+_sessions = weakref.WeakKeyDictionary()
+
+try:
+    import aiohttp
+except ImportError:  # Optional: only the async endpoints need it, so WSGI deployments can skip it.
+    aiohttp = None
+
+
+def get_session():
+    """Returns the keep-alive connection pool for the running event loop."""
+    if aiohttp is None:
+        raise ImproperlyConfigured("The async endpoints need aiohttp; pip install aiohttp.")
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=getattr(settings, 'ALPHA_VANTAGE_MAX_CONNECTIONS', 100)),
+            timeout=aiohttp.ClientTimeout(total=getattr(settings, 'ALPHA_VANTAGE_TIMEOUT', 10)),
+        )
+        _sessions[loop] = session
+    return session
+
+async def aclose_session():
+    """Closes the running loop's pool; stock_trader.asgi calls it on lifespan shutdown."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def aget_json(url, symbol):
+    """GETs url on the pooled session; returns the decoded body, or None if the request failed."""
+    session = get_session()
+    try:
+        async with session.get(url) as response:
+            return loads(await response.read())
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        print(f"Error fetching data for {symbol}: {e}")
+        return None
+
+@timed_upstream('history')
+async def afetch_daily_historical_data(symbol, outputsize='full'):
+    """Async counterpart of api_utils.fetch_daily_historical_data."""
+    return await get_provider().adaily_history(symbol, outputsize)
+
+@timed_upstream('quote')
+async def afetch_current_price(symbol):
+    """Async counterpart of api_utils.fetch_current_price."""
+    return await get_provider().alatest_price(symbol)
@@ -0,0 +1,115 @@
+# trading/async_views.py
+# Async counterparts of the quote-bound views in views.py. Under an ASGI server
+# (e.g. `uvicorn stock_trader.asgi:application`) upstream calls share one pooled
+# HTTP client per worker and no thread is held while Alpha Vantage responds.
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from .async_client import afetch_daily_historical_data
+from .ingest import history_outputsize, save_fetched_history
+from .models import UserProfile, Stock, Holding
+from .quote_cache import aget_quote
+from .quote_stream import get_quote_broadcaster
+from .views import _chart_options, _complete_buy, _complete_sell, _money, _stock_details_payload
+
+
+async def _aget_or_404(model, **lookup):
+    try:
+        return await model.objects.aget(**lookup)
+    except model.DoesNotExist:
+        raise Http404(f"No {model._meta.object_name} matches the given query.")
+
+async def async_sync_stock_history(stock, now=None):
+    """Async counterpart of ingest.sync_stock_history: the fetch is awaited, the DB work runs in a thread."""
+    outputsize = await sync_to_async(history_outputsize)(stock, now)
+    if outputsize is None:
+        return None
+    rows = await afetch_daily_historical_data(stock.symbol, outputsize=outputsize)
+    return await sync_to_async(save_fetched_history)(stock, rows, outputsize, now)
+
+
+@login_required
+@require_POST
+async def async_buy_stock(request):
+    user = await request.auser()
+    user_profile = await _aget_or_404(UserProfile, user=user)
+    stock_symbol = request.POST.get('symbol').upper()
+    quantity = int(request.POST.get('quantity'))
+    stock = await _aget_or_404(Stock, symbol=stock_symbol)
+    current_price = await aget_quote(stock.symbol)
+    return await sync_to_async(_complete_buy)(user_profile, stock, quantity, current_price)
+
+@login_required
+@require_POST
+async def async_sell_stock(request):
+    user = await request.auser()
+    user_profile = await _aget_or_404(UserProfile, user=user)
+    stock_symbol = request.POST.get('symbol').upper()
+    quantity = int(request.POST.get('quantity'))
+    stock = await _aget_or_404(Stock, symbol=stock_symbol)
+    await _aget_or_404(Holding, user_profile=user_profile, stock=stock)
+    current_price = await aget_quote(stock.symbol)
+    return await sync_to_async(_complete_sell)(user_profile, stock, quantity, current_price)
+
+@login_required
+async def async_get_stock_details(request, symbol):
+    """Async API endpoint to get current price and historical data for a stock."""
+    stock = await _aget_or_404(Stock, symbol=symbol.upper())
+    try:
+        chart_options = _chart_options(request)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid chart parameters: {e}'}, status=400)
+    current_price = await aget_quote(stock.symbol)
+    if current_price is None:
+        return JsonResponse({'error': 'Could not fetch current price.'}, status=500)
+    if getattr(settings, 'SYNC_HISTORY_IN_REQUESTS', True):
+        await async_sync_stock_history(stock)
+    return JsonResponse(await sync_to_async(_stock_details_payload)(stock, current_price, chart_options))
+
+
+async def _quote_events(symbols):
+    subscription = get_quote_broadcaster().subscribe(symbols)
+    heartbeat = getattr(settings, 'QUOTE_STREAM_HEARTBEAT', 15)
+    try:
+        while True:
+            updates = await subscription.get(timeout=heartbeat)
+            if not updates:
+                yield ': keep-alive\n\n'  # A comment line keeps proxies from closing an idle stream.
+                continue
+            yield ''.join(
+                f"event: quote\ndata: {json.dumps({'symbol': symbol, 'price': _money(price)})}\n\n"
+                for symbol, price in updates.items()
+            )
+    finally:
+        subscription.close()
+
+@login_required
+async def quote_stream_view(request):
+    """Server-Sent Events stream of quote updates for ?symbols=A,B,C (default: the user's holdings).
+
+    Every client in a worker shares one producer per symbol; see quote_stream.QuoteBroadcaster.
+    Only served under ASGI: WSGI would try to buffer the endless stream and pin a worker
+    thread forever, so there it answers 501 and clients keep to polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Quote streaming needs the ASGI server; poll /api/quotes/ instead.'}, status=501)
+    symbols = list(dict.fromkeys(s.strip().upper() for s in request.GET.get('symbols', '').split(',') if s.strip()))
+    if not symbols:
+        user = await request.auser()
+        symbols = [symbol async for symbol in Holding.objects.filter(user_profile__user=user).values_list('stock__symbol', flat=True)]
+    if not symbols:
+        return JsonResponse({'error': 'Pass one or more symbols, e.g. ?symbols=IBM,AAPL.'}, status=400)
+    max_symbols = getattr(settings, 'QUOTES_MAX_SYMBOLS', 100)
+    if len(symbols) > max_symbols:
+        return JsonResponse({'error': f'At most {max_symbols} symbols per request.'}, status=400)
+    known = {symbol async for symbol in Stock.objects.filter(symbol__in=symbols).values_list('symbol', flat=True)}
+    if not known:
+        return JsonResponse({'error': 'None of those symbols are listed.'}, status=404)
+    response = StreamingHttpResponse(_quote_events([s for s in symbols if s in known]), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream.
+    return response
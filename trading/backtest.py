@@ -0,0 +1,268 @@
+# trading/backtest.py
+import math
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import numpy as np
+from .indicators import INDICATORS
+from .models import STARTING_CASH
+from .price_store import DAY, EPOCH_ORDINAL, PriceSeries, get_price_store
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+OPERATORS = ('crosses_above', 'crosses_below', '>=', '<=', '>', '<')
+CONDITION = re.compile(r'^\s*(.+?)\s+(' + '|'.join(re.escape(op) for op in OPERATORS) + r')\s+(.+?)\s*$')
+OPERAND = re.compile(r'^(?P<name>[a-z_]+)(?:\.(?P<output>[a-z_]+))?(?:\((?P<params>[^)]*)\))?$')
+
+Trade = namedtuple('Trade', ['date', 'symbol', 'transaction_type', 'quantity', 'price'])
+BacktestResult = namedtuple('BacktestResult', ['dates', 'equity', 'cash', 'trades'])
+SweepResult = namedtuple('SweepResult', ['params', 'total_return', 'max_drawdown', 'trades'])
+
+
+class Strategy:
+    """Entry and exit rules, each a list of conditions that must all hold on a bar.
+
+    A condition compares two operands: a price field (close), a number, or an indicator
+    output with parameters, e.g. "sma(window=20) crosses_above sma(window=50)",
+    "rsi(window=14) < 30" or "macd.histogram > 0". Rules may contain {placeholders}
+    that sweep() fills in. Each new position is sized at allocation x the starting cash.
+    """
+
+    def __init__(self, entry, exit, allocation=0.1, starting_cash=STARTING_CASH):
+        self.entry = [entry] if isinstance(entry, str) else list(entry)
+        self.exit = [exit] if isinstance(exit, str) else list(exit)
+        if not 0 < allocation <= 1:
+            raise ValueError("allocation must be between 0 and 1.")
+        self.allocation = allocation
+        self.starting_cash = starting_cash
+
+    def format(self, **params):
+        return Strategy(
+            [rule.format(**params) for rule in self.entry], [rule.format(**params) for rule in self.exit],
+            self.allocation, self.starting_cash,
+        )
+
+    def run(self, universe):
+        return simulate(self, universe)
+
+
+class Universe:
+    """Aligned (bars x symbols) matrices for a symbol universe over a date range.
+
+    Bars are the union of every symbol's trading days; a symbol with no bar on a day has
+    NaN there and can't trade. Indicators are computed over each symbol's full stored
+    history (so warm-up bars before start count) and memoized per operand.
+    """
+
+    def __init__(self, symbols, blocks, start=None, end=None):
+        self.symbols = list(symbols)
+        self.blocks = blocks
+        lo = -np.inf if start is None else start.toordinal() - EPOCH_ORDINAL
+        hi = np.inf if end is None else end.toordinal() - EPOCH_ORDINAL
+        self._in_range = [(blocks[s][DAY] >= lo) & (blocks[s][DAY] <= hi) for s in self.symbols]
+        days = [blocks[s][DAY][mask] for s, mask in zip(self.symbols, self._in_range)]
+        self.days = np.unique(np.concatenate(days)) if days else np.empty(0)
+        self._rows = [np.searchsorted(self.days, d) for d in days]
+        self._operands = {}
+
+    @classmethod
+    def load(cls, symbols, start=None, end=None, store=None):
+        store = store or get_price_store()
+        symbols = [symbol.upper() for symbol in symbols]
+        return cls(symbols, {symbol: np.asarray(store.get(symbol).block) for symbol in symbols}, start, end)
+
+    def __getstate__(self):
+        # Worker processes rebuild their own operand memo.
+        return {key: value for key, value in self.__dict__.items() if key != '_operands'} | {'_operands': {}}
+
+    @property
+    def dates(self):
+        return self.days.astype('datetime64[D]')
+
+    def _scatter(self, per_symbol):
+        matrix = np.full((len(self.days), len(self.symbols)), np.nan)
+        for column, (values, mask, rows) in enumerate(zip(per_symbol, self._in_range, self._rows)):
+            matrix[rows, column] = values[mask]
+        return matrix
+
+    def operand(self, text):
+        """(bars x symbols) values of one operand, or a float for a numeric literal."""
+        text = text.strip()
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        if text not in self._operands:
+            self._operands[text] = self._evaluate(text)
+        return self._operands[text]
+
+    def _evaluate(self, text):
+        match = OPERAND.match(text.replace(' ', ''))
+        if not match:
+            raise ValueError(f"Can't parse operand '{text}'.")
+        name, output, raw_params = match.group('name', 'output', 'params')
+        if name in PRICE_FIELDS and output is None and raw_params is None:
+            row = 1 + PRICE_FIELDS.index(name)
+            return self._scatter([self.blocks[s][row] for s in self.symbols])
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown operand '{name}'. Use a price field ({', '.join(PRICE_FIELDS)}) or an indicator ({', '.join(sorted(INDICATORS))}).")
+        params = dict(pair.split('=', 1) for pair in raw_params.split(',')) if raw_params else {}
+        indicator = INDICATORS[name](**params)
+        columns = []
+        for symbol in self.symbols:
+            outputs, _ = indicator.compute(PriceSeries(symbol, self.blocks[symbol]))
+            if output is None and len(outputs) > 1:
+                raise ValueError(f"{name} has several outputs; pick one of {', '.join(outputs)} (e.g. {name}.{next(iter(outputs))}).")
+            key = output or next(iter(outputs))
+            if key not in outputs:
+                raise ValueError(f"{name} has no output '{key}'.")
+            columns.append(outputs[key])
+        return self._scatter(columns)
+
+
+def _condition(universe, text):
+    match = CONDITION.match(text)
+    if not match:
+        raise ValueError(f"Can't parse condition '{text}'; expected '<operand> <operator> <operand>'.")
+    left, op, right = match.groups()
+    left, right = universe.operand(left), universe.operand(right)
+    shape = (len(universe.days), len(universe.symbols))
+    left, right = np.broadcast_to(left, shape), np.broadcast_to(right, shape)
+    with np.errstate(invalid='ignore'):
+        if op in ('>', '>=', '<', '<='):
+            return {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal}[op](left, right)
+        above = left > right
+        was_above = np.zeros(shape, dtype=bool)
+        was_below = np.zeros(shape, dtype=bool)
+        was_above[1:] = left[:-1] > right[:-1]
+        was_below[1:] = left[:-1] <= right[:-1]
+        if op == 'crosses_above':
+            return above & was_below
+        return (left < right) & was_above
+
+def signals(universe, rules):
+    """Bars x symbols boolean matrix where every rule holds."""
+    result = np.ones((len(universe.days), len(universe.symbols)), dtype=bool)
+    for rule in rules:
+        result &= _condition(universe, rule)
+    return result
+
+def _forward_fill(matrix):
+    index = np.where(np.isnan(matrix), 0, np.arange(len(matrix))[:, None])
+    np.maximum.accumulate(index, axis=0, out=index)
+    return matrix[index, np.arange(matrix.shape[1])]
+
+
+def simulate(strategy, universe):
+    """Runs strategy over universe with the same rules as buy_stock and sell_stock.
+
+    Orders fill at the bar's close in whole shares. A buy is skipped when cash can't cover
+    it, a sell closes the whole position, and exits are processed before entries on each
+    bar so freed cash can fund new positions. Money is tracked in integer cents. Signals
+    are evaluated for every bar and symbol at once; Python only visits bars with an order.
+    """
+    close = universe.operand('close')
+    tradable = ~np.isnan(close)
+    cents = np.where(tradable, np.rint(np.nan_to_num(close) * 100), 0).astype(np.int64)
+    exits = signals(universe, strategy.exit) & tradable
+    entries = signals(universe, strategy.entry) & tradable & ~exits
+
+    bars, count = close.shape
+    held = np.zeros(count, dtype=np.int64)
+    share_deltas = np.zeros((bars, count), dtype=np.int64)
+    cash_deltas = np.zeros(bars, dtype=np.int64)
+    cash = int(round(strategy.starting_cash * 100))
+    budget = int(cash * strategy.allocation)
+    trades = []
+    dates = universe.dates
+
+    def record(bar, columns, kind, quantities):
+        for column, quantity in zip(columns.tolist(), quantities.tolist()):
+            trades.append(Trade(dates[bar].astype(object), universe.symbols[column], kind, quantity, cents[bar, column] / 100))
+
+    for bar in np.flatnonzero((entries | exits).any(axis=1)):
+        selling = np.flatnonzero(exits[bar] & (held > 0))
+        if len(selling):
+            quantities = held[selling]
+            proceeds = int(quantities @ cents[bar, selling])
+            cash += proceeds
+            cash_deltas[bar] += proceeds
+            share_deltas[bar, selling] = -quantities
+            held[selling] = 0
+            record(bar, selling, 'SELL', quantities)
+
+        buying = np.flatnonzero(entries[bar] & (held == 0))
+        if len(buying):
+            quantities = budget // cents[bar, buying]
+            keep = quantities > 0
+            buying, quantities = buying[keep], quantities[keep]
+            costs = quantities * cents[bar, buying]
+            if costs.sum() > cash:
+                # Not everything fits: take orders in symbol order, skipping any cash can't cover.
+                affordable = np.zeros(len(buying), dtype=bool)
+                remaining = cash
+                for i, cost in enumerate(costs.tolist()):
+                    if cost <= remaining:
+                        affordable[i] = True
+                        remaining -= cost
+                buying, quantities, costs = buying[affordable], quantities[affordable], costs[affordable]
+            spent = int(costs.sum())
+            cash -= spent
+            cash_deltas[bar] -= spent
+            share_deltas[bar, buying] = quantities
+            held[buying] = quantities
+            record(bar, buying, 'BUY', quantities)
+
+    holdings = np.cumsum(share_deltas, axis=0)
+    cash_curve = (int(round(strategy.starting_cash * 100)) + np.cumsum(cash_deltas)) / 100
+    marked = np.nan_to_num(_forward_fill(close))
+    equity = cash_curve + (holdings * marked).sum(axis=1)
+    return BacktestResult(dates, equity, cash_curve, trades)
+
+
+def max_drawdown(equity):
+    if not len(equity):
+        return 0.0
+    return float(-(equity / np.maximum.accumulate(equity) - 1).min())
+
+def summarize(result, starting_cash=STARTING_CASH):
+    final = float(result.equity[-1]) if len(result.equity) else float(starting_cash)
+    return {
+        'total_return': final / float(starting_cash) - 1,
+        'max_drawdown': max_drawdown(result.equity),
+        'trades': len(result.trades),
+    }
+
+
+_worker_universe = None
+
+def _init_worker(universe):
+    global _worker_universe
+    from django.apps import apps
+    if not apps.ready:  # Spawned (not forked) workers start without Django configured.
+        import django
+        django.setup()
+    _worker_universe = universe
+
+def _run_one(task):
+    strategy, params = task
+    strategy = strategy.format(**params)
+    stats = summarize(simulate(strategy, _worker_universe), strategy.starting_cash)
+    return SweepResult(params, stats['total_return'], stats['max_drawdown'], stats['trades'])
+
+def sweep(strategy, grid, universe, workers=None):
+    """Runs strategy once per combination of grid's {placeholder: [values]} and summarizes each run.
+
+    Runs are spread over a process pool; every worker receives the universe once and keeps
+    its own indicator memo, so runs that share an operand compute it once per worker.
+    Results come back in grid order.
+    """
+    keys = list(grid)
+    tasks = [(strategy, dict(zip(keys, values))) for values in product(*(grid[key] for key in keys))]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        _init_worker(universe)
+        return [_run_one(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(universe,)) as pool:
+        return list(pool.map(_run_one, tasks, chunksize=max(1, math.ceil(len(tasks) / (workers * 4)))))
@@ -0,0 +1,106 @@
+# trading/charting.py
+from datetime import date
+import numpy as np
+from .price_store import get_price_store
+
+INTERVALS = ('daily', 'weekly', 'monthly')
+
+
+def lttb(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the points to keep.
+
+    Keeps the first and last points and, from each of threshold - 2 buckets in between,
+    the point forming the largest triangle with its neighbours, so peaks and troughs survive.
+    """
+    count = len(xs)
+    if threshold >= count or threshold < 3:
+        return list(range(count))
+    keep = [0]
+    bucket_size = (count - 2) / (threshold - 2)
+    a = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        # The average of the next bucket stands in for the third vertex.
+        span = next_end - next_start or 1
+        avg_x = sum(xs[next_start:next_end]) / span if next_end > next_start else xs[-1]
+        avg_y = sum(ys[next_start:next_end]) / span if next_end > next_start else ys[-1]
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((ax - avg_x) * (ys[i] - ay) - (ax - xs[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        keep.append(best)
+        a = best
+    keep.append(count - 1)
+    return keep
+
+def bucket_ohlc(series, interval):
+    """Aggregates a PriceSeries into weekly or monthly OHLC bars with NumPy reductions.
+
+    Each bar is labelled with the first trading date it contains.
+    """
+    if interval == 'weekly':
+        # Day 0 (1970-01-01) was a Thursday; shift so every week key is its Monday.
+        keys = series.days - (series.days + 3) % 7
+    else:
+        keys = series.dates.astype('datetime64[M]')
+    if not len(series):
+        return {'dates': series.dates, 'open': series.open, 'high': series.high,
+                'low': series.low, 'close': series.close, 'volume': series.volume}
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(series)] - 1
+    return {
+        'dates': series.dates[starts],
+        'open': series.open[starts],
+        'high': np.maximum.reduceat(series.high, starts),
+        'low': np.minimum.reduceat(series.low, starts),
+        'close': series.close[ends],
+        'volume': np.add.reduceat(series.volume, starts),
+    }
+
+
+def parse_chart_options(params, default_points=None):
+    """Reads start/end/interval/points from a QueryDict; raises ValueError on bad input."""
+    options = {
+        'start': date.fromisoformat(params['start']) if params.get('start') else None,
+        'end': date.fromisoformat(params['end']) if params.get('end') else None,
+        'interval': params.get('interval', 'daily'),
+        'points': int(params['points']) if params.get('points') else default_points,
+    }
+    if options['interval'] not in INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(INTERVALS)}.")
+    if options['points'] is not None and options['points'] < 3:
+        raise ValueError("points must be at least 3.")
+    return options
+
+def chart_data(stock, start=None, end=None, interval='daily', points=None):
+    """Chart series for stock, read from the columnar price store.
+
+    Daily closes are downsampled with LTTB to at most points entries; weekly and monthly
+    intervals return OHLC bars, which are already ~5x and ~21x smaller than the daily series.
+    """
+    series = get_price_store().get(stock.symbol).between(start, end)
+
+    if interval == 'daily':
+        dates, closes = series.dates, series.close
+        if points and len(series) > points:
+            keep = lttb(series.days.tolist(), closes.tolist(), points)
+            dates, closes = dates[keep], closes[keep]
+        return {
+            'labels': np.datetime_as_string(dates).tolist(),
+            'close_prices': closes.tolist(),
+        }
+
+    bars = bucket_ohlc(series, interval)
+    return {
+        'labels': np.datetime_as_string(bars['dates']).tolist(),
+        'open_prices': bars['open'].tolist(),
+        'high_prices': bars['high'].tolist(),
+        'low_prices': bars['low'].tolist(),
+        'close_prices': bars['close'].tolist(),
+        'volumes': bars['volume'].astype(np.int64).tolist(),
+    }
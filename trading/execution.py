@@ -0,0 +1,163 @@
+# trading/execution.py
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction as db_transaction
+from django.db.models import F
+from .models import UserProfile, Holding, Transaction
+from .page_cache import invalidate_holdings
+
+CENT = Decimal('0.01')
+
+TradeResult = namedtuple('TradeResult', ['transaction', 'cash_balance'])
+BatchLeg = namedtuple('BatchLeg', ['stock', 'side', 'quantity', 'price'])
+BatchResult = namedtuple('BatchResult', ['transactions', 'cash_balance'])
+
+
+class TradeError(Exception):
+    """A trade that was rejected for a reason the user can fix (shown as a 400)."""
+
+class InsufficientFunds(TradeError):
+    def __init__(self):
+        super().__init__('Insufficient funds.')
+
+class InsufficientShares(TradeError):
+    def __init__(self):
+        super().__init__('Insufficient shares to sell.')
+
+class BatchRejected(TradeError):
+    """Some legs of a batch can't execute, so none did; errors maps leg index to the reason."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('No legs were executed; fix the rejected legs and resubmit.')
+
+
+def _amount(quantity, price):
+    if quantity <= 0:
+        raise TradeError('Quantity must be a positive number of shares.')
+    return (quantity * price).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def _lock_profile(user_profile_id):
+    # Every trade path locks the profile row first and the holding row second, so
+    # concurrent trades on one account queue up instead of deadlocking.
+    return UserProfile.objects.select_for_update().only('user', 'cash_balance', 'reserved_cash').get(pk=user_profile_id)
+
+def execute_buy(user_profile_id, stock, quantity, price, reserved=0):
+    """Debits cash and adds shares atomically; raises InsufficientFunds instead of overdrawing.
+
+    Balances change through conditional F() updates, so the check and the write are one
+    statement and can't be split by a concurrent request. Cash reserved for open orders
+    isn't available; an order filling passes its own reservation as reserved, which is
+    released and may be spent.
+    """
+    cost = _amount(quantity, price)
+    changes = {'cash_balance': F('cash_balance') - cost}
+    if reserved:
+        changes['reserved_cash'] = F('reserved_cash') - reserved
+    with db_transaction.atomic():
+        profile = _lock_profile(user_profile_id)
+        invalidate_holdings(profile.user_id)  # Retires the cached home page fragment on commit
+        debited = UserProfile.objects.filter(
+            pk=user_profile_id, cash_balance__gte=F('reserved_cash') - reserved + cost
+        ).update(**changes)
+        if not debited:
+            raise InsufficientFunds()
+        holding, created = Holding.objects.select_for_update().get_or_create(
+            user_profile_id=user_profile_id, stock=stock, defaults={'quantity': quantity}
+        )
+        if not created:
+            Holding.objects.filter(pk=holding.pk).update(quantity=F('quantity') + quantity)
+        transaction = Transaction.objects.create(
+            user_profile_id=user_profile_id, stock=stock, transaction_type='BUY', quantity=quantity, price=price
+        )
+    return TradeResult(transaction, profile.cash_balance - cost)
+
+def execute_sell(user_profile_id, stock, quantity, price, reserved=0):
+    """Removes shares and credits cash atomically; raises InsufficientShares instead of going short.
+
+    Shares reserved for open sell orders can't be sold, except by the order holding them
+    (reserved is its reservation, released here).
+    """
+    revenue = _amount(quantity, price)
+    changes = {'quantity': F('quantity') - quantity}
+    if reserved:
+        changes['reserved_quantity'] = F('reserved_quantity') - reserved
+    with db_transaction.atomic():
+        profile = _lock_profile(user_profile_id)
+        invalidate_holdings(profile.user_id)  # Retires the cached home page fragment on commit
+        removed = Holding.objects.filter(
+            user_profile_id=user_profile_id, stock=stock, quantity__gte=F('reserved_quantity') - reserved + quantity
+        ).update(**changes)
+        if not removed:
+            raise InsufficientShares()
+        Holding.objects.filter(user_profile_id=user_profile_id, stock=stock, quantity=0).delete()
+        UserProfile.objects.filter(pk=user_profile_id).update(cash_balance=F('cash_balance') + revenue)
+        transaction = Transaction.objects.create(
+            user_profile_id=user_profile_id, stock=stock, transaction_type='SELL', quantity=quantity, price=price
+        )
+    return TradeResult(transaction, profile.cash_balance + revenue)
+
+def execute_batch(user_profile_id, legs):
+    """Executes a list of BatchLegs all-or-nothing, in one transaction with a fixed number of statements.
+
+    Sells fund buys: only the net cash change has to fit in the available (unreserved)
+    balance. Each stock's sell legs together may not exceed its unreserved shares.
+    Holdings are written with one bulk_update, bulk_create and delete, and the
+    Transaction rows with one bulk_create, however many legs there are. Raises
+    BatchRejected for bad legs and InsufficientFunds when the net cost doesn't fit.
+    """
+    errors = {}
+    amounts = []
+    for index, leg in enumerate(legs):
+        try:
+            amounts.append(_amount(leg.quantity, leg.price))
+        except TradeError as e:
+            errors[index] = str(e)
+            amounts.append(Decimal(0))
+    if errors:
+        raise BatchRejected(errors)
+    net_cash = sum(amount if leg.side == 'SELL' else -amount for leg, amount in zip(legs, amounts))
+    stocks = {leg.stock.pk: leg.stock for leg in legs}
+
+    with db_transaction.atomic():
+        profile = _lock_profile(user_profile_id)
+        invalidate_holdings(profile.user_id)  # Retires the cached home page fragment on commit
+        holdings = {
+            holding.stock_id: holding
+            for holding in Holding.objects.select_for_update().filter(user_profile_id=user_profile_id, stock_id__in=stocks)
+        }
+        sold, bought = dict.fromkeys(stocks, 0), dict.fromkeys(stocks, 0)
+        for leg in legs:
+            (sold if leg.side == 'SELL' else bought)[leg.stock.pk] += leg.quantity
+        for index, leg in enumerate(legs):
+            holding = holdings.get(leg.stock.pk)
+            available = holding.quantity - holding.reserved_quantity if holding else 0
+            if leg.side == 'SELL' and sold[leg.stock.pk] > available:
+                errors[index] = str(InsufficientShares())
+        if errors:
+            raise BatchRejected(errors)
+        debited = UserProfile.objects.filter(
+            pk=user_profile_id, cash_balance__gte=F('reserved_cash') - net_cash
+        ).update(cash_balance=F('cash_balance') + net_cash)
+        if not debited:
+            raise InsufficientFunds()
+
+        to_create, to_update, to_delete = [], [], []
+        for stock_id, stock in stocks.items():
+            holding = holdings.get(stock_id)
+            if holding is None:
+                to_create.append(Holding(user_profile_id=user_profile_id, stock=stock, quantity=bought[stock_id]))
+                continue
+            holding.quantity += bought[stock_id] - sold[stock_id]
+            (to_update if holding.quantity else to_delete).append(holding)
+        if to_create:
+            Holding.objects.bulk_create(to_create)
+        if to_update:
+            Holding.objects.bulk_update(to_update, ['quantity'])
+        if to_delete:
+            Holding.objects.filter(pk__in=[holding.pk for holding in to_delete]).delete()
+        transactions = Transaction.objects.bulk_create([
+            Transaction(user_profile_id=user_profile_id, stock=leg.stock, transaction_type=leg.side, quantity=leg.quantity, price=leg.price)
+            for leg in legs
+        ])
+    return BatchResult(transactions, profile.cash_balance + net_cash)
@@ -0,0 +1,90 @@
+# trading/history.py
+import base64
+import csv
+import json
+from datetime import datetime
+from django.db.models import DecimalField, ExpressionWrapper, F, Q
+from .models import Transaction
+
+EXPORT_COLUMNS = ('id', 'transaction_date', 'transaction_type', 'stock__symbol', 'quantity', 'price', 'total_amount')
+
+
+def transaction_history(user_profile):
+    """The user's transactions newest first, with the stock joined and total_amount computed by the database."""
+    return (
+        Transaction.objects.filter(user_profile=user_profile)
+        .select_related('stock')
+        .annotate(total_amount=ExpressionWrapper(
+            F('quantity') * F('price'), output_field=DecimalField(max_digits=20, decimal_places=2)
+        ))
+        .order_by('-transaction_date', '-id')
+    )
+
+
+def encode_cursor(transaction):
+    raw = f"{transaction.transaction_date.isoformat()}|{transaction.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(transaction_date, id) from a cursor made by encode_cursor; raises ValueError if it's malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        when, pk = raw.split('|')
+        return datetime.fromisoformat(when), int(pk)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _older_than(queryset, when, pk):
+    """The rows after (when, pk) in newest-first order: the keyset seek behind every page."""
+    return queryset.filter(Q(transaction_date__lt=when) | Q(transaction_date=when, id__lt=pk))
+
+def history_page(queryset, cursor=None, page_size=50):
+    """One page of a newest-first history and the cursor for the next (older) page, or None.
+
+    Keyset pagination: rows are located by seeking past (transaction_date, id) on the
+    composite index rather than with OFFSET, so page 10,000 costs the same as page 1.
+    """
+    if cursor:
+        queryset = _older_than(queryset, *decode_cursor(cursor))
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+class _Echo:
+    """csv.writer target that hands each formatted line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+def _export_rows(queryset, chunk_size):
+    """EXPORT_COLUMNS tuples for every row of a newest-first history, chunk_size rows per query.
+
+    Each chunk is a keyset page seeking past the last (transaction_date, id) sent, rather
+    than one server-side cursor: memory stays bounded on every backend, including MySQL,
+    whose default cursor buffers the whole result set.
+    """
+    page = queryset
+    while True:
+        rows = list(page.values_list(*EXPORT_COLUMNS)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        pk, when = rows[-1][0], rows[-1][1]
+        page = _older_than(queryset, when, pk)
+
+def iter_csv(queryset, chunk_size=2000):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['id', 'date', 'type', 'symbol', 'quantity', 'price', 'total_amount'])
+    for pk, when, kind, symbol, quantity, price, total in _export_rows(queryset, chunk_size):
+        yield writer.writerow([pk, when.isoformat(), kind, symbol, quantity, f'{price:.2f}', f'{total:.2f}'])
+
+def iter_json_lines(queryset, chunk_size=2000):
+    for pk, when, kind, symbol, quantity, price, total in _export_rows(queryset, chunk_size):
+        yield json.dumps({
+            'id': pk, 'date': when.isoformat(), 'type': kind, 'symbol': symbol,
+            'quantity': quantity, 'price': f'{price:.2f}', 'total_amount': f'{total:.2f}',
+        }) + '\n'
@@ -0,0 +1,254 @@
+# trading/indicators.py
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from django.conf import settings
+from .price_store import get_price_store
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def ewm(x, alpha, initial=None):
+    """Exponentially weighted mean y[t] = (1 - alpha) * y[t-1] + alpha * x[t], without a Python loop.
+
+    y[-1] is initial (x[0] when None, i.e. the series is seeded with its first value). The
+    recursion is solved in closed form with a cumulative sum, in chunks short enough that the
+    (1 - alpha) ** -k weights stay well inside float64 range.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty_like(x)
+    if not len(x):
+        return out
+    prev = x[0] if initial is None else initial
+    if alpha >= 1:
+        return x.copy()
+    decay = 1 - alpha
+    if decay >= 1:  # alpha is too small to register in float64, so the mean never moves off prev
+        out[:] = prev
+        return out
+    chunk = max(1, int(27.0 / -math.log(decay)))  # decay ** -chunk stays below ~1e12
+    for lo in range(0, len(x), chunk):
+        part = x[lo:lo + chunk]
+        powers = decay ** np.arange(1, len(part) + 1)
+        out[lo:lo + len(part)] = powers * (prev + alpha * np.cumsum(part / powers))
+        prev = out[lo + len(part) - 1]
+    return out
+
+def rolling_mean(x, window):
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).mean(axis=1)
+    return out
+
+def rolling_std(x, window):
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window).std(axis=1)
+    return out
+
+
+class Indicator:
+    """A computation over a PriceSeries that can be extended when new bars arrive.
+
+    compute() returns (outputs, state) for the whole series; extend() produces the outputs
+    for bars[start:] given the state left by an earlier call, so appending a bar costs
+    O(window) rather than O(history).
+    """
+    defaults = {}
+
+    def __init__(self, **params):
+        unknown = set(params) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Unknown parameters for {self.name}: {', '.join(sorted(unknown))}.")
+        # Coerce to the default's type: windows are ints, multipliers like Bollinger's k are floats.
+        self.params = {key: type(default)(params.get(key, default)) for key, default in self.defaults.items()}
+        for value in self.params.values():
+            # float('inf') and float('nan') parse, but would put Infinity/NaN in the JSON response.
+            if not math.isfinite(value) or value <= 0:
+                raise ValueError("Indicator parameters must be positive finite numbers.")
+        max_window = getattr(settings, 'INDICATOR_MAX_WINDOW', 10000)
+        for key, value in self.params.items():
+            if isinstance(value, int) and value > max_window:
+                raise ValueError(f"{key} can be at most {max_window} bars.")
+
+    def compute(self, series):
+        return self.extend(series, 0, None)
+
+    def extend(self, series, start, state):
+        raise NotImplementedError
+
+
+class WindowIndicator(Indicator):
+    """Indicators that only look back `lookback` bars: extension recomputes just the tail."""
+
+    def lookback(self):
+        return self.params['window'] - 1
+
+    def extend(self, series, start, state):
+        lo = max(0, start - self.lookback())
+        outputs = self.calculate(series.close[lo:])
+        return {key: values[start - lo:] for key, values in outputs.items()}, None
+
+
+class SMA(WindowIndicator):
+    name = 'sma'
+    defaults = {'window': 20}
+
+    def calculate(self, close):
+        return {'sma': rolling_mean(close, self.params['window'])}
+
+class Bollinger(WindowIndicator):
+    name = 'bollinger'
+    defaults = {'window': 20, 'k': 2.0}
+
+    def calculate(self, close):
+        middle = rolling_mean(close, self.params['window'])
+        width = self.params['k'] * rolling_std(close, self.params['window'])
+        return {'middle': middle, 'upper': middle + width, 'lower': middle - width}
+
+class Volatility(WindowIndicator):
+    """Annualized rolling standard deviation of daily log returns."""
+    name = 'volatility'
+    defaults = {'window': 20}
+
+    def lookback(self):
+        return self.params['window']
+
+    def calculate(self, close):
+        returns = np.full(len(close), np.nan)
+        returns[1:] = np.diff(np.log(close))
+        out = np.full(len(close), np.nan)
+        window = self.params['window']
+        if len(close) > window:
+            out[window:] = sliding_window_view(returns[1:], window).std(axis=1) * math.sqrt(TRADING_DAYS_PER_YEAR)
+        return {'volatility': out}
+
+
+class EMA(Indicator):
+    name = 'ema'
+    defaults = {'window': 20}
+
+    def extend(self, series, start, state):
+        values = ewm(series.close[start:], 2 / (self.params['window'] + 1), state)
+        return {'ema': values}, values[-1] if len(values) else state
+
+class MACD(Indicator):
+    name = 'macd'
+    defaults = {'fast': 12, 'slow': 26, 'signal': 9}
+
+    def extend(self, series, start, state):
+        fast_state, slow_state, signal_state = state or (None, None, None)
+        close = series.close[start:]
+        fast = ewm(close, 2 / (self.params['fast'] + 1), fast_state)
+        slow = ewm(close, 2 / (self.params['slow'] + 1), slow_state)
+        macd = fast - slow
+        signal = ewm(macd, 2 / (self.params['signal'] + 1), signal_state)
+        if not len(close):
+            return {'macd': macd, 'signal': signal, 'histogram': macd - signal}, state
+        return {'macd': macd, 'signal': signal, 'histogram': macd - signal}, (fast[-1], slow[-1], signal[-1])
+
+class RSI(Indicator):
+    """Relative strength index with Wilder's smoothing (alpha = 1 / window)."""
+    name = 'rsi'
+    defaults = {'window': 14}
+
+    def extend(self, series, start, state):
+        previous_close, gain_state, loss_state = state or (None, None, None)
+        close = series.close[start:]
+        if not len(close):
+            return {'rsi': np.empty(0)}, state
+        if previous_close is None:
+            change = np.r_[0.0, np.diff(close)]
+        else:
+            change = np.diff(np.r_[previous_close, close])
+        alpha = 1 / self.params['window']
+        gains = ewm(np.clip(change, 0, None), alpha, gain_state)
+        losses = ewm(np.clip(-change, 0, None), alpha, loss_state)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(losses == 0, 100.0, 100 - 100 / (1 + gains / losses))
+        if previous_close is None:
+            rsi[0] = np.nan
+        return {'rsi': rsi}, (close[-1], gains[-1], losses[-1])
+
+class Drawdown(Indicator):
+    """Fractional decline of the close from its running maximum."""
+    name = 'drawdown'
+
+    def extend(self, series, start, state):
+        close = series.close[start:]
+        peak = np.maximum.accumulate(np.r_[state if state is not None else -np.inf, close])[1:]
+        return {'drawdown': close / peak - 1}, peak[-1] if len(peak) else state
+
+
+INDICATORS = {cls.name: cls for cls in (SMA, EMA, RSI, MACD, Bollinger, Volatility, Drawdown)}
+
+
+class _Memo:
+    __slots__ = ('series', 'length', 'fingerprint', 'outputs', 'state')
+
+
+class IndicatorEngine:
+    """Memoizes indicator outputs per (symbol, indicator, params) for the series they came from.
+
+    The same series object (nothing ingested since) is a straight hit. When the price store
+    returns a longer series whose older bars are unchanged, only the new bars are computed
+    and appended; any other change recomputes from scratch.
+    """
+
+    def __init__(self, store=None, max_entries=1024):
+        self.store = store
+        self.max_entries = max_entries
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(series, length):
+        return hash(series.block[:, :length].tobytes())
+
+    def compute(self, symbol, name, **params):
+        """Returns ({output name: array aligned with the series}, series) for the symbol's full history."""
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{name}'. Choose from {', '.join(sorted(INDICATORS))}.")
+        indicator = INDICATORS[name](**params)
+        series = (self.store or get_price_store()).get(symbol)
+        key = (series.symbol, name, tuple(sorted(indicator.params.items())))
+        with self._lock:
+            memo = self._memo.get(key)
+            if memo is not None:
+                self._memo.move_to_end(key)
+        if memo is not None and memo.series is series:
+            return memo.outputs, series
+
+        if (memo is not None and memo.length <= len(series)
+                and self._fingerprint(series, memo.length) == memo.fingerprint):
+            tail, state = indicator.extend(series, memo.length, memo.state)
+            outputs = {key_: np.concatenate([memo.outputs[key_], tail[key_]]) for key_ in tail}
+        else:
+            outputs, state = indicator.compute(series)
+
+        memo = _Memo()
+        memo.series, memo.length, memo.outputs, memo.state = series, len(series), outputs, state
+        memo.fingerprint = self._fingerprint(series, len(series))
+        with self._lock:
+            self._memo[key] = memo
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return outputs, series
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_indicator_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = IndicatorEngine(max_entries=getattr(settings, 'INDICATOR_MEMO_MAX_ENTRIES', 1024))
+        return _engine
+
+def reset_indicator_engine():
+    global _engine
+    with _engine_lock:
+        _engine = None
@@ -0,0 +1,130 @@
+# trading/ingest.py
+from collections import namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from .api_utils import PriceColumns, fetch_daily_historical_data
+from .market_calendar import latest_expected_bar, trading_days_between
+from .models import HistoricalPrice
+from .price_store import get_price_store
+
+PRICE_FIELDS = ('open_price', 'high_price', 'low_price', 'close_price', 'volume')
+CENT = Decimal('0.01')
+COMPACT_DAYS = 100 # Data points Alpha Vantage returns for outputsize=compact
+
+IngestResult = namedtuple('IngestResult', ['inserted', 'updated', 'skipped'])
+
+
+def _normalize(row):
+    """Rounds prices the way the DecimalField columns store them, so unchanged rows compare equal."""
+    return (
+        Decimal(row['open_price']).quantize(CENT),
+        Decimal(row['high_price']).quantize(CENT),
+        Decimal(row['low_price']).quantize(CENT),
+        Decimal(row['close_price']).quantize(CENT),
+        int(row['volume']),
+    )
+
+def _normalize_columns(columns):
+    """_normalize for a whole PriceColumns at once: {date: (open, high, low, close, volume)}."""
+    rounded = [[price.quantize(CENT) for price in column] for column in columns.columns()[1:5]]
+    return dict(zip(columns.dates, zip(*rounded, columns.volume)))
+
+def upsert_historical_prices(stock, rows, batch_size=1000):
+    """Saves rows (PriceColumns or dicts shaped like fetch_daily_historical_data output) for stock.
+
+    Only new or changed dates are written, with batched bulk_create/bulk_update in one
+    transaction: one SELECT for the stored dates plus one statement per batch.
+    """
+    if isinstance(rows, PriceColumns):
+        incoming = _normalize_columns(rows)
+    else:
+        incoming = {row['date']: _normalize(row) for row in rows}
+    if not incoming:
+        return IngestResult(0, 0, 0)
+
+    with db_transaction.atomic():
+        stored = {}
+        existing_rows = HistoricalPrice.objects.filter(
+            stock=stock, date__gte=min(incoming), date__lte=max(incoming)
+        ).values_list('id', 'date', *PRICE_FIELDS)
+        for pk, date, *values in existing_rows:
+            stored[date] = (pk, tuple(values))
+
+        to_create = []
+        to_update = []
+        for date, values in incoming.items():
+            fields = dict(zip(PRICE_FIELDS, values))
+            current = stored.get(date)
+            if current is None:
+                to_create.append(HistoricalPrice(stock=stock, date=date, **fields))
+            elif current[1] != values:
+                to_update.append(HistoricalPrice(id=current[0], stock=stock, date=date, **fields))
+
+        if to_create:
+            HistoricalPrice.objects.bulk_create(to_create, batch_size=batch_size)
+        if to_update:
+            HistoricalPrice.objects.bulk_update(to_update, PRICE_FIELDS, batch_size=batch_size)
+        if to_create or to_update:
+            # Keep the columnar read store in step once the new rows are visible to other connections.
+            db_transaction.on_commit(lambda: get_price_store().refresh(stock.symbol))
+
+    return IngestResult(len(to_create), len(to_update), len(incoming) - len(to_create) - len(to_update))
+
+
+def choose_outputsize(latest_date, expected_date):
+    """Picks the cheapest Alpha Vantage request that closes the gap, or None when up to date."""
+    if latest_date is None:
+        return 'full'
+    if latest_date >= expected_date:
+        return None
+    if trading_days_between(latest_date, expected_date) < COMPACT_DAYS:
+        return 'compact'
+    return 'full'
+
+def _check_cache():
+    # Shared by every worker, so one fetch for a missing bar covers all of them.
+    return caches[getattr(settings, 'QUOTE_CACHE_ALIAS', 'default')]
+
+def _check_key(stock, expected_date):
+    return f'history-checked:{stock.symbol}:{expected_date.isoformat()}'
+
+def history_outputsize(stock, now=None):
+    """The outputsize sync_stock_history should request for stock, or None when it's current.
+
+    A bar the provider hasn't published yet (or a day the market closed unexpectedly)
+    stays missing after a fetch. So the first caller for (symbol, expected bar) claims the
+    fetch, and everyone else gets None for the next HISTORY_RECHECK_SECONDS. A fetch that
+    fails releases the claim (see save_fetched_history), so only a real gap is held back.
+    """
+    latest_date = HistoricalPrice.objects.filter(stock=stock).order_by('-date').values_list('date', flat=True).first()
+    expected_date = latest_expected_bar(now)
+    outputsize = choose_outputsize(latest_date, expected_date)
+    if outputsize is None:
+        return None
+    if not _check_cache().add(_check_key(stock, expected_date), True, getattr(settings, 'HISTORY_RECHECK_SECONDS', 900)):
+        return None
+    return outputsize
+
+def save_fetched_history(stock, rows, outputsize, now=None):
+    if not rows:
+        print(f"Failed to fetch historical data for {stock.symbol}")
+        # A network error or rate-limit note says nothing about the bar; let the next call retry.
+        _check_cache().delete(_check_key(stock, latest_expected_bar(now)))
+        return None
+    result = upsert_historical_prices(stock, rows)
+    print(f"Saved {outputsize} history for {stock.symbol}: {result.inserted} inserted, {result.updated} updated, {result.skipped} unchanged")
+    return result
+
+def sync_stock_history(stock, now=None, fetcher=None):
+    """Brings stock's HistoricalPrice rows up to the latest completed trading day.
+
+    Weekends and market holidays don't count as missing data. Returns the IngestResult,
+    or None when nothing needed fetching or the fetch failed.
+    """
+    fetcher = fetcher or fetch_daily_historical_data
+    outputsize = history_outputsize(stock, now)
+    if outputsize is None:
+        return None
+    return save_fetched_history(stock, fetcher(stock.symbol, outputsize=outputsize), outputsize, now)
@@ -0,0 +1,61 @@
+# trading/lifecycle.py
+from django.db import connections, transaction as db_transaction
+from django.db.models import CharField, DateTimeField, Value
+from django.utils import timezone
+from .market_calendar import MARKET_TZ
+from .models import ArchivedTransaction, PortfolioSnapshot, Transaction
+
+# ArchivedTransaction columns, in the order archive_transactions selects them from Transaction.
+ARCHIVE_FIELDS = (
+    'original_id', 'user_profile_id', 'stock_id', 'transaction_type', 'quantity', 'price',
+    'transaction_date', 'archived_at', 'reason',
+)
+
+
+def archive_transactions(queryset, reason):
+    """Copies queryset's Transaction rows into ArchivedTransaction with one INSERT ... SELECT."""
+    source = queryset.order_by().values_list(
+        'pk', 'user_profile_id', 'stock_id', 'transaction_type', 'quantity', 'price', 'transaction_date',
+        Value(timezone.now(), output_field=DateTimeField()), Value(reason, output_field=CharField()),
+    )
+    sql, params = source.query.sql_with_params()
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(ArchivedTransaction._meta.get_field(name).column) for name in ARCHIVE_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {quote(ArchivedTransaction._meta.db_table)} ({columns}) {sql}", params)
+        return cursor.rowcount
+
+def delete_in_chunks(queryset, chunk_size=5000, archive=None):
+    """Deletes queryset's rows chunk_size at a time, yielding the count of each chunk.
+
+    Each chunk is found by primary key and removed in its own short transaction, so
+    a large prune never holds locks for long and can be interrupted and rerun.
+    archive(chunk_queryset) runs in the same transaction before each delete.
+    """
+    model = queryset.model
+    last = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        with db_transaction.atomic(using=queryset.db):
+            chunk = model._base_manager.using(queryset.db).filter(pk__in=ids)
+            if archive is not None:
+                archive(chunk)
+            deleted = chunk.delete()[0]
+        last = ids[-1]
+        yield deleted
+
+def prune_transactions(before, archive=False, chunk_size=5000):
+    """Removes Transactions dated before `before` in chunks, copying them to the archive first if asked.
+
+    Only users with a portfolio snapshot on or after before's day lose transactions. Snapshots
+    are built by replaying the live table, so a trade pruned before a snapshot covered it
+    would be missing from that user's history for good.
+    """
+    covered = PortfolioSnapshot.objects.filter(date__gte=before.astimezone(MARKET_TZ).date()).values('user_profile')
+    archiver = (lambda chunk: archive_transactions(chunk, ArchivedTransaction.PRUNE)) if archive else None
+    return delete_in_chunks(
+        Transaction.objects.filter(transaction_date__lt=before, user_profile__in=covered), chunk_size, archiver
+    )
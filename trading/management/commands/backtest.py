@@ -0,0 +1,54 @@
+# trading/management/commands/backtest.py
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from trading.backtest import Strategy, Universe, simulate, summarize, sweep
+from trading.models import Stock
+
+
+class Command(BaseCommand):
+    help = "Backtests entry/exit rules over stored HistoricalPrice data, optionally sweeping parameters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Symbols to trade (default: every Stock).")
+        parser.add_argument('--entry', action='append', required=True,
+                            help='Entry condition, e.g. "sma(window={fast}) crosses_above sma(window={slow})". Repeat to AND several.')
+        parser.add_argument('--exit', action='append', required=True, help="Exit condition; repeat to AND several.")
+        parser.add_argument('--start', help="First day, YYYY-MM-DD.")
+        parser.add_argument('--end', help="Last day, YYYY-MM-DD.")
+        parser.add_argument('--allocation', type=float, default=0.1, help="Fraction of starting cash per new position.")
+        parser.add_argument('--sweep', action='append', default=[], metavar='NAME=V1,V2,...',
+                            help="Values for a {placeholder} in the rules; repeat for a grid.")
+        parser.add_argument('--workers', type=int, default=None, help="Processes for a sweep (default: one per CPU).")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+            grid = {}
+            for item in options['sweep']:
+                name, values = item.split('=', 1)
+                grid[name] = [value for value in values.split(',') if value]
+            strategy = Strategy(options['entry'], options['exit'], allocation=options['allocation'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        symbols = [s.upper() for s in options['symbols']] or list(Stock.objects.order_by('symbol').values_list('symbol', flat=True))
+        started = time.perf_counter()
+        universe = Universe.load(symbols, start, end)
+        self.stdout.write(f"Loaded {len(symbols)} symbols x {len(universe.days)} bars in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        try:
+            if grid:
+                results = sweep(strategy, grid, universe, workers=options['workers'])
+            else:
+                stats = summarize(simulate(strategy, universe))
+        except (KeyError, ValueError) as e:
+            raise CommandError(f"Invalid strategy: {e}")
+        if grid:
+            for result in sorted(results, key=lambda r: r.total_return, reverse=True):
+                params = ' '.join(f"{k}={v}" for k, v in result.params.items())
+                self.stdout.write(f"{params}: return {result.total_return:+.2%} max drawdown {result.max_drawdown:.2%} trades {result.trades}")
+            self.stdout.write(f"Ran {len(results)} backtests in {time.perf_counter() - started:.2f}s")
+        else:
+            self.stdout.write(f"Return {stats['total_return']:+.2%} max drawdown {stats['max_drawdown']:.2%} trades {stats['trades']} ({time.perf_counter() - started:.2f}s)")
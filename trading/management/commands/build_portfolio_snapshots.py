@@ -0,0 +1,31 @@
+# trading/management/commands/build_portfolio_snapshots.py
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from trading.models import UserProfile
+from trading.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = "Writes daily PortfolioSnapshot rows for every account, starting after each account's last snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only build snapshots for these users (default: everyone).")
+        parser.add_argument('--through', help="Last day to snapshot, YYYY-MM-DD (default: the latest market close).")
+
+    def handle(self, *args, **options):
+        try:
+            through = date.fromisoformat(options['through']) if options['through'] else None
+        except ValueError:
+            raise CommandError("--through must be a date in YYYY-MM-DD format.")
+        profiles = UserProfile.objects.select_related('user').order_by('pk')
+        if options['usernames']:
+            profiles = profiles.filter(user__username__in=options['usernames'])
+        started = time.perf_counter()
+        total = 0
+        for profile in profiles.iterator():
+            written = build_snapshots(profile, through=through)
+            total += written
+            if written:
+                self.stdout.write(f"{profile.user.username}: +{written} snapshots")
+        self.stdout.write(f"Wrote {total} snapshots in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,56 @@
+# trading/management/commands/load_universe.py
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from trading.universe import history_files, load_history, load_listing, read_listing
+
+
+class Command(BaseCommand):
+    help = ("Seeds Stock rows from a listing CSV and, optionally, HistoricalPrice rows from one CSV per symbol. "
+            "Rows already stored are kept as they are, so the command can be re-run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('listing', nargs='?', help="Listing CSV (or .csv.gz) with symbol and name columns.")
+        parser.add_argument('--history-dir', help="Directory of SYMBOL.csv (or .csv.gz) daily bar files to import.")
+        parser.add_argument('--workers', type=int, default=None, help="Processes parsing history files (default: one per CPU).")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT (default 5000).")
+        parser.add_argument('--verbose-files', action='store_true', help="Report every history file, not just failures.")
+
+    def handle(self, *args, **options):
+        if not options['listing'] and not options['history_dir']:
+            raise CommandError("Pass a listing file and/or --history-dir.")
+        if options['batch_size'] < 1 or (options['workers'] is not None and options['workers'] < 1):
+            raise CommandError("--batch-size and --workers must be at least 1.")
+        started = time.perf_counter()
+        stocks = 0
+        history = None
+
+        if options['listing']:
+            try:
+                stocks = load_listing(read_listing(options['listing']), batch_size=options['batch_size'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read listing: {e}")
+            self.stdout.write(f"Listing: {stocks} new stocks ({time.perf_counter() - started:.2f}s)")
+
+        if options['history_dir']:
+            if not Path(options['history_dir']).is_dir():
+                raise CommandError(f"{options['history_dir']} is not a directory.")
+            history = load_history(
+                history_files(options['history_dir']),
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                on_file=lambda parsed: self.report(parsed, options['verbose_files']),
+            )
+            if history.unknown:
+                self.stdout.write(f"Skipped {history.unknown} history files for symbols with no Stock row")
+
+        summary = f"Loaded {stocks} new stocks"
+        if history is not None:
+            summary += f" and read {history.rows} bars from {history.files} files ({history.failed} failed)"
+        self.stdout.write(f"{summary} in {time.perf_counter() - started:.2f}s")
+
+    def report(self, parsed, verbose):
+        if parsed.error:
+            self.stderr.write(self.style.ERROR(f"{parsed.symbol}: {parsed.error}"))
+        elif verbose:
+            self.stdout.write(f"{parsed.symbol}: {len(parsed.rows)} bars")
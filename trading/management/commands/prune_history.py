@@ -0,0 +1,61 @@
+# trading/management/commands/prune_history.py
+import time
+from datetime import date, datetime, time as day_start
+from django.core.management.base import BaseCommand, CommandError
+from trading.lifecycle import delete_in_chunks, prune_transactions
+from trading.market_calendar import MARKET_TZ
+from trading.models import HistoricalPrice
+from trading.price_store import get_price_store
+
+
+def _date(value, option):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise CommandError(f"{option} must be a date in YYYY-MM-DD format.")
+
+
+class Command(BaseCommand):
+    help = ("Deletes (or archives) transactions and daily prices older than a cutoff, a chunk at a time "
+            "so the tables stay available. Portfolio history for the pruned period comes from snapshots, so a user's "
+            "transactions are only removed once build_portfolio_snapshots has covered the cutoff day.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions-before', help="Remove transactions before this day, YYYY-MM-DD.")
+        parser.add_argument('--prices-before', help="Remove HistoricalPrice rows before this day, YYYY-MM-DD.")
+        parser.add_argument('--archive', action='store_true', help="Copy transactions to ArchivedTransaction before deleting them.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows per delete transaction (default 5000).")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between chunks to leave room for other writers.")
+
+    def _drain(self, label, chunks, pause):
+        total = 0
+        for deleted in chunks:
+            total += deleted
+            self.stdout.write(f"{label}: {total} removed")
+            if pause:
+                time.sleep(pause)
+        return total
+
+    def handle(self, *args, **options):
+        transactions_before = _date(options['transactions_before'], '--transactions-before')
+        prices_before = _date(options['prices_before'], '--prices-before')
+        if transactions_before is None and prices_before is None:
+            raise CommandError("Pass --transactions-before and/or --prices-before.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        started = time.perf_counter()
+        transactions = prices = 0
+
+        if transactions_before is not None:
+            cutoff = datetime.combine(transactions_before, day_start(), tzinfo=MARKET_TZ)
+            chunks = prune_transactions(cutoff, archive=options['archive'], chunk_size=options['chunk_size'])
+            transactions = self._drain('archived transactions' if options['archive'] else 'transactions', chunks, options['pause'])
+
+        if prices_before is not None:
+            old_prices = HistoricalPrice.objects.filter(date__lt=prices_before)
+            symbols = list(old_prices.order_by().values_list('stock__symbol', flat=True).distinct())
+            prices = self._drain('prices', delete_in_chunks(old_prices, options['chunk_size']), options['pause'])
+            for symbol in symbols:
+                get_price_store().refresh(symbol)
+
+        self.stdout.write(f"Removed {transactions} transactions and {prices} prices in {time.perf_counter() - started:.2f}s")
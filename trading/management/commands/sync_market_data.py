@@ -0,0 +1,63 @@
+# trading/management/commands/sync_market_data.py
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from trading.market_sync import sync_symbols
+from trading.models import Stock
+from trading.orders import get_order_matcher
+
+
+class Command(BaseCommand):
+    help = "Refreshes cached quotes and HistoricalPrice rows for every Stock, once or on a schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Only sync these symbols (default: every Stock).")
+        parser.add_argument('--workers', type=int, default=4, help="Size of the worker thread pool.")
+        parser.add_argument('--rate', type=float, default=getattr(settings, 'ALPHA_VANTAGE_CALLS_PER_MINUTE', 5),
+                            help="Upstream calls allowed per minute across all workers.")
+        parser.add_argument('--retries', type=int, default=3, help="Retries per upstream call.")
+        parser.add_argument('--backoff', type=float, default=2.0, help="Base retry delay in seconds (doubles each retry).")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Seconds between runs; 0 runs once and exits.")
+        parser.add_argument('--no-orders', action='store_true',
+                            help="Don't fill limit and stop orders triggered by the new prices.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['rate'] <= 0:
+            raise CommandError("--workers and --rate must be positive.")
+        while True:
+            self.run_once(options)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def run_once(self, options):
+        stocks = Stock.objects.order_by('symbol')
+        if options['symbols']:
+            stocks = stocks.filter(symbol__in=[s.upper() for s in options['symbols']])
+        started = time.perf_counter()
+        self.match_orders = not options['no_orders']
+        results = sync_symbols(
+            stocks,
+            workers=options['workers'],
+            rate_per_minute=options['rate'],
+            retries=options['retries'],
+            backoff=options['backoff'],
+            on_result=self.report,
+        )
+        failed = sum(1 for r in results if r.error)
+        self.stdout.write(f"Synced {len(results) - failed}/{len(results)} symbols in {time.perf_counter() - started:.2f}s")
+
+    def report(self, index, total, result):
+        if result.history is None:
+            history = "no new history"
+        else:
+            history = f"history +{result.history.inserted} ~{result.history.updated} ={result.history.skipped}"
+        line = f"[{index}/{total}] {result.symbol}: price={result.price} {history} ({result.seconds:.2f}s)"
+        if result.error:
+            self.stderr.write(self.style.ERROR(f"{line} error: {result.error}"))
+        else:
+            self.stdout.write(line)
+        if self.match_orders and result.price is not None:
+            for order in get_order_matcher().on_price(result.symbol, result.price):
+                self.stdout.write(f"  order {order.pk} {order.order_type} {order.side} {order.quantity} {result.symbol}: {order.status.lower()}")
@@ -0,0 +1,89 @@
+# trading/market_calendar.py
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+MARKET_TZ = ZoneInfo('America/New_York')
+MARKET_CLOSE = time(16, 0)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """The n-th given weekday (Mon=0) of a month; n=-1 means the last one."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(day):
+    """Saturday holidays move to Friday, Sunday holidays to Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=None)
+def market_holidays(year):
+    """Regular NYSE full-day closures for a year (one-off closures are not included)."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Presidents' Day
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:  # NYSE doesn't close on Dec 31 for a Saturday New Year's Day
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in market_holidays(day.year)
+
+def previous_trading_day(day):
+    """The last trading day strictly before day."""
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+def latest_expected_bar(now=None):
+    """Date of the newest daily bar that should exist: today once the market has closed."""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    today = now.date()
+    if is_trading_day(today) and now.time() >= MARKET_CLOSE:
+        return today
+    return previous_trading_day(today)
+
+def trading_days_after(start, end):
+    """Yields the trading days after start up to and including end."""
+    day = start + timedelta(days=1)
+    while day <= end:
+        if is_trading_day(day):
+            yield day
+        day += timedelta(days=1)
+
+def trading_days_between(start, end):
+    """Number of trading days after start up to and including end."""
+    return sum(1 for _ in trading_days_after(start, end))
@@ -0,0 +1,166 @@
+# trading/market_data.py
+import asyncio
+import csv
+import gzip
+import os
+import threading
+from operator import itemgetter
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .api_utils import PriceColumns, daily_series_url, loads, parse_daily_series, parse_latest_close, price_columns
+
+COMPACT_ROWS = 100  # Bars Alpha Vantage returns for outputsize=compact
+
+
+def read_price_csv(path):
+    """PriceColumns, oldest first, from a daily bar CSV (.csv or .csv.gz) with a header of
+    date (or timestamp), open, high, low, close, volume in any order.
+
+    Raises ValueError (or InvalidOperation) if the header or a value is malformed.
+    """
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt', newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        day = header.index('date') if 'date' in header else header.index('timestamp')
+        fields = [day] + [header.index(name) for name in ('open', 'high', 'low', 'close', 'volume')]
+        records = sorted((record for record in reader if record), key=itemgetter(day))
+    return price_columns(*([record[i] for record in records] for i in fields))
+
+
+class MarketDataProvider:
+    """Where quotes and daily history come from.
+
+    daily_history() returns rows shaped like HistoricalPrice fields (date, open_price, ...,
+    volume), ideally as api_utils.PriceColumns, and latest_price() a Decimal; both return None when the symbol can't be served.
+    The async variants run the sync ones in a thread unless a provider has a native path.
+    """
+
+    def daily_history(self, symbol, outputsize='full'):
+        raise NotImplementedError
+
+    def latest_price(self, symbol):
+        rows = self.daily_history(symbol, 'compact')
+        return max(rows, key=lambda row: row['date'])['close_price'] if rows else None
+
+    async def adaily_history(self, symbol, outputsize='full'):
+        return await asyncio.to_thread(self.daily_history, symbol, outputsize)
+
+    async def alatest_price(self, symbol):
+        return await asyncio.to_thread(self.latest_price, symbol)
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """TIME_SERIES_DAILY over one pooled, keep-alive requests.Session with a request timeout.
+
+    URL, key, timeout and pool size come from the ALPHA_VANTAGE_* settings. Network and
+    decoding errors are reported and turned into None, like an error body from the API.
+    """
+
+    def __init__(self, timeout=None, max_connections=None):
+        self.timeout = timeout or getattr(settings, 'ALPHA_VANTAGE_TIMEOUT', 10)
+        pool_size = max_connections or getattr(settings, 'ALPHA_VANTAGE_MAX_CONNECTIONS', 100)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch_json(self, symbol, outputsize):
+        """The raw API response body, or None if the request failed."""
+        try:
+            response = self.session.get(daily_series_url(symbol, outputsize), timeout=self.timeout)
+            return loads(response.content)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error fetching data for {symbol}: {e}")
+            return None
+
+    def daily_history(self, symbol, outputsize='full'):
+        data = self.fetch_json(symbol, outputsize)
+        return None if data is None else parse_daily_series(data, symbol)
+
+    def latest_price(self, symbol):
+        data = self.fetch_json(symbol, 'compact')
+        return None if data is None else parse_latest_close(data, symbol)
+
+    async def adaily_history(self, symbol, outputsize='full'):
+        from .async_client import aget_json
+        data = await aget_json(daily_series_url(symbol, outputsize), symbol)
+        if data is None:
+            return None
+        # A full history is thousands of rows; parse it off the event loop.
+        return await asyncio.to_thread(parse_daily_series, data, symbol)
+
+    async def alatest_price(self, symbol):
+        from .async_client import aget_json
+        data = await aget_json(daily_series_url(symbol, 'compact'), symbol)
+        return None if data is None else parse_latest_close(data, symbol)
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves recorded data from a directory, with no network and no rate limit.
+
+    Each symbol is SYMBOL.json (a saved TIME_SERIES_DAILY response) or SYMBOL.csv with a
+    header of date (or timestamp), open, high, low, close, volume. Files are parsed once and
+    re-read only when they change; compact requests get the newest 100 bars.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or getattr(settings, 'MARKET_DATA_REPLAY_DIR'))
+        self._loaded = {}  # symbol -> (path, mtime, PriceColumns)
+        self._lock = threading.Lock()
+
+    def _read(self, path, symbol):
+        if path.suffix == '.json':
+            with open(path, 'rb') as f:
+                return parse_daily_series(loads(f.read()), symbol) or PriceColumns.from_rows([])
+        return read_price_csv(path)
+
+    def _rows(self, symbol):
+        symbol = symbol.upper()
+        for suffix in ('.json', '.csv'):
+            path = self.directory / f"{symbol}{suffix}"
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                loaded = self._loaded.get(symbol)
+            if loaded is None or loaded[:2] != (path, mtime):
+                loaded = (path, mtime, self._read(path, symbol))
+                with self._lock:
+                    self._loaded[symbol] = loaded
+            return loaded[2]
+        print(f"No recorded market data for {symbol} in {self.directory}")
+        return None
+
+    def daily_history(self, symbol, outputsize='full'):
+        rows = self._rows(symbol)
+        if rows is None:
+            return None
+        return rows[-COMPACT_ROWS:] if outputsize == 'compact' else rows
+
+    def latest_price(self, symbol):
+        rows = self._rows(symbol)
+        return rows[-1]['close_price'] if rows else None
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_provider():
+    """The process-wide provider named by the MARKET_DATA_PROVIDER setting (a dotted class path)."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            path = getattr(settings, 'MARKET_DATA_PROVIDER', 'trading.market_data.AlphaVantageProvider')
+            _provider = import_string(path)()
+        return _provider
+
+def reset_provider():
+    """Drops the process-wide provider so the next get_provider() re-reads settings (used by tests)."""
+    global _provider
+    with _provider_lock:
+        _provider = None
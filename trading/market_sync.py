@@ -0,0 +1,114 @@
+# trading/market_sync.py
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import wraps
+from django.db import connections
+from .api_utils import fetch_current_price, fetch_daily_historical_data
+from .ingest import sync_stock_history
+from .quote_cache import refresh_quote, set_quote
+
+SymbolSyncResult = namedtuple('SymbolSyncResult', ['symbol', 'price', 'history', 'seconds', 'error'])
+
+
+class TokenBucket:
+    """Blocking rate limiter shared by all worker threads.
+
+    With the default capacity of 1, calls are spaced evenly at 60/rate_per_minute
+    seconds, so no 60-second window sees more than rate_per_minute calls.
+    """
+
+    def __init__(self, rate_per_minute, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def call_with_retry(func, *args, retries=3, backoff=2.0, sleep=time.sleep, **kwargs):
+    """Calls func until it returns something other than None, sleeping backoff * 2**attempt
+    (with jitter) between attempts. Returns None once retries are exhausted."""
+    for attempt in range(retries + 1):
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            print(f"Attempt {attempt + 1} of {getattr(func, '__name__', func)} failed: {e}")
+            result = None
+        if result is not None:
+            return result
+        if attempt < retries:
+            sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+    return None
+
+
+def _rate_limited(func, bucket):
+    @wraps(func)
+    def call(*args, **kwargs):
+        bucket.acquire()
+        return func(*args, **kwargs)
+    return call
+
+def sync_symbol(stock, history_fetcher, quote_fetcher, retries=3, backoff=2.0, now=None, sleep=time.sleep):
+    """Refreshes one stock's history and cached quote. Never raises; errors land in the result."""
+    started = time.perf_counter()
+    price = history = error = None
+    try:
+        history = sync_stock_history(
+            stock, now=now,
+            fetcher=lambda symbol, outputsize: call_with_retry(
+                history_fetcher, symbol, outputsize=outputsize, retries=retries, backoff=backoff, sleep=sleep),
+        )
+        if history is not None:
+            # The history we just stored already ends with the latest close; reuse it as the quote.
+            price = stock.historicalprice_set.order_by('-date').values_list('close_price', flat=True).first()
+            if price is not None:
+                set_quote(stock.symbol, price)
+        if price is None:
+            price = call_with_retry(refresh_quote, stock.symbol, quote_fetcher, retries=retries, backoff=backoff, sleep=sleep)
+            if price is None:
+                error = 'quote unavailable'
+    except Exception as e:
+        error = str(e)
+    finally:
+        connections.close_all()  # Worker threads each hold their own connection.
+    return SymbolSyncResult(stock.symbol, price, history, time.perf_counter() - started, error)
+
+def sync_symbols(stocks, workers=4, rate_per_minute=5, retries=3, backoff=2.0,
+                 history_fetcher=None, quote_fetcher=None, now=None, on_result=None, sleep=time.sleep):
+    """Syncs every stock on a bounded thread pool, with all upstream calls sharing one rate limit.
+
+    on_result(index, total, result) is called from the calling thread as each symbol finishes.
+    """
+    bucket = TokenBucket(rate_per_minute, sleep=sleep)
+    history_fetcher = _rate_limited(history_fetcher or fetch_daily_historical_data, bucket)
+    quote_fetcher = _rate_limited(quote_fetcher or fetch_current_price, bucket)
+    stocks = list(stocks)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='market-sync') as pool:
+        futures = [
+            pool.submit(sync_symbol, stock, history_fetcher, quote_fetcher, retries, backoff, now, sleep)
+            for stock in stocks
+        ]
+        for index, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            if on_result:
+                on_result(index, len(stocks), result)
+    return results
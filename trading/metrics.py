@@ -0,0 +1,369 @@
+# trading/metrics.py
+import bisect
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Upper bounds (seconds or counts) of the histogram buckets; +Inf is implicit.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+METRICS = {
+    # name: (type, help, buckets for histograms)
+    'http_request_duration_seconds': ('histogram', 'Wall time per request, by view.', SECONDS_BUCKETS),
+    'http_request_db_queries': ('histogram', 'Database queries per request, by view.', COUNT_BUCKETS),
+    'http_request_db_seconds': ('histogram', 'Time spent in database queries per request, by view.', SECONDS_BUCKETS),
+    'http_request_upstream_calls': ('histogram', 'Market data calls per request, by view.', COUNT_BUCKETS),
+    'http_request_cache_events_total': ('counter', 'Quote cache hits and misses seen by each view.', None),
+    'upstream_request_duration_seconds': ('histogram', 'Latency of market data calls, by symbol.', SECONDS_BUCKETS),
+    'upstream_requests_total': ('counter', 'Market data calls, by symbol, kind and outcome.', None),
+    'quote_cache_events_total': ('counter', 'Quote cache lookups by outcome.', None),
+    'slow_request_profiles_total': ('counter', 'Slow requests whose sampled profile was written, by view.', None),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """In-process counters and histograms, rendered in the Prometheus text format.
+
+    Each worker process keeps its own numbers; scrape every worker (or sum them in
+    Prometheus) to see the whole deployment.
+    """
+
+    def __init__(self):
+        self._counters = {}  # (name, label items) -> value
+        self._histograms = {}  # (name, label items) -> Histogram
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRICS[name][2])
+            histogram.observe(value)
+
+    def value(self, name, **labels):
+        """A counter's value, or a histogram's (count, sum); for tests and debugging."""
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key].count, self._histograms[key].sum
+            return self._counters.get(key, 0)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count)) for key, h in self._histograms.items())
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            series = [(labels, value) for (metric, labels), value in (counters if kind == 'counter' else histograms) if metric == name]
+            if not series:
+                continue
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for labels, value in series:
+                labels = dict(labels)
+                if kind == 'counter':
+                    lines.append(f'{name}{_labels(labels)} {value}')
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_labels(labels | {"le": bound})} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {total}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_metrics_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+def reset_metrics_registry():
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+class RequestMetrics:
+    """What one request spent, filled in by the hooks below while it runs."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.upstream_calls = 0
+        self.cache_events = Counter()
+
+
+# Set by MetricsMiddleware for the duration of a request. contextvars follow the request
+# into sync_to_async threads and async tasks, so hooks can find it from anywhere.
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def in_request_context(fn):
+    """Wraps fn so calls from a worker thread (e.g. a ThreadPoolExecutor) count toward the current request."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrappers hook: times every query made while a request is measured."""
+    request = _current.get()
+    if request is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request.db_queries += 1
+        request.db_seconds += time.perf_counter() - started
+
+def install_db_hook(sender, connection, **kwargs):
+    """connection_created receiver: adds db_execute_wrapper to each new database connection."""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+def record_cache_event(event, amount=1):
+    get_metrics_registry().inc('quote_cache_events_total', amount, event=event)
+    request = _current.get()
+    if request is not None:
+        request.cache_events[event] += amount
+
+def _record_upstream(symbol, kind, started, ok):
+    registry = get_metrics_registry()
+    registry.observe('upstream_request_duration_seconds', time.perf_counter() - started, symbol=symbol)
+    registry.inc('upstream_requests_total', symbol=symbol, kind=kind, outcome='ok' if ok else 'error')
+    request = _current.get()
+    if request is not None:
+        request.upstream_calls += 1
+
+def timed_upstream(kind):
+    """Decorates a market data call taking symbol first; records its latency and outcome by symbol."""
+    def decorate(fn):
+        if iscoroutinefunction(fn):
+            async def wrapper(symbol, *args, **kwargs):
+                started, result = time.perf_counter(), None
+                try:
+                    result = await fn(symbol, *args, **kwargs)
+                    return result
+                finally:
+                    _record_upstream(symbol.upper(), kind, started, result is not None)
+        else:
+            def wrapper(symbol, *args, **kwargs):
+                started, result = time.perf_counter(), None
+                try:
+                    result = fn(symbol, *args, **kwargs)
+                    return result
+                finally:
+                    _record_upstream(symbol.upper(), kind, started, result is not None)
+        wrapper.__name__, wrapper.__doc__, wrapper.__wrapped__ = fn.__name__, fn.__doc__, fn
+        return wrapper
+    return decorate
+
+
+class StackSampler:
+    """Samples one thread's Python stack every interval seconds from a background thread.
+
+    Statistical rather than deterministic: the profiled code runs at full speed and the
+    cost is one stack walk per sample. folded() gives the samples in the collapsed-stack
+    format flame graph tools read ("outer;inner;leaf count" per line).
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+def _measured(content, request_metrics, record):
+    """Yields content's chunks with request_metrics current while each is produced, then calls record()."""
+    iterator = iter(content)
+    try:
+        while True:
+            token = _current.set(request_metrics)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+        record()
+
+async def _ameasured(content, request_metrics, record):
+    iterator = aiter(content)
+    try:
+        while True:
+            token = _current.set(request_metrics)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()  # Lets the view's generator clean up (e.g. unsubscribe) on disconnect.
+        record()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class MetricsMiddleware:
+    """Records wall time, queries, market data calls and cache events for every request, by view.
+
+    With METRICS_PROFILE_SAMPLE_RATE above 0, that fraction of sync requests also runs
+    under a StackSampler; any of them slower than METRICS_SLOW_REQUEST_SECONDS has its
+    folded stacks written to METRICS_PROFILE_DIR. Async requests aren't sampled: the
+    view may run on the event loop or in a sync_to_async thread, so the middleware's
+    thread isn't the one to watch. A streaming response is measured until its last chunk
+    is sent, not just until its headers are ready. Put it first in MIDDLEWARE so it sees
+    everything.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics, sampler, started = self._start(sample=True)
+        token = _current.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._record(request, None, request_metrics, sampler, started)
+            raise
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, request_metrics, sampler, started)
+
+    async def __acall__(self, request):
+        request_metrics, sampler, started = self._start(sample=False)
+        token = _current.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self._record(request, None, request_metrics, sampler, started)
+            raise
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, request_metrics, sampler, started)
+
+    def _start(self, sample):
+        sampler = None
+        rate = getattr(settings, 'METRICS_PROFILE_SAMPLE_RATE', 0)
+        if sample and rate and random.random() < rate:
+            sampler = StackSampler(interval=getattr(settings, 'METRICS_PROFILE_INTERVAL', 0.005)).start()
+        return RequestMetrics(), sampler, time.perf_counter()
+
+    def _finish(self, request, response, request_metrics, sampler, started):
+        if not response.streaming:
+            self._record(request, response, request_metrics, sampler, started)
+            return response
+        # Record once the body has been sent, counting the queries made while producing it.
+        record = lambda: self._record(request, response, request_metrics, sampler, started)  # noqa: E731
+        if response.is_async:
+            response.streaming_content = _ameasured(response.streaming_content, request_metrics, record)
+        else:
+            response.streaming_content = _measured(response.streaming_content, request_metrics, record)
+        return response
+
+    def _record(self, request, response, request_metrics, sampler, started):
+        elapsed = time.perf_counter() - started
+        view = _view_name(request)
+        status = response.status_code if response is not None else 500
+        registry = get_metrics_registry()
+        registry.observe('http_request_duration_seconds', elapsed, view=view, method=request.method, status=status)
+        registry.observe('http_request_db_queries', request_metrics.db_queries, view=view)
+        registry.observe('http_request_db_seconds', request_metrics.db_seconds, view=view)
+        registry.observe('http_request_upstream_calls', request_metrics.upstream_calls, view=view)
+        for event, amount in request_metrics.cache_events.items():
+            registry.inc('http_request_cache_events_total', amount, view=view, event=event)
+        if sampler is not None:
+            sampler.stop()
+            if elapsed >= getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', 1.0):
+                self._write_profile(view, elapsed, sampler)
+
+    def _write_profile(self, view, elapsed, sampler):
+        directory = getattr(settings, 'METRICS_PROFILE_DIR', None)
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{view.replace(':', '_').replace('.', '_')}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.folded")
+        with open(path, 'w') as f:
+            f.write(sampler.folded())
+        get_metrics_registry().inc('slow_request_profiles_total', view=view)
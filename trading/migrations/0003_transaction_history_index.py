@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0002_transaction_historicalprice_holding'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user_profile', '-transaction_date', '-id'], name='txn_user_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0003_transaction_history_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historicalprice',
+            index=models.Index(fields=['stock', '-date'], name='hist_stock_date_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user_profile', 'transaction_type', 'stock'], name='txn_user_type_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('cash_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('positions_value', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('total_equity', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('holdings', models.JSONField(default=dict)),
+                ('is_reset', models.BooleanField(default=False)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='trading.userprofile')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('user_profile', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0005_portfolio_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holding',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reserved_cash',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('side', models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], max_length=4)),
+                ('order_type', models.CharField(choices=[('LIMIT', 'Limit'), ('STOP', 'Stop'), ('STOP_LIMIT', 'Stop limit')], max_length=10)),
+                ('quantity', models.PositiveIntegerField()),
+                ('limit_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('stop_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('stop_triggered', models.BooleanField(default=False)),
+                ('reserved_cash', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('reserved_quantity', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('FILLED', 'Filled'), ('CANCELLED', 'Cancelled'), ('REJECTED', 'Rejected')], default='OPEN', max_length=9)),
+                ('fill_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='trading.stock')),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='trading.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='order_status_id_idx'), models.Index(fields=['user_profile', 'status'], name='order_user_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0006_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField()),
+                ('transaction_type', models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], max_length=4)),
+                ('quantity', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transaction_date', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('reason', models.CharField(choices=[('RESET', 'Account reset'), ('PRUNE', 'Pruned')], max_length=5)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='trading.stock')),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='trading.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_profile', '-transaction_date'], name='archive_user_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0007_archived_transaction'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='historicalprice',
+            name='hist_stock_date_desc_idx',
+        ),
+    ]
@@ -1,20 +1,53 @@
 # trading/models.py
-from django.db import models
+from datetime import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.db import models, transaction as db_transaction
 from django.contrib.auth.models import User 
+from .market_calendar import MARKET_TZ
+
+STARTING_CASH = Decimal('10000.00')
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    cash_balance = models.DecimalField(max_digits=15, decimal_places=2, default=10000.00) # Initial cash
+    cash_balance = models.DecimalField(max_digits=15, decimal_places=2, default=STARTING_CASH) # Initial cash
+    reserved_cash = models.DecimalField(max_digits=15, decimal_places=2, default=0) # Held back for open buy orders
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
-    def reset_account(self):
-        """Resets cash and deletes all transactions and holdings."""
-        self.cash_balance = 10000.00 
-        self.save()
-        Transaction.objects.filter(user_profile=self).delete()
-        Holding.objects.filter(user_profile=self).delete()
+    def reset_account(self, archive=None):
+        """Resets cash, cancels open orders and clears transactions and holdings, all or nothing.
+
+        With archive (default: the ARCHIVE_TRANSACTIONS_ON_RESET setting) the transactions are
+        copied to ArchivedTransaction first. Each table is cleared with a single DELETE: nothing
+        references these models and no signal watches them, so delete() never loads the rows.
+        """
+        from .lifecycle import archive_transactions
+        from .page_cache import invalidate_holdings
+        if archive is None:
+            archive = getattr(settings, 'ARCHIVE_TRANSACTIONS_ON_RESET', False)
+        with db_transaction.atomic():
+            # Updating the profile first takes its row lock, the one every trade takes first,
+            # so a concurrent trade waits for the reset instead of landing half-way through it.
+            UserProfile.objects.filter(pk=self.pk).update(cash_balance=STARTING_CASH, reserved_cash=0)
+            self.cash_balance, self.reserved_cash = STARTING_CASH, 0
+            Order.objects.filter(user_profile=self, status=Order.OPEN).update(status=Order.CANCELLED, reserved_cash=0, reserved_quantity=0)
+            transactions = Transaction.objects.filter(user_profile=self)
+            if archive:
+                archive_transactions(transactions, ArchivedTransaction.RESET)
+            transactions.delete()
+            # Buys archived by a prune count toward cost basis; the old account's must stop counting.
+            ArchivedTransaction.objects.filter(user_profile=self, reason=ArchivedTransaction.PRUNE).update(reason=ArchivedTransaction.RESET)
+            Holding.objects.filter(user_profile=self).delete()
+            # Snapshots from today on described the old account; a reset marker restarts the history.
+            today = datetime.now(MARKET_TZ).date()
+            PortfolioSnapshot.objects.filter(user_profile=self, date__gte=today).delete()
+            PortfolioSnapshot.objects.create(
+                user_profile=self, date=today, cash_balance=STARTING_CASH, positions_value=0,
+                total_equity=STARTING_CASH, holdings={}, is_reset=True,
+            )
+            invalidate_holdings(self.user_id)
 
 
 class Stock(models.Model):
@@ -36,7 +69,7 @@ class HistoricalPrice(models.Model):
 
     class Meta:
         unique_together = ('stock', 'date') # Ensure no duplicate prices for a stock on a given day
-        ordering = ['date']
+        ordering = ['date'] # The unique (stock, date) index also serves the latest bar, scanned backwards
 
     def __str__(self):
         return f"{self.stock.symbol} - {self.date}: {self.close_price}"
@@ -45,6 +78,7 @@ class Holding(models.Model):
     user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=0)
+    reserved_quantity = models.PositiveIntegerField(default=0) # Shares promised to open sell orders
 
     class Meta:
         unique_together = ('user_profile', 'stock') # Each user holds a stock once
@@ -64,6 +98,98 @@ class Transaction(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2) # Price at time of transaction
     transaction_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Serves the newest-first, cursor-paginated history for one user.
+            models.Index(fields=['user_profile', '-transaction_date', '-id'], name='txn_user_date_id_idx'),
+            # Per-stock buy totals for the portfolio's average cost.
+            models.Index(fields=['user_profile', 'transaction_type', 'stock'], name='txn_user_type_stock_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user_profile.user.username} {self.transaction_type} {self.quantity} of {self.stock.symbol} at {self.price}"
 
+
+class ArchivedTransaction(models.Model):
+    """A Transaction moved out of the live table by an archiving reset or the prune_history command."""
+    RESET, PRUNE = 'RESET', 'PRUNE'
+    REASONS = (
+        (RESET, 'Account reset'),
+        (PRUNE, 'Pruned'),
+    )
+    original_id = models.BigIntegerField() # The Transaction's primary key
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
+    transaction_type = models.CharField(max_length=4, choices=Transaction.TRANSACTION_TYPES)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_date = models.DateTimeField()
+    archived_at = models.DateTimeField()
+    reason = models.CharField(max_length=5, choices=REASONS)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_profile', '-transaction_date'], name='archive_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_profile.user.username} {self.transaction_type} {self.quantity} of {self.stock.symbol} at {self.price} (archived)"
+
+
+class PortfolioSnapshot(models.Model):
+    """An account's value at the close of one day, written by the build_portfolio_snapshots command."""
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    date = models.DateField()
+    cash_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    positions_value = models.DecimalField(max_digits=15, decimal_places=2)
+    total_equity = models.DecimalField(max_digits=15, decimal_places=2)
+    holdings = models.JSONField(default=dict) # {symbol: quantity} at the close, so later days resume from here
+    is_reset = models.BooleanField(default=False) # The account was reset to STARTING_CASH on this day
+
+    class Meta:
+        unique_together = ('user_profile', 'date') # Also the index behind the history endpoint's range scan
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.user_profile.user.username} {self.date}: {self.total_equity}"
+
+
+class Order(models.Model):
+    """A resting limit, stop or stop-limit order, filled by the trigger engine in orders.py."""
+    LIMIT, STOP, STOP_LIMIT = 'LIMIT', 'STOP', 'STOP_LIMIT'
+    ORDER_TYPES = (
+        (LIMIT, 'Limit'),
+        (STOP, 'Stop'),
+        (STOP_LIMIT, 'Stop limit'),
+    )
+    OPEN, FILLED, CANCELLED, REJECTED = 'OPEN', 'FILLED', 'CANCELLED', 'REJECTED'
+    STATUSES = (
+        (OPEN, 'Open'),
+        (FILLED, 'Filled'),
+        (CANCELLED, 'Cancelled'),
+        (REJECTED, 'Rejected'), # Triggered, but cash or shares no longer covered the fill
+    )
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE)
+    side = models.CharField(max_length=4, choices=Transaction.TRANSACTION_TYPES)
+    order_type = models.CharField(max_length=10, choices=ORDER_TYPES)
+    quantity = models.PositiveIntegerField()
+    limit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    stop_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    stop_triggered = models.BooleanField(default=False) # A stop-limit whose stop was hit now rests as a limit
+    reserved_cash = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    reserved_quantity = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=9, choices=STATUSES, default=OPEN)
+    fill_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The trigger engine loads open orders it hasn't seen yet by id.
+            models.Index(fields=['status', 'id'], name='order_status_id_idx'),
+            models.Index(fields=['user_profile', 'status'], name='order_user_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_profile.user.username} {self.order_type} {self.side} {self.quantity} of {self.stock.symbol} ({self.status})"
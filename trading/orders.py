@@ -0,0 +1,324 @@
+# trading/orders.py
+import heapq
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import count
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from .execution import InsufficientFunds, InsufficientShares, TradeError, _amount, _lock_profile, execute_buy, execute_sell
+from .models import Holding, Order, UserProfile
+
+# Each book triggers an order when sign * price reaches sign * level, so every book can be a
+# min-heap keyed on sign * level and a price update only pops the orders that cross.
+BOOK_SIGNS = {
+    ('BUY', 'limit'): -1,  # price <= limit
+    ('SELL', 'limit'): 1,  # price >= limit
+    ('BUY', 'stop'): 1,  # price >= stop
+    ('SELL', 'stop'): -1,  # price <= stop
+}
+
+# Discarded orders a TriggerEngine tolerates in its heaps before rebuilding them.
+COMPACT_MIN_DEAD = 1024
+
+
+class TriggerEngine:
+    """Per-symbol heaps of resting orders keyed by the price that sets them off.
+
+    on_price() pops only the orders whose level the price has crossed, so a quote costs
+    O(k log n) for k triggered orders instead of a scan of every open order. Discarded
+    orders leave their heap entry behind until it reaches the top, or until the dead
+    entries outnumber the live ones and the heaps are rebuilt without them.
+    """
+
+    def __init__(self):
+        self._books = {}  # symbol -> {(side, kind): heap of (key, seq, order id)}
+        self._orders = {}  # live order id -> (symbol, side, order_type, limit level)
+        self._sequence = count()  # Ties trigger in arrival order
+        self._dead = 0  # Heap entries of discarded orders
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id):
+        return order_id in self._orders
+
+    def _push(self, symbol, side, kind, level, order_id):
+        sign = BOOK_SIGNS[(side, kind)]
+        book = self._books.setdefault(symbol, {})
+        heapq.heappush(book.setdefault((side, kind), []), (sign * level, next(self._sequence), order_id))
+
+    def add(self, order_id, symbol, side, order_type, limit_price=None, stop_price=None, stop_triggered=False):
+        limit = None if limit_price is None else float(limit_price)
+        self._orders[order_id] = (symbol, side, order_type, limit)
+        if order_type == Order.LIMIT or (order_type == Order.STOP_LIMIT and stop_triggered):
+            self._push(symbol, side, 'limit', limit, order_id)
+        else:
+            self._push(symbol, side, 'stop', float(stop_price), order_id)
+
+    def order_ids(self):
+        return self._orders.keys()
+
+    def discard(self, order_id):
+        if self._orders.pop(order_id, None) is None:
+            return
+        self._dead += 1
+        if self._dead > max(COMPACT_MIN_DEAD, len(self._orders)):
+            self._compact()
+
+    def _compact(self):
+        for symbol in list(self._books):
+            book = self._books[symbol]
+            for key in list(book):
+                live = [entry for entry in book[key] if entry[2] in self._orders]
+                heapq.heapify(live)
+                if live:
+                    book[key] = live
+                else:
+                    del book[key]
+            if not book:
+                del self._books[symbol]
+        self._dead = 0
+
+    def _pop_crossed(self, symbol, side, kind, price):
+        heap = self._books.get(symbol, {}).get((side, kind))
+        crossed = []
+        if not heap:
+            return crossed
+        sign = BOOK_SIGNS[(side, kind)]
+        threshold = sign * price
+        while heap and heap[0][0] <= threshold:
+            order_id = heapq.heappop(heap)[2]
+            if order_id in self._orders:
+                crossed.append(order_id)
+            else:
+                self._dead -= 1
+        return crossed
+
+    def on_price(self, symbol, price):
+        """Returns (order ids to fill now, stop-limit ids whose stop was hit) for a new price."""
+        price = float(price)
+        fills, activated = [], []
+        for side in ('BUY', 'SELL'):
+            for order_id in self._pop_crossed(symbol, side, 'stop', price):
+                _, _, order_type, limit = self._orders[order_id]
+                if order_type == Order.STOP:
+                    fills.append(order_id)
+                else:
+                    activated.append(order_id)
+                    self._push(symbol, side, 'limit', limit, order_id)
+            fills.extend(self._pop_crossed(symbol, side, 'limit', price))
+        for order_id in fills:
+            del self._orders[order_id]
+        return fills, activated
+
+
+def _decimal(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise TradeError(f'{name} must be a number.')
+    if not value.is_finite() or value <= 0:
+        raise TradeError(f'{name} must be a positive price.')
+    return value
+
+def place_order(user_profile_id, stock, side, order_type, quantity, limit_price=None, stop_price=None):
+    """Validates an order, reserves the cash or shares it needs and saves it as OPEN.
+
+    Buys reserve quantity x the limit price. A plain stop buy fills at the market once the
+    stop is hit, at or above it, so it reserves ORDER_STOP_RESERVE_MARGIN above the stop;
+    the fill spends the reservation plus any free cash. Sells reserve the shares. Raises TradeError (or InsufficientFunds / InsufficientShares) when the
+    order can't rest.
+    """
+    side, order_type = (side or '').upper(), (order_type or '').upper()
+    if side not in ('BUY', 'SELL'):
+        raise TradeError('side must be BUY or SELL.')
+    if order_type not in dict(Order.ORDER_TYPES):
+        raise TradeError(f"order_type must be one of {', '.join(dict(Order.ORDER_TYPES))}.")
+    limit_price, stop_price = _decimal(limit_price, 'limit_price'), _decimal(stop_price, 'stop_price')
+    if order_type in (Order.LIMIT, Order.STOP_LIMIT) and limit_price is None:
+        raise TradeError(f'A {order_type} order needs a limit_price.')
+    if order_type in (Order.STOP, Order.STOP_LIMIT) and stop_price is None:
+        raise TradeError(f'A {order_type} order needs a stop_price.')
+    if order_type == Order.LIMIT:
+        stop_price = None
+    if order_type == Order.STOP:
+        limit_price = None
+    reserve_at = limit_price if limit_price is not None else stop_price
+    if side == 'BUY' and order_type == Order.STOP:
+        reserve_at = stop_price * (1 + Decimal(str(getattr(settings, 'ORDER_STOP_RESERVE_MARGIN', 0.05))))
+    cost = _amount(quantity, reserve_at)
+
+    with db_transaction.atomic():
+        if side == 'BUY':
+            reserved = UserProfile.objects.filter(
+                pk=user_profile_id, cash_balance__gte=F('reserved_cash') + cost
+            ).update(reserved_cash=F('reserved_cash') + cost)
+            if not reserved:
+                raise InsufficientFunds()
+        else:
+            reserved = Holding.objects.filter(
+                user_profile_id=user_profile_id, stock=stock, quantity__gte=F('reserved_quantity') + quantity
+            ).update(reserved_quantity=F('reserved_quantity') + quantity)
+            if not reserved:
+                raise InsufficientShares()
+        return Order.objects.create(
+            user_profile_id=user_profile_id, stock=stock, side=side, order_type=order_type, quantity=quantity,
+            limit_price=limit_price, stop_price=stop_price,
+            reserved_cash=cost if side == 'BUY' else 0, reserved_quantity=quantity if side == 'SELL' else 0,
+        )
+
+def _release(order):
+    if order.reserved_cash:
+        UserProfile.objects.filter(pk=order.user_profile_id).update(reserved_cash=F('reserved_cash') - order.reserved_cash)
+    if order.reserved_quantity:
+        Holding.objects.filter(user_profile_id=order.user_profile_id, stock_id=order.stock_id).update(
+            reserved_quantity=F('reserved_quantity') - order.reserved_quantity
+        )
+    order.reserved_cash, order.reserved_quantity = 0, 0
+
+def _close(order, status, fill_price=None):
+    order.status, order.fill_price, order.closed_at = status, fill_price, timezone.now()
+    order.save(update_fields=['status', 'fill_price', 'closed_at', 'reserved_cash', 'reserved_quantity', 'stop_triggered'])
+
+def cancel_order(user_profile_id, order_id):
+    """Cancels one of the user's open orders and releases its reservation."""
+    with db_transaction.atomic():
+        # Profile first, then the order: the order trades, fills and reset_account all lock in.
+        _lock_profile(user_profile_id)
+        try:
+            order = Order.objects.select_for_update().get(pk=order_id, user_profile_id=user_profile_id)
+        except Order.DoesNotExist:
+            raise TradeError('No such order.')
+        if order.status != Order.OPEN:
+            raise TradeError(f'Only open orders can be cancelled; this one is {order.status.lower()}.')
+        _release(order)
+        _close(order, Order.CANCELLED)
+        db_transaction.on_commit(lambda: _forget_order(order.pk))
+    return order
+
+def fill_order(order_id, price):
+    """Fills a triggered order at price through the same execution path as market orders.
+
+    The owner's profile row is locked first and the order row second, the order every trade
+    path and reset_account take, so a concurrent cancel or reset either wins (and the fill
+    is skipped) or waits. A fill that cash or shares no longer cover marks it REJECTED.
+    """
+    user_profile_id = Order.objects.filter(pk=order_id).values_list('user_profile_id', flat=True).get()
+    with db_transaction.atomic():
+        _lock_profile(user_profile_id)
+        order = Order.objects.select_for_update().select_related('stock').get(pk=order_id)
+        if order.status != Order.OPEN:
+            return order
+        try:
+            if order.side == 'BUY':
+                execute_buy(order.user_profile_id, order.stock, order.quantity, price, reserved=order.reserved_cash)
+            else:
+                execute_sell(order.user_profile_id, order.stock, order.quantity, price, reserved=order.reserved_quantity)
+        except TradeError:
+            _release(order)
+            _close(order, Order.REJECTED)
+            return order
+        order.reserved_cash, order.reserved_quantity = 0, 0
+        _close(order, Order.FILLED, price)
+    return order
+
+def activate_stop_limits(order_ids):
+    if order_ids:
+        Order.objects.filter(pk__in=order_ids, status=Order.OPEN).update(stop_triggered=True)
+
+
+def match_order(order, price):
+    """Fills or activates a just-placed order if price already crosses it; returns the order."""
+    engine = TriggerEngine()
+    engine.add(order.pk, order.stock.symbol, order.side, order.order_type, order.limit_price, order.stop_price)
+    fills, activated = engine.on_price(order.stock.symbol, price)
+    if activated:
+        activate_stop_limits(activated)
+        order.stop_triggered = True
+    if fills:
+        return fill_order(order.pk, price)
+    return order
+
+
+class OrderMatcher:
+    """Keeps a TriggerEngine in step with the Order table and fills what each price triggers.
+
+    Before every price, orders placed since the last one are picked up by id. Every
+    ORDER_MATCHER_RESYNC_SECONDS the engine is also reconciled with all OPEN orders: that
+    catches an order whose transaction committed after a higher id had been seen, and
+    drops orders cancelled or filled by other processes. Until then such a cancelled
+    order can still trigger, and fill_order sees its status and skips it.
+    """
+
+    def __init__(self, engine=None, resync_interval=None):
+        self.engine = engine or TriggerEngine()
+        if resync_interval is None:
+            resync_interval = getattr(settings, 'ORDER_MATCHER_RESYNC_SECONDS', 30)
+        self.resync_interval = resync_interval
+        self._seen_id = 0
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def _add(self, orders):
+        rows = orders.order_by('pk').values_list(
+            'pk', 'stock__symbol', 'side', 'order_type', 'limit_price', 'stop_price', 'stop_triggered'
+        )
+        for row in rows.iterator(chunk_size=5000):
+            if row[0] not in self.engine:
+                self.engine.add(*row)
+            self._seen_id = max(self._seen_id, row[0])
+
+    def load_new_orders(self):
+        self._add(Order.objects.filter(status=Order.OPEN, pk__gt=self._seen_id))
+
+    def resync(self):
+        """Reconciles the engine with every OPEN order in the table."""
+        open_ids = set(Order.objects.filter(status=Order.OPEN).values_list('pk', flat=True).iterator(chunk_size=5000))
+        for order_id in list(self.engine.order_ids() - open_ids):
+            self.engine.discard(order_id)
+        missing = sorted(open_ids - self.engine.order_ids())
+        for start in range(0, len(missing), 1000):
+            self._add(Order.objects.filter(status=Order.OPEN, pk__in=missing[start:start + 1000]))
+        self._synced_at = time.monotonic()
+
+    def discard(self, order_id):
+        with self._lock:
+            self.engine.discard(order_id)
+
+    def on_price(self, symbol, price):
+        """Fills every order price triggers for symbol; returns the orders it touched."""
+        with self._lock:
+            if self._synced_at is None or time.monotonic() - self._synced_at >= self.resync_interval:
+                self.resync()
+            else:
+                self.load_new_orders()
+            fills, activated = self.engine.on_price(symbol.upper(), price)
+            activate_stop_limits(activated)
+            return [fill_order(order_id, Decimal(str(price))) for order_id in fills]
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def get_order_matcher():
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = OrderMatcher()
+        return _matcher
+
+def _forget_order(order_id):
+    """Drops a cancelled order from this process's matcher, if it has one."""
+    matcher = _matcher
+    if matcher is not None:
+        matcher.discard(order_id)
+
+def reset_order_matcher():
+    global _matcher
+    with _matcher_lock:
+        _matcher = None
@@ -0,0 +1,35 @@
+# trading/page_cache.py
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+
+
+def _cache():
+    return caches[fragment_cache_alias()]
+
+def fragment_cache_alias():
+    # Must be shared by every worker, or a trade in one process leaves the others' fragments stale.
+    return getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')
+
+def _holdings_key(user_id):
+    return f'fragments:holdings-version:{user_id}'
+
+
+def holdings_version(user_id):
+    """The current version of user_id's cached portfolio fragment, part of the fragment's cache key.
+
+    Versions are timestamps rather than counters: if the version key is evicted, the
+    next one is new, so an old fragment can never be mistaken for a current one.
+    """
+    cache = _cache()
+    version = cache.get(_holdings_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(_holdings_key(user_id), version, None):
+            version = cache.get(_holdings_key(user_id), version)
+    return version
+
+def invalidate_holdings(user_id):
+    """Retires user_id's cached portfolio fragment once the current transaction commits."""
+    db_transaction.on_commit(lambda: _cache().set(_holdings_key(user_id), time.time_ns(), None))
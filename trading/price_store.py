@@ -0,0 +1,157 @@
+# trading/price_store.py
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from .models import HistoricalPrice
+
+# Row order of the (6, n) float64 block backing each series; every column is contiguous.
+DAY, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+COLUMNS = ('open_price', 'high_price', 'low_price', 'close_price', 'volume')
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class PriceSeries:
+    """One symbol's daily bars as typed columns (days since 1970-01-01, OHLC, volume)."""
+
+    def __init__(self, symbol, block):
+        self.symbol = symbol
+        self.block = block
+        self.days = block[DAY]
+        self.open = block[OPEN]
+        self.high = block[HIGH]
+        self.low = block[LOW]
+        self.close = block[CLOSE]
+        self.volume = block[VOLUME]
+
+    def __len__(self):
+        return self.block.shape[1]
+
+    @property
+    def dates(self):
+        return self.days.astype('datetime64[D]')
+
+    @property
+    def last_date(self):
+        return self.dates[-1].astype(object) if len(self) else None
+
+    def between(self, start=None, end=None):
+        """The bars with start <= date <= end, as a view (no copy)."""
+        lo = 0 if start is None else int(np.searchsorted(self.days, start.toordinal() - EPOCH_ORDINAL, 'left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.days, end.toordinal() - EPOCH_ORDINAL, 'right'))
+        return PriceSeries(self.symbol, self.block[:, lo:hi])
+
+
+def load_block(symbol):
+    """Reads symbol's HistoricalPrice rows straight into a (6, n) array, without model instances."""
+    rows = HistoricalPrice.objects.filter(stock__symbol=symbol).order_by('date').values_list(
+        'date', *(Cast(column, FloatField()) for column in COLUMNS)
+    )
+    values = [(day.toordinal() - EPOCH_ORDINAL, *rest) for day, *rest in rows.iterator(chunk_size=5000)]
+    block = np.array(values, dtype=np.float64).reshape(-1, 6).T
+    return np.ascontiguousarray(block)
+
+
+class PriceStore:
+    """LRU-bounded cache of PriceSeries, optionally backed by memory-mapped .npy snapshots.
+
+    With a snapshot_dir, a series is written to disk once and every worker process maps the
+    same file, so the pages are shared rather than copied. Snapshots are replaced atomically
+    on ingest; other processes notice the new file on their next read and remap it.
+    """
+
+    def __init__(self, max_symbols=256, snapshot_dir=None):
+        self.max_symbols = max_symbols
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self._resident = OrderedDict()  # symbol -> (snapshot version, PriceSeries)
+        self._lock = threading.Lock()
+
+    def _path(self, symbol):
+        return self.snapshot_dir / f"{symbol}.npy"
+
+    def _version(self, symbol):
+        if self.snapshot_dir is None:
+            return None
+        try:
+            stat = os.stat(self._path(symbol))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _write_snapshot(self, symbol, block):
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.snapshot_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, block)
+        os.replace(tmp, self._path(symbol))
+
+    def _remember(self, symbol, version, series):
+        with self._lock:
+            self._resident[symbol] = (version, series)
+            self._resident.move_to_end(symbol)
+            while len(self._resident) > self.max_symbols:
+                self._resident.popitem(last=False)
+
+    def get(self, symbol):
+        symbol = symbol.upper()
+        version = self._version(symbol)
+        with self._lock:
+            resident = self._resident.get(symbol)
+            if resident is not None and (self.snapshot_dir is None or resident[0] == version):
+                self._resident.move_to_end(symbol)
+                return resident[1]
+        if version is not None:
+            series = PriceSeries(symbol, np.load(self._path(symbol), mmap_mode='r'))
+            self._remember(symbol, version, series)
+            return series
+        return self.refresh(symbol)
+
+    def refresh(self, symbol):
+        """Reloads symbol from the database and replaces its snapshot; call after ingesting rows."""
+        symbol = symbol.upper()
+        block = load_block(symbol)
+        if self.snapshot_dir is None:
+            series = PriceSeries(symbol, block)
+            self._remember(symbol, None, series)
+            return series
+        self._write_snapshot(symbol, block)
+        series = PriceSeries(symbol, np.load(self._path(symbol), mmap_mode='r'))
+        self._remember(symbol, self._version(symbol), series)
+        return series
+
+    def discard(self, symbol):
+        symbol = symbol.upper()
+        with self._lock:
+            self._resident.pop(symbol, None)
+        if self.snapshot_dir is not None:
+            try:
+                os.remove(self._path(symbol))
+            except FileNotFoundError:
+                pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_price_store():
+    """The process-wide PriceStore configured by PRICE_STORE_MAX_SYMBOLS and PRICE_STORE_DIR."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore(
+                max_symbols=getattr(settings, 'PRICE_STORE_MAX_SYMBOLS', 256),
+                snapshot_dir=getattr(settings, 'PRICE_STORE_DIR', None),
+            )
+        return _store
+
+def reset_price_store():
+    """Drops the process-wide store so the next get_price_store() re-reads settings (used by tests)."""
+    global _store
+    with _store_lock:
+        _store = None
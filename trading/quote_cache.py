@@ -0,0 +1,340 @@
+# trading/quote_cache.py
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import caches
+from .api_utils import fetch_current_price
+from .metrics import in_request_context, record_cache_event
+
+QUOTE_KEY = 'quote:{}'
+LOCK_KEY = 'quote-lock:{}'
+STATS_KEY = 'quote-stats:{}'
+STAT_NAMES = ('hits', 'stale_hits', 'misses', 'upstream_calls', 'upstream_errors')
+CACHE_EVENTS = ('hits', 'stale_hits', 'misses') # Also reported per view by the metrics middleware
+
+# Followers in this process wait on the leader's flight instead of calling upstream.
+_flights = {}
+_flights_lock = threading.Lock()
+
+# Symbols with a background refresh queued or running in this process (sync or async), so
+# repeated stale hits cost a set lookup rather than another thread and cache round trip.
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_refresh_executor = None
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.price = None
+
+
+def _cache():
+    return caches[getattr(settings, 'QUOTE_CACHE_ALIAS', 'default')]
+
+def _ttl():
+    return getattr(settings, 'QUOTE_CACHE_TTL', 60)
+
+def _stale_ttl():
+    return getattr(settings, 'QUOTE_CACHE_STALE_TTL', 300)
+
+def _lock_timeout():
+    return getattr(settings, 'QUOTE_CACHE_LOCK_TIMEOUT', 10)
+
+
+def _bump(name, cache=None, amount=1):
+    if name in CACHE_EVENTS:
+        record_cache_event(name, amount)
+    cache = cache or _cache()
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # First event for this counter; add() keeps a racing process from resetting it.
+        cache.add(key, 0, None)
+        cache.incr(key, amount)
+
+
+def get_quote_stats():
+    """Returns the shared hit/miss/upstream counters for the quote cache."""
+    cache = _cache()
+    values = cache.get_many([STATS_KEY.format(name) for name in STAT_NAMES])
+    return {name: values.get(STATS_KEY.format(name), 0) for name in STAT_NAMES}
+
+def reset_quote_stats():
+    _cache().delete_many([STATS_KEY.format(name) for name in STAT_NAMES])
+
+
+def _store(symbol, price, cache):
+    entry = {'price': price, 'fetched_at': time.time()}
+    cache.set(QUOTE_KEY.format(symbol), entry, _ttl() + _stale_ttl())
+
+def _fetch_and_store(symbol, fetcher, cache):
+    _bump('upstream_calls', cache)
+    try:
+        price = fetcher(symbol)
+    except Exception as e:
+        print(f"Error fetching quote for {symbol}: {e}")
+        price = None
+    if price is None:
+        _bump('upstream_errors', cache)
+    else:
+        _store(symbol, price, cache)
+    return price
+
+def _wait_for_other_process(symbol, cache):
+    """Polls the cache while another process holds the fetch lock for symbol."""
+    deadline = time.monotonic() + _lock_timeout()
+    while time.monotonic() < deadline:
+        entry = cache.get(QUOTE_KEY.format(symbol))
+        if entry is not None and time.time() - entry['fetched_at'] <= _ttl():
+            return entry['price']
+        if cache.get(LOCK_KEY.format(symbol)) is None:
+            return None
+        time.sleep(0.05)
+    return None
+
+def _lead_fetch(symbol, fetcher, cache):
+    lock_key = LOCK_KEY.format(symbol)
+    # add() is the cross-process lock: only one process refreshes a symbol at a time.
+    # The file backend's add() is best-effort, so a rare duplicate fetch is possible there.
+    if cache.add(lock_key, 1, _lock_timeout()):
+        try:
+            return _fetch_and_store(symbol, fetcher, cache)
+        finally:
+            cache.delete(lock_key)
+    price = _wait_for_other_process(symbol, cache)
+    if price is None:
+        price = _fetch_and_store(symbol, fetcher, cache)
+    return price
+
+def _fetch_coalesced(symbol, fetcher, cache):
+    with _flights_lock:
+        flight = _flights.get(symbol)
+        leader = flight is None
+        if leader:
+            flight = _flights[symbol] = _Flight()
+    if not leader:
+        flight.done.wait(_lock_timeout())
+        return flight.price
+    try:
+        flight.price = _lead_fetch(symbol, fetcher, cache)
+    finally:
+        with _flights_lock:
+            _flights.pop(symbol, None)
+        flight.done.set()
+    return flight.price
+
+
+def _is_fresh(entry):
+    return entry is not None and time.time() - entry['fetched_at'] <= _ttl()
+
+def _revalidate(symbol, fetcher, cache):
+    lock_key = LOCK_KEY.format(symbol)
+    if not cache.add(lock_key, 1, _lock_timeout()):
+        return  # Someone else is already refreshing it.
+    try:
+        # Another process may have refreshed it between our stale read and taking the lock.
+        if not _is_fresh(cache.get(QUOTE_KEY.format(symbol))):
+            _fetch_and_store(symbol, fetcher, cache)
+    finally:
+        cache.delete(lock_key)
+
+def _refresh(symbol, fetcher, cache):
+    try:
+        _revalidate(symbol, fetcher, cache)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(symbol)
+
+def _schedule_refresh(symbol, fetcher, cache):
+    """Queues a background refresh of symbol on the shared pool unless one is already in flight here."""
+    global _refresh_executor
+    with _refreshing_lock:
+        if symbol in _refreshing:
+            return
+        _refreshing.add(symbol)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'QUOTE_CACHE_REFRESH_WORKERS', 2), thread_name_prefix='quote-refresh',
+            )
+        try:
+            _refresh_executor.submit(_refresh, symbol, fetcher, cache)
+        except RuntimeError:  # Interpreter shutdown; the next stale hit can try again.
+            _refreshing.discard(symbol)
+
+
+def get_quote(symbol, fetcher=None):
+    """Returns the latest price for symbol, going upstream only when the cache can't answer.
+
+    Fresh entries (younger than QUOTE_CACHE_TTL) are served directly. Entries within
+    QUOTE_CACHE_STALE_TTL after that are served as-is while a background refresh runs.
+    Anything older is a miss; concurrent misses for the same symbol share one upstream call.
+    """
+    fetcher = fetcher or fetch_current_price
+    symbol = symbol.upper()
+    cache = _cache()
+    entry = cache.get(QUOTE_KEY.format(symbol))
+    if entry is not None:
+        age = time.time() - entry['fetched_at']
+        if age <= _ttl():
+            _bump('hits', cache)
+            return entry['price']
+        if age <= _ttl() + _stale_ttl():
+            _bump('stale_hits', cache)
+            _schedule_refresh(symbol, fetcher, cache)
+            return entry['price']
+    _bump('misses', cache)
+    return _fetch_coalesced(symbol, fetcher, cache)
+
+def get_quotes(symbols, fetcher=None):
+    """Batch form of get_quote(): one cache round trip for all symbols, misses fetched in parallel.
+
+    Returns {symbol: price or None}.
+    """
+    fetcher = fetcher or fetch_current_price
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    cache = _cache()
+    entries = cache.get_many([QUOTE_KEY.format(symbol) for symbol in symbols])
+    prices = {}
+    missing = []
+    hits = stale = 0
+    now = time.time()
+    for symbol in symbols:
+        entry = entries.get(QUOTE_KEY.format(symbol))
+        age = None if entry is None else now - entry['fetched_at']
+        if age is not None and age <= _ttl():
+            hits += 1
+            prices[symbol] = entry['price']
+        elif age is not None and age <= _ttl() + _stale_ttl():
+            stale += 1
+            prices[symbol] = entry['price']
+            _schedule_refresh(symbol, fetcher, cache)
+        else:
+            missing.append(symbol)
+    for name, amount in (('hits', hits), ('stale_hits', stale), ('misses', len(missing))):
+        if amount:
+            _bump(name, cache, amount)
+    if missing:
+        workers = min(len(missing), getattr(settings, 'QUOTE_CACHE_FETCH_WORKERS', 8))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = pool.map(in_request_context(lambda symbol: _fetch_coalesced(symbol, fetcher, cache)), missing)
+            prices.update(zip(missing, fetched))
+    return prices
+
+def invalidate_quote(symbol):
+    _cache().delete(QUOTE_KEY.format(symbol.upper()))
+
+def set_quote(symbol, price):
+    """Stores a price obtained elsewhere (e.g. the latest close of a history sync)."""
+    _store(symbol.upper(), price, _cache())
+
+def refresh_quote(symbol, fetcher=None):
+    """Fetches symbol upstream and stores it regardless of what is cached. Returns None on failure."""
+    return _fetch_and_store(symbol.upper(), fetcher or fetch_current_price, _cache())
+
+
+# Async variants for the ASGI views. Same cache layout, counters and locks as above,
+# so sync and async workers share entries; coalescing here is per event loop.
+_async_flights = weakref.WeakKeyDictionary()
+_background_tasks = set()
+
+
+async def _abump(name, cache):
+    if name in CACHE_EVENTS:
+        record_cache_event(name)
+    key = STATS_KEY.format(name)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+async def _astore(symbol, price, cache):
+    entry = {'price': price, 'fetched_at': time.time()}
+    await cache.aset(QUOTE_KEY.format(symbol), entry, _ttl() + _stale_ttl())
+
+async def _afetch_and_store(symbol, fetcher, cache):
+    await _abump('upstream_calls', cache)
+    try:
+        price = await fetcher(symbol)
+    except Exception as e:
+        print(f"Error fetching quote for {symbol}: {e}")
+        price = None
+    if price is None:
+        await _abump('upstream_errors', cache)
+    else:
+        await _astore(symbol, price, cache)
+    return price
+
+async def _alead_fetch(symbol, fetcher, cache):
+    lock_key = LOCK_KEY.format(symbol)
+    if await cache.aadd(lock_key, 1, _lock_timeout()):
+        try:
+            return await _afetch_and_store(symbol, fetcher, cache)
+        finally:
+            await cache.adelete(lock_key)
+    deadline = time.monotonic() + _lock_timeout()
+    while time.monotonic() < deadline:
+        entry = await cache.aget(QUOTE_KEY.format(symbol))
+        if entry is not None and time.time() - entry['fetched_at'] <= _ttl():
+            return entry['price']
+        if await cache.aget(lock_key) is None:
+            break
+        await asyncio.sleep(0.05)
+    return await _afetch_and_store(symbol, fetcher, cache)
+
+async def _afetch_coalesced(symbol, fetcher, cache):
+    flights = _async_flights.setdefault(asyncio.get_running_loop(), {})
+    task = flights.get(symbol)
+    if task is None:
+        task = flights[symbol] = asyncio.ensure_future(_alead_fetch(symbol, fetcher, cache))
+        task.add_done_callback(lambda _: flights.pop(symbol, None))
+    # shield(): a disconnecting client must not cancel the fetch other requests are waiting on.
+    return await asyncio.shield(task)
+
+async def _arevalidate(symbol, fetcher, cache):
+    lock_key = LOCK_KEY.format(symbol)
+    if not await cache.aadd(lock_key, 1, _lock_timeout()):
+        return
+    try:
+        if not _is_fresh(await cache.aget(QUOTE_KEY.format(symbol))):
+            await _afetch_and_store(symbol, fetcher, cache)
+    finally:
+        await cache.adelete(lock_key)
+
+def _arefresh_done(symbol):
+    def done(task):
+        _background_tasks.discard(task)
+        with _refreshing_lock:
+            _refreshing.discard(symbol)
+    return done
+
+
+async def aget_quote(symbol, fetcher=None):
+    """Async counterpart of get_quote(); fetcher must be a coroutine function."""
+    if fetcher is None:
+        from .async_client import afetch_current_price as fetcher
+    symbol = symbol.upper()
+    cache = _cache()
+    entry = await cache.aget(QUOTE_KEY.format(symbol))
+    if entry is not None:
+        age = time.time() - entry['fetched_at']
+        if age <= _ttl():
+            await _abump('hits', cache)
+            return entry['price']
+        if age <= _ttl() + _stale_ttl():
+            await _abump('stale_hits', cache)
+            with _refreshing_lock:
+                refreshing = symbol in _refreshing
+                _refreshing.add(symbol)
+            if not refreshing:
+                task = asyncio.ensure_future(_arevalidate(symbol, fetcher, cache))
+                _background_tasks.add(task)  # Keep a reference so the task isn't garbage collected.
+                task.add_done_callback(_arefresh_done(symbol))  # Also runs if the task is cancelled before it starts
+            return entry['price']
+    await _abump('misses', cache)
+    return await _afetch_coalesced(symbol, fetcher, cache)
@@ -0,0 +1,122 @@
+# trading/quote_stream.py
+import asyncio
+import weakref
+from collections import Counter
+from django.conf import settings
+from .quote_cache import aget_quote
+
+# One broadcaster per event loop, like the aiohttp sessions: its tasks and events belong to that loop.
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+class Subscription:
+    """One client's end of a QuoteBroadcaster: the newest unsent price for each symbol.
+
+    A new price for a symbol replaces one the client hasn't read yet, so a slow client
+    catches up to the latest quotes instead of working through a backlog, and never
+    holds up the producer or other clients. conflated counts the prices it skipped.
+    """
+
+    def __init__(self, broadcaster, symbols):
+        self.broadcaster = broadcaster
+        self.symbols = symbols
+        self.conflated = 0
+        self._pending = {}
+        self._ready = asyncio.Event()
+        self._closed = False
+
+    def push(self, symbol, price):
+        if symbol in self._pending:
+            self.conflated += 1
+        self._pending[symbol] = price
+        self._ready.set()
+
+    async def get(self, timeout=None):
+        """Waits for new prices and returns {symbol: price}, or {} once timeout seconds pass."""
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return {}
+        updates, self._pending = self._pending, {}
+        self._ready.clear()
+        return updates
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.broadcaster.unsubscribe(self)
+
+
+class _Producer:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.subscribers = set()
+        self.price = None
+        self.task = None
+
+
+class QuoteBroadcaster:
+    """Polls each subscribed symbol once per interval and fans changed prices out to every subscriber.
+
+    The first subscription to a symbol starts its producer task and the last one to
+    close stops it, so upstream load depends on the symbols being watched, not on the
+    number of clients. fetch defaults to aget_quote, whose shared cache also keeps the
+    producers of different worker processes to one upstream call per QUOTE_CACHE_TTL.
+    """
+
+    def __init__(self, fetch=None, interval=None):
+        self.fetch = fetch or aget_quote
+        self.interval = interval or getattr(settings, 'QUOTE_STREAM_INTERVAL', 5)
+        self.polls = Counter()
+        self._producers = {}
+
+    def __len__(self):
+        return len(self._producers)
+
+    def subscribe(self, symbols):
+        subscription = Subscription(self, tuple(dict.fromkeys(symbol.upper() for symbol in symbols)))
+        for symbol in subscription.symbols:
+            producer = self._producers.get(symbol)
+            if producer is None:
+                producer = self._producers[symbol] = _Producer(symbol)
+                producer.task = asyncio.ensure_future(self._run(producer))
+            producer.subscribers.add(subscription)
+            if producer.price is not None:
+                subscription.push(symbol, producer.price)  # Late joiners start from the last known price.
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for symbol in subscription.symbols:
+            producer = self._producers.get(symbol)
+            if producer is None:
+                continue
+            producer.subscribers.discard(subscription)
+            if not producer.subscribers:
+                del self._producers[symbol]
+                producer.task.cancel()
+
+    async def _run(self, producer):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self.polls[producer.symbol] += 1
+            try:
+                price = await self.fetch(producer.symbol)
+            except Exception as e:
+                print(f"Error fetching quote for {producer.symbol}: {e}")
+                price = None
+            if price is not None and price != producer.price:
+                producer.price = price
+                for subscription in list(producer.subscribers):
+                    subscription.push(producer.symbol, price)
+            await asyncio.sleep(max(0, self.interval - (loop.time() - started)))
+
+
+def get_quote_broadcaster():
+    """The broadcaster for the running event loop (one per ASGI worker)."""
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None:
+        broadcaster = _broadcasters[loop] = QuoteBroadcaster()
+    return broadcaster
@@ -0,0 +1,152 @@
+# trading/search.py
+import bisect
+import heapq
+import re
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from .models import Stock
+
+VERSION_KEY = 'search:symbol-index-version'
+
+# Ranks, best first: the symbol itself, symbols starting with the query, then names
+# with a word starting with it.
+EXACT, SYMBOL_PREFIX, NAME_PREFIX = range(3)
+
+_WORD_SEPARATORS = re.compile(r'[^0-9A-Z]+')
+
+
+def name_words(name):
+    return _WORD_SEPARATORS.sub(' ', name.upper()).split()
+
+
+class SymbolIndex:
+    """Sorted in-memory index over stock symbols and the words of their names.
+
+    Symbols are kept in one sorted list and every name suffix that starts on a word
+    ("BUSINESS MACHINES", "MACHINES") in another, so a prefix lookup is a bisect to
+    the first candidate followed by a scan of just the matches. add() and remove() keep
+    both lists sorted in place, so a changed stock never means a full rebuild.
+    """
+
+    def __init__(self, stocks=(), version=0):
+        self.version = version
+        self._stocks = {pk: (symbol, name) for pk, symbol, name in stocks}
+        # Sorted (symbol, pk) and (name suffix, word position, symbol, pk) tuples.
+        self._symbols = sorted((symbol, pk) for pk, (symbol, _) in self._stocks.items())
+        self._words = sorted(
+            entry for pk, (symbol, name) in self._stocks.items() for entry in self._word_entries(pk, symbol, name)
+        )
+
+    def __len__(self):
+        return len(self._stocks)
+
+    @staticmethod
+    def _word_entries(pk, symbol, name):
+        words = name_words(name)
+        return [(' '.join(words[i:]), i, symbol, pk) for i in range(len(words))]
+
+    def add(self, pk, symbol, name):
+        """Adds or replaces the stock with this pk (so a renamed symbol drops its old entries)."""
+        self.remove(pk)
+        self._stocks[pk] = (symbol, name)
+        bisect.insort(self._symbols, (symbol, pk))
+        for entry in self._word_entries(pk, symbol, name):
+            bisect.insort(self._words, entry)
+
+    def remove(self, pk):
+        current = self._stocks.pop(pk, None)
+        if current is None:
+            return
+        symbol, name = current
+        del self._symbols[bisect.bisect_left(self._symbols, (symbol, pk))]
+        for entry in self._word_entries(pk, symbol, name):
+            del self._words[bisect.bisect_left(self._words, entry)]
+
+    @staticmethod
+    def _prefix_range(entries, prefix):
+        """(start, end) of the entries whose first field starts with prefix."""
+        return bisect.bisect_left(entries, (prefix,)), bisect.bisect_left(entries, (prefix + '\uffff',))
+
+    def search(self, query, limit=10):
+        """Up to limit (symbol, name) pairs matching query, best first.
+
+        Ties are broken by the shorter symbol, then by how early in the name the word
+        appears, then alphabetically. Name words are only scanned when the symbol
+        matches don't already fill the limit, since every one of them outranks a name match.
+        """
+        query = query.strip().upper()
+        if not query or limit < 1:
+            return []
+        start, end = self._prefix_range(self._symbols, query)
+        ranked = heapq.nsmallest(limit, (
+            (EXACT if symbol == query else SYMBOL_PREFIX, len(symbol), 0, symbol, pk)
+            for symbol, pk in self._symbols[start:end]
+        ))
+        words = ' '.join(name_words(query))
+        if len(ranked) < limit and words:
+            best = {key[-1]: key for key in ranked}
+            start, end = self._prefix_range(self._words, words)
+            for _, position, symbol, pk in self._words[start:end]:
+                if pk not in best or position < best[pk][2] and best[pk][0] == NAME_PREFIX:
+                    best[pk] = (NAME_PREFIX, len(symbol), position, symbol, pk)
+            ranked = heapq.nsmallest(limit, best.values())
+        return [self._stocks[key[-1]] for key in ranked]
+
+
+def _version_cache():
+    # Shared by every worker, so a change saved in one process reaches the others' indexes.
+    return caches[getattr(settings, 'SEARCH_INDEX_CACHE_ALIAS', 'default')]
+
+def _bump_version():
+    cache = _version_cache()
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:  # Evicted between add() and incr().
+        cache.set(VERSION_KEY, 1, None)
+        return 1
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_symbol_index():
+    """The process-wide SymbolIndex, rebuilt from the Stock table if another process changed stocks since it was built."""
+    global _index
+    version = _version_cache().get(VERSION_KEY, 0)
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = SymbolIndex(Stock.objects.values_list('pk', 'symbol', 'name').iterator(chunk_size=5000), version)
+        return _index
+
+def reset_symbol_index():
+    """Drops the process-wide index so the next get_symbol_index() rebuilds it (used by tests)."""
+    global _index
+    with _index_lock:
+        _index = None
+
+def _apply(change):
+    """Applies change to this process's index and bumps the shared version for the others."""
+    version = _bump_version()
+    with _index_lock:
+        if _index is None:
+            return
+        change(_index)
+        # A gap means another process changed stocks too; the next lookup rebuilds instead.
+        if _index.version == version - 1:
+            _index.version = version
+
+def invalidate_symbol_index():
+    """Makes every process rebuild its index on the next lookup; call after bulk writes that send no signals."""
+    _bump_version()
+
+
+def stock_saved(sender, instance, **kwargs):
+    pk, symbol, name = instance.pk, instance.symbol, instance.name
+    db_transaction.on_commit(lambda: _apply(lambda index: index.add(pk, symbol, name)))
+
+def stock_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    db_transaction.on_commit(lambda: _apply(lambda index: index.remove(pk)))
@@ -0,0 +1,131 @@
+# trading/snapshots.py
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+import numpy as np
+from django.db import transaction as db_transaction
+from django.db.models import F, Sum
+from .market_calendar import MARKET_TZ, latest_expected_bar, trading_days_after
+from .models import STARTING_CASH, PortfolioSnapshot, Transaction
+from .price_store import EPOCH_ORDINAL, get_price_store
+
+CENT = Decimal('0.01')
+
+
+def _end_of(day):
+    """Midnight (market time) at the end of day; transactions before it belong to day's snapshot."""
+    return datetime.combine(day + timedelta(days=1), time.min, MARKET_TZ)
+
+def _close_on_or_before(series, day):
+    index = int(np.searchsorted(series.days, day.toordinal() - EPOCH_ORDINAL, 'right')) - 1
+    return Decimal(str(series.close[index])) if index >= 0 else None
+
+def _initial_state(user_profile):
+    """Cash before the first remaining transaction, worked back from today's balance."""
+    flows = Transaction.objects.filter(user_profile=user_profile).values('transaction_type').annotate(
+        amount=Sum(F('quantity') * F('price'))
+    )
+    cash = user_profile.cash_balance
+    for row in flows:
+        cash += row['amount'] if row['transaction_type'] == 'BUY' else -row['amount']
+    return cash, {}
+
+
+def build_snapshots(user_profile, through=None, store=None):
+    """Writes a snapshot for every trading day after the user's last one, up to through.
+
+    Each run resumes from the cash and holdings stored in the last snapshot and replays only
+    the transactions made since, so a daily run touches one day's trades. A reset marker is
+    rebuilt from STARTING_CASH with the trades made after the reset. Returns the number of
+    snapshots written.
+    """
+    through = through or latest_expected_bar()
+    store = store or get_price_store()
+    last = PortfolioSnapshot.objects.filter(user_profile=user_profile).order_by('-date').first()
+    trades = Transaction.objects.filter(user_profile=user_profile)
+    if last is None:
+        first_trade = trades.order_by('transaction_date').values_list('transaction_date', flat=True).first()
+        first_day = first_trade.astimezone(MARKET_TZ).date() if first_trade else through
+        days = list(trading_days_after(first_day - timedelta(days=1), through))
+        cash, holdings = _initial_state(user_profile)
+    elif last.is_reset:
+        # The reset deleted every older trade, so all that remain happened after it.
+        days = [last.date] + list(trading_days_after(last.date, through))
+        cash, holdings = STARTING_CASH, {}
+    else:
+        days = list(trading_days_after(last.date, through))
+        cash, holdings = last.cash_balance, dict(last.holdings)
+        trades = trades.filter(transaction_date__gte=_end_of(last.date))
+    days = [day for day in days if day <= through]
+    if not days:
+        return 0
+
+    pending = list(
+        trades.filter(transaction_date__lt=_end_of(days[-1])).order_by('transaction_date', 'id')
+        .values_list('transaction_date', 'transaction_type', 'stock__symbol', 'quantity', 'price')
+    )
+    last_trade_price = {}
+    snapshots = []
+    position = 0
+    for day in days:
+        cutoff = _end_of(day)
+        while position < len(pending) and pending[position][0] < cutoff:
+            _, kind, symbol, quantity, price = pending[position]
+            signed = quantity if kind == 'BUY' else -quantity
+            holdings[symbol] = holdings.get(symbol, 0) + signed
+            if not holdings[symbol]:
+                del holdings[symbol]
+            cash += -quantity * price if kind == 'BUY' else quantity * price
+            last_trade_price[symbol] = price
+            position += 1
+        positions_value = Decimal('0')
+        for symbol, quantity in holdings.items():
+            close = _close_on_or_before(store.get(symbol), day)
+            if close is None:
+                close = last_trade_price.get(symbol, Decimal('0'))
+            positions_value += quantity * close
+        positions_value = positions_value.quantize(CENT)
+        snapshots.append(PortfolioSnapshot(
+            user_profile=user_profile, date=day, cash_balance=cash, positions_value=positions_value,
+            total_equity=cash + positions_value, holdings=dict(holdings),
+            is_reset=bool(last and last.is_reset and day == last.date),
+        ))
+
+    with db_transaction.atomic():
+        if last is not None and last.is_reset:
+            last.delete()
+        PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=500)
+    return len(snapshots)
+
+
+def time_weighted_returns(rows):
+    """Cumulative time-weighted return at each of rows' (total_equity, is_reset) pairs.
+
+    Daily returns are chained so deposits don't count as performance: a reset day is
+    measured against STARTING_CASH rather than the previous close.
+    """
+    cumulative, growth, previous = [], Decimal('1'), None
+    for equity, is_reset in rows:
+        base = STARTING_CASH if is_reset else previous
+        if base:
+            growth *= equity / base
+        cumulative.append(growth - 1)
+        previous = equity
+    return cumulative
+
+
+def portfolio_history(user_profile, start=None, end=None):
+    """Snapshots between start and end with their cumulative time-weighted return; one range scan."""
+    snapshots = PortfolioSnapshot.objects.filter(user_profile=user_profile)
+    if start:
+        snapshots = snapshots.filter(date__gte=start)
+    if end:
+        snapshots = snapshots.filter(date__lte=end)
+    rows = list(snapshots.order_by('date').values_list(
+        'date', 'cash_balance', 'positions_value', 'total_equity', 'is_reset'
+    ))
+    returns = time_weighted_returns([(row[3], row[4]) for row in rows])
+    return [
+        {'date': day, 'cash_balance': cash, 'positions_value': positions, 'total_equity': equity,
+         'time_weighted_return': twr}
+        for (day, cash, positions, equity, _), twr in zip(rows, returns)
+    ]
@@ -1,3 +1,1793 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from . import quote_cache
+from .price_store import EPOCH_ORDINAL, PriceSeries, PriceStore, get_price_store, reset_price_store
+from .indicators import INDICATORS, IndicatorEngine, ewm, reset_indicator_engine
+from .charting import bucket_ohlc, lttb
+from .ingest import choose_outputsize, sync_stock_history, upsert_historical_prices
+from .market_sync import TokenBucket, call_with_retry, sync_symbols
+from .snapshots import build_snapshots
+from .backtest import Strategy, Universe, simulate, sweep
+from .lifecycle import prune_transactions
+from .portfolio import average_buy_prices
+from .orders import COMPACT_MIN_DEAD, OrderMatcher, TriggerEngine, cancel_order, fill_order, get_order_matcher, place_order, reset_order_matcher
+from .market_calendar import MARKET_TZ, is_trading_day, latest_expected_bar, market_holidays
+from .models import UserProfile, Stock, HistoricalPrice, Holding, Transaction, PortfolioSnapshot, Order, ArchivedTransaction
+from .execution import InsufficientFunds, InsufficientShares, TradeError, execute_buy, execute_sell
+from . import async_client
+from .metrics import StackSampler, get_metrics_registry, reset_metrics_registry
+from .quote_stream import QuoteBroadcaster
+from .search import SymbolIndex, get_symbol_index, reset_symbol_index
+from .market_data import AlphaVantageProvider, ReplayProvider, reset_provider
+from .api_utils import PriceColumns, fetch_current_price, fetch_daily_historical_data, parse_daily_series
 
-# Create your tests here.
+
+def make_price_rows(count, start=date(2020, 1, 1), close='100.00'):
+    """Builds rows shaped like fetch_daily_historical_data output."""
+    return [
+        {
+            'date': start + timedelta(days=i),
+            'open_price': Decimal('99.5000'),
+            'high_price': Decimal('101.2500'),
+            'low_price': Decimal('98.7500'),
+            'close_price': Decimal(close) + i,
+            'volume': 1000 + i,
+        }
+        for i in range(count)
+    ]
+
+
+class SlowFetcher:
+    """Stands in for the Alpha Vantage call; counts calls and can be made slow."""
+
+    def __init__(self, price=Decimal('123.45'), delay=0):
+        self.price = price
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.price
+
+
+class QuoteCacheTests:
+    """Shared checks, run once per cache backend by the subclasses below."""
+
+    def setUp(self):
+        caches['quotes'].clear()
+
+    def test_miss_then_hit(self):
+        fetcher = SlowFetcher()
+        self.assertEqual(quote_cache.get_quote('ibm', fetcher), Decimal('123.45'))
+        self.assertEqual(quote_cache.get_quote('IBM', fetcher), Decimal('123.45'))
+        self.assertEqual(fetcher.calls, 1)
+        stats = quote_cache.get_quote_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['upstream_calls']), (1, 1, 1))
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        fetcher = SlowFetcher(delay=0.2)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(quote_cache.get_quote('IBM', fetcher))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fetcher.calls, 1)
+        self.assertEqual(results, [Decimal('123.45')] * 10)
+
+    def test_stale_entry_is_served_while_revalidating(self):
+        quote_cache.get_quote('IBM', SlowFetcher(Decimal('100')))
+        newer = SlowFetcher(Decimal('101'))
+        with mock.patch('trading.quote_cache.time.time', return_value=time.time() + 2), \
+                mock.patch('trading.quote_cache._schedule_refresh', side_effect=quote_cache._refresh):
+            self.assertEqual(quote_cache.get_quote('IBM', newer), Decimal('100'))
+        self.assertEqual(newer.calls, 1)
+        self.assertEqual(quote_cache.get_quote('IBM', newer), Decimal('101'))
+        self.assertEqual(quote_cache.get_quote_stats()['stale_hits'], 1)
+
+    def test_stale_hits_queue_one_refresh_per_symbol(self):
+        quote_cache.get_quote('IBM', SlowFetcher(Decimal('100')))
+        newer = SlowFetcher(Decimal('101'), delay=0.2)
+        with mock.patch('trading.quote_cache.time.time', return_value=time.time() + 2), \
+                mock.patch('trading.quote_cache._refresh', wraps=quote_cache._refresh) as refresh:
+            for _ in range(5):
+                self.assertEqual(quote_cache.get_quote('IBM', newer), Decimal('100'))
+            deadline = time.monotonic() + 5
+            while 'IBM' in quote_cache._refreshing and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual((refresh.call_count, newer.calls), (1, 1))
+        self.assertEqual(quote_cache.get_quote('IBM', newer), Decimal('101'))
+
+    def test_expired_entry_is_a_miss(self):
+        quote_cache.get_quote('IBM', SlowFetcher(Decimal('100')))
+        newer = SlowFetcher(Decimal('101'))
+        with mock.patch('trading.quote_cache.time.time', return_value=time.time() + 10):
+            self.assertEqual(quote_cache.get_quote('IBM', newer), Decimal('101'))
+        self.assertEqual(quote_cache.get_quote_stats()['misses'], 2)
+
+    def test_failed_fetch_is_not_cached(self):
+        failing = SlowFetcher(price=None)
+        self.assertIsNone(quote_cache.get_quote('IBM', failing))
+        self.assertEqual(quote_cache.get_quote('IBM', SlowFetcher()), Decimal('123.45'))
+        self.assertEqual(quote_cache.get_quote_stats()['upstream_errors'], 1)
+
+
+@override_settings(QUOTE_CACHE_TTL=1, QUOTE_CACHE_STALE_TTL=5)
+class LocMemQuoteCacheTests(QuoteCacheTests, SimpleTestCase):
+    pass
+
+
+class FileQuoteCacheTests(QuoteCacheTests, SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'quotes': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp.name},
+            },
+            QUOTE_CACHE_TTL=1,
+            QUOTE_CACHE_STALE_TTL=5,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        super().setUp()
+
+
+class UpsertHistoricalPricesTests(TestCase):
+
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+
+    def test_full_load_uses_a_handful_of_queries(self):
+        # SELECT stored dates plus one INSERT per batch; SQLite caps a batch by its
+        # bound-parameter limit, so the count is bounded rather than fixed.
+        with CaptureQueriesContext(connection) as queries:
+            result = upsert_historical_prices(self.stock, make_price_rows(2500))
+        self.assertLess(len(queries), 25)
+        self.assertEqual(result, (2500, 0, 0))
+        self.assertEqual(HistoricalPrice.objects.filter(stock=self.stock).count(), 2500)
+
+    def test_reload_only_writes_new_and_changed_rows(self):
+        upsert_historical_prices(self.stock, make_price_rows(10))
+        rows = make_price_rows(12)
+        rows[3]['close_price'] = Decimal('1.2300')
+        result = upsert_historical_prices(self.stock, rows)
+        self.assertEqual(result, (2, 1, 9))
+        self.assertEqual(HistoricalPrice.objects.get(stock=self.stock, date=rows[3]['date']).close_price, Decimal('1.23'))
+
+    def test_sub_cent_noise_is_not_an_update(self):
+        upsert_historical_prices(self.stock, make_price_rows(5))
+        rows = make_price_rows(5)
+        for row in rows:
+            row['open_price'] = Decimal('99.5001')
+        with self.assertNumQueries(3):
+            result = upsert_historical_prices(self.stock, rows)
+        self.assertEqual(result, (0, 0, 5))
+
+    def test_price_columns_upsert_like_rows(self):
+        upsert_historical_prices(self.stock, make_price_rows(10))
+        columns = PriceColumns.from_rows(make_price_rows(12))
+        columns.close_price[3] = Decimal('1.2300')
+        self.assertEqual(upsert_historical_prices(self.stock, columns), (2, 1, 9))
+        self.assertEqual(HistoricalPrice.objects.get(stock=self.stock, date=columns.dates[3]).close_price, Decimal('1.23'))
+
+
+class MarketCalendarTests(SimpleTestCase):
+
+    def test_2024_holidays(self):
+        expected = {
+            date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29), date(2024, 5, 27),
+            date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2), date(2024, 11, 28), date(2024, 12, 25),
+        }
+        self.assertEqual(market_holidays(2024), expected)
+
+    def test_weekend_holidays_are_observed(self):
+        self.assertFalse(is_trading_day(date(2021, 12, 24)))  # Christmas on a Saturday
+        self.assertFalse(is_trading_day(date(2022, 6, 20)))  # Juneteenth on a Sunday
+        self.assertTrue(is_trading_day(date(2021, 12, 31)))  # New Year's Day 2022 on a Saturday
+
+    def test_latest_expected_bar(self):
+        saturday = datetime(2024, 7, 6, 12, 0, tzinfo=MARKET_TZ)
+        self.assertEqual(latest_expected_bar(saturday), date(2024, 7, 5))
+        before_close = datetime(2024, 7, 5, 10, 0, tzinfo=MARKET_TZ)
+        self.assertEqual(latest_expected_bar(before_close), date(2024, 7, 3))  # July 4th closed
+        after_close = datetime(2024, 7, 5, 16, 30, tzinfo=MARKET_TZ)
+        self.assertEqual(latest_expected_bar(after_close), date(2024, 7, 5))
+
+
+class IncrementalHistorySyncTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        self.monday_evening = datetime(2024, 7, 8, 17, 0, tzinfo=MARKET_TZ)
+
+    def test_choose_outputsize(self):
+        self.assertEqual(choose_outputsize(None, date(2024, 7, 5)), 'full')
+        self.assertIsNone(choose_outputsize(date(2024, 7, 5), date(2024, 7, 5)))
+        self.assertEqual(choose_outputsize(date(2024, 7, 1), date(2024, 7, 5)), 'compact')
+        self.assertEqual(choose_outputsize(date(2023, 7, 1), date(2024, 7, 5)), 'full')
+
+    def test_weekend_is_not_stale(self):
+        upsert_historical_prices(self.stock, make_price_rows(1, start=date(2024, 7, 5)))
+        fetcher = mock.Mock()
+        sunday = datetime(2024, 7, 7, 12, 0, tzinfo=MARKET_TZ)
+        self.assertIsNone(sync_stock_history(self.stock, now=sunday, fetcher=fetcher))
+        fetcher.assert_not_called()
+
+    def test_small_gap_fetches_compact(self):
+        upsert_historical_prices(self.stock, make_price_rows(1, start=date(2024, 7, 5)))
+        fetcher = mock.Mock(return_value=make_price_rows(4, start=date(2024, 7, 5)))
+        result = sync_stock_history(self.stock, now=self.monday_evening, fetcher=fetcher)
+        fetcher.assert_called_once_with('IBM', outputsize='compact')
+        self.assertEqual(result.inserted, 3)
+
+    def test_cold_start_fetches_full(self):
+        fetcher = mock.Mock(return_value=make_price_rows(10))
+        sync_stock_history(self.stock, now=self.monday_evening, fetcher=fetcher)
+        fetcher.assert_called_once_with('IBM', outputsize='full')
+
+    def test_unpublished_bar_is_not_refetched_until_the_check_expires(self):
+        upsert_historical_prices(self.stock, make_price_rows(1, start=date(2024, 7, 5)))
+        fetcher = mock.Mock(return_value=make_price_rows(1, start=date(2024, 7, 5)))  # Monday's bar isn't out yet
+        sync_stock_history(self.stock, now=self.monday_evening, fetcher=fetcher)
+        self.assertIsNone(sync_stock_history(self.stock, now=self.monday_evening, fetcher=fetcher))
+        self.assertEqual(fetcher.call_count, 1)
+        # The next expected bar is a new check.
+        sync_stock_history(self.stock, now=self.monday_evening + timedelta(days=1), fetcher=fetcher)
+        self.assertEqual(fetcher.call_count, 2)
+        caches['quotes'].clear()
+        sync_stock_history(self.stock, now=self.monday_evening, fetcher=fetcher)
+        self.assertEqual(fetcher.call_count, 3)
+
+    def test_failed_fetch_is_retried_on_the_next_call(self):
+        upsert_historical_prices(self.stock, make_price_rows(1, start=date(2024, 7, 5)))
+        fetcher = mock.Mock(side_effect=[None, make_price_rows(2, start=date(2024, 7, 5))])  # Rate-limited, then fine
+        self.assertIsNone(sync_stock_history(self.stock, now=self.monday_evening, fetcher=fetcher))
+        self.assertEqual(sync_stock_history(self.stock, now=self.monday_evening, fetcher=fetcher).inserted, 1)
+        self.assertEqual(fetcher.call_count, 2)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def test_calls_are_spaced_to_the_per_minute_quota(self):
+        clock = FakeClock()
+        bucket = TokenBucket(5, clock=clock, sleep=clock.sleep)
+        for _ in range(6):
+            bucket.acquire()
+        self.assertAlmostEqual(clock.now, 60.0)
+
+    def test_retry_backs_off_then_gives_up(self):
+        clock = FakeClock()
+        flaky = mock.Mock(side_effect=[None, RuntimeError('boom'), Decimal('5')])
+        flaky.__name__ = 'flaky'
+        self.assertEqual(call_with_retry(flaky, 'IBM', retries=3, backoff=1, sleep=clock.sleep), Decimal('5'))
+        self.assertEqual(len(clock.sleeps), 2)
+        self.assertGreater(clock.sleeps[1], clock.sleeps[0] * 0.3)
+        always_none = mock.Mock(return_value=None, __name__='always_none')
+        self.assertIsNone(call_with_retry(always_none, retries=2, backoff=1, sleep=clock.sleep))
+        self.assertEqual(always_none.call_count, 3)
+
+
+class SyncMarketDataTests(TransactionTestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        self.ibm = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        self.aapl = Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        upsert_historical_prices(self.aapl, make_price_rows(1, start=date(2024, 7, 5)))
+        self.sunday = datetime(2024, 7, 7, 12, 0, tzinfo=MARKET_TZ)
+
+    def test_sync_symbols_with_injected_fetchers(self):
+        history_fetcher = mock.Mock(return_value=make_price_rows(3, start=date(2024, 7, 3)))
+        quote_fetcher = mock.Mock(return_value=Decimal('190.10'))
+        results = sync_symbols(
+            Stock.objects.all(), workers=2, rate_per_minute=6000, now=self.sunday,
+            history_fetcher=history_fetcher, quote_fetcher=quote_fetcher,
+        )
+        by_symbol = {r.symbol: r for r in results}
+        # IBM was cold: one full history call, and its quote comes from the stored close.
+        history_fetcher.assert_called_once_with('IBM', outputsize='full')
+        self.assertEqual(by_symbol['IBM'].price, Decimal('102.00'))
+        # AAPL history is current over the weekend, so only its quote is fetched.
+        quote_fetcher.assert_called_once_with('AAPL')
+        self.assertIsNone(by_symbol['AAPL'].history)
+        self.assertEqual(quote_cache.get_quote('AAPL', mock.Mock()), Decimal('190.10'))
+        self.assertFalse(any(r.error for r in results))
+
+    def test_command_reports_progress_and_failures(self):
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch('trading.market_sync.fetch_daily_historical_data', return_value=None), \
+                mock.patch('trading.market_sync.fetch_current_price', return_value=None), \
+                mock.patch('trading.market_sync.time.sleep'):
+            call_command('sync_market_data', 'ibm', retries=1, backoff=0, rate=6000, stdout=out, stderr=err)
+        self.assertIn('[1/1] IBM', err.getvalue())
+        self.assertIn('Synced 0/1 symbols', out.getvalue())
+
+
+def daily_series_response(closes):
+    """An Alpha Vantage TIME_SERIES_DAILY body for {date string: close}."""
+    return {
+        'Meta Data': {},
+        'Time Series (Daily)': {
+            day: {'1. open': close, '2. high': close, '3. low': close, '4. close': close, '5. volume': '100'}
+            for day, close in closes.items()
+        },
+    }
+
+
+class AsyncQuoteTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+
+    def test_concurrent_async_misses_share_one_upstream_call(self):
+        calls = []
+
+        async def fetcher(symbol):
+            calls.append(symbol)
+            await asyncio.sleep(0.05)
+            return Decimal('42.00')
+
+        async def lookups():
+            return await asyncio.gather(*(quote_cache.aget_quote('ibm', fetcher) for _ in range(50)))
+
+        self.assertEqual(asyncio.run(lookups()), [Decimal('42.00')] * 50)
+        self.assertEqual(calls, ['IBM'])
+        # The async path shares entries with the sync one.
+        self.assertEqual(quote_cache.get_quote('IBM', mock.Mock()), Decimal('42.00'))
+
+    def test_async_session_is_pooled_per_loop(self):
+        async def get_twice():
+            first = async_client.get_session()
+            self.assertIs(first, async_client.get_session())
+            await async_client.aclose_session()
+            return first
+
+        self.assertIsNot(asyncio.run(get_twice()), asyncio.run(get_twice()))
+
+    def test_lifespan_shutdown_closes_the_session(self):
+        from stock_trader.asgi import application
+
+        async def serve():
+            session = async_client.get_session()
+            messages = asyncio.Queue()
+            for kind in ('lifespan.startup', 'lifespan.shutdown'):
+                messages.put_nowait({'type': kind})
+            sent = []
+            await application({'type': 'lifespan'}, messages.get, lambda message: asyncio.sleep(0, sent.append(message)))
+            return session.closed, [message['type'] for message in sent]
+
+        self.assertEqual(asyncio.run(serve()), (True, ['lifespan.startup.complete', 'lifespan.shutdown.complete']))
+
+    def test_aiohttp_is_only_needed_by_the_async_endpoints(self):
+        self.addCleanup(importlib.reload, async_client)
+        with mock.patch.dict(sys.modules, {'aiohttp': None}):  # None makes the import fail
+            importlib.reload(async_client)
+        with self.assertRaisesMessage(ImproperlyConfigured, 'pip install aiohttp'):
+            asyncio.run(async_client.aget_json('http://127.0.0.1/', 'IBM'))
+
+    def test_afetch_current_price_against_stub_server(self):
+        body = json.dumps(daily_series_response({'2024-07-03': '10.00', '2024-07-05': '11.50'})).encode()
+        requests_seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests_seen.append(self.path)
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        async def fetch():
+            try:
+                return await async_client.afetch_current_price('IBM')
+            finally:
+                await async_client.aclose_session()
+
+        reset_provider()
+        self.addCleanup(reset_provider)
+        with override_settings(ALPHA_VANTAGE_URL=f"http://127.0.0.1:{server.server_port}/query",
+                               MARKET_DATA_PROVIDER='trading.market_data.AlphaVantageProvider'):
+            self.assertEqual(asyncio.run(fetch()), Decimal('11.50'))
+        self.assertIn('symbol=IBM&outputsize=compact', requests_seen[0])
+
+
+@override_settings(SYNC_HISTORY_IN_REQUESTS=False)
+class AsyncTradingViewTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        quote_cache.set_quote('IBM', Decimal('100.00'))
+        reset_price_store()
+        self.async_client.force_login(self.user)
+
+    async def test_async_buy_then_sell(self):
+        response = await self.async_client.post('/async/buy/', {'symbol': 'ibm', 'quantity': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['new_cash_balance'], 9000.0)
+        response = await self.async_client.post('/async/sell/', {'symbol': 'IBM', 'quantity': 4})
+        self.assertEqual(response.json()['new_cash_balance'], 9400.0)
+        holding = await Holding.objects.aget(user_profile=self.profile, stock=self.stock)
+        self.assertEqual(holding.quantity, 6)
+        self.assertEqual(await Transaction.objects.acount(), 2)
+
+    async def test_async_sell_without_holding_is_404(self):
+        response = await self.async_client.post('/async/sell/', {'symbol': 'IBM', 'quantity': 1})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_async_stock_details(self):
+        await sync_to_async(upsert_historical_prices)(self.stock, make_price_rows(3))
+        response = await self.async_client.get('/api/async/stock_details/ibm/')
+        data = response.json()
+        self.assertEqual(data['current_price'], 100.0)
+        self.assertEqual(len(data['historical_data']['labels']), 3)
+
+
+class QuoteStreamTests(TestCase):
+
+    def test_1000_subscribers_cost_one_poll_per_symbol_per_interval(self):
+        polls = {'IBM': 0, 'AAPL': 0}
+
+        async def fetch(symbol):
+            polls[symbol] += 1
+            return Decimal(polls[symbol])  # A new price every poll
+
+        async def watch():
+            broadcaster = QuoteBroadcaster(fetch, interval=0.05)
+            subscriptions = [broadcaster.subscribe(['ibm', 'AAPL']) for _ in range(1000)]
+            started = time.monotonic()
+            await asyncio.sleep(0.3)
+            intervals = (time.monotonic() - started) / 0.05
+            # Nobody read anything: each client holds only the newest price per symbol.
+            received = [await subscription.get(timeout=0) for subscription in subscriptions]
+            for subscription in subscriptions:
+                subscription.close()
+            stopped_at = dict(polls)
+            await asyncio.sleep(0.15)
+            return intervals, received, stopped_at, len(broadcaster), subscriptions[0].conflated
+
+        intervals, received, stopped_at, producers, conflated = asyncio.run(watch())
+        for symbol in ('IBM', 'AAPL'):
+            self.assertGreaterEqual(stopped_at[symbol], 2)
+            self.assertLessEqual(stopped_at[symbol], intervals + 1)
+        self.assertEqual(received, [{'IBM': Decimal(stopped_at['IBM']), 'AAPL': Decimal(stopped_at['AAPL'])}] * 1000)
+        self.assertEqual(conflated, stopped_at['IBM'] + stopped_at['AAPL'] - 2)
+        # Closing the last subscription stops each symbol's producer.
+        self.assertEqual((producers, polls), (0, stopped_at))
+
+    def test_late_subscriber_gets_the_last_price_at_once(self):
+        async def fetch(symbol):
+            return Decimal('42.00')
+
+        async def watch():
+            broadcaster = QuoteBroadcaster(fetch, interval=60)
+            first = broadcaster.subscribe(['IBM'])
+            self.assertEqual(await first.get(timeout=1), {'IBM': Decimal('42.00')})
+            second = broadcaster.subscribe(['IBM'])
+            updates = await second.get(timeout=0)
+            first.close()
+            self.assertEqual(len(broadcaster), 1)  # Still referenced by the second client
+            second.close()
+            return updates, len(broadcaster), broadcaster.polls['IBM']
+
+        self.assertEqual(asyncio.run(watch()), ({'IBM': Decimal('42.00')}, 0, 1))
+
+    async def test_stream_view_sends_quote_events(self):
+        user = await sync_to_async(User.objects.create_user)('trader', password='secret')
+        await UserProfile.objects.acreate(user=user)
+        await Stock.objects.acreate(symbol='IBM', name='International Business Machines')
+        caches['quotes'].clear()
+        quote_cache.set_quote('IBM', Decimal('100.00'))
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get('/api/quotes/stream/?symbols=ibm,NOPE')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        chunk = await anext(events)
+        await events.aclose()
+        self.assertEqual(chunk, b'event: quote\ndata: {"symbol": "IBM", "price": 100.0}\n\n')
+        response = await self.async_client.get('/api/quotes/stream/')
+        self.assertEqual(response.status_code, 400)  # No holdings to default to
+
+    def test_stream_view_refuses_wsgi(self):
+        user = User.objects.create_user('trader', password='secret')
+        UserProfile.objects.create(user=user)
+        Stock.objects.create(symbol='IBM', name='International Business Machines')
+        self.client.force_login(user)
+        response = self.client.get('/api/quotes/stream/?symbols=IBM')
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+        self.assertContains(self.client.get('/home/'), 'const quoteStreaming = false;')
+
+
+class BatchQuoteAndPortfolioTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, cash_balance=Decimal('1000.00'))
+        self.client.force_login(self.user)
+
+    def hold(self, symbol, quantity, paid):
+        stock = Stock.objects.create(symbol=symbol, name=f'{symbol} Corp')
+        Holding.objects.create(user_profile=self.profile, stock=stock, quantity=quantity)
+        Transaction.objects.create(user_profile=self.profile, stock=stock, transaction_type='BUY', quantity=quantity, price=paid)
+        return stock
+
+    def test_get_quotes_fetches_only_misses(self):
+        quote_cache.set_quote('IBM', Decimal('10'))
+        fetcher = SlowFetcher(Decimal('20'))
+        self.assertEqual(quote_cache.get_quotes(['ibm', 'AAPL', 'MSFT'], fetcher), {'IBM': Decimal('10'), 'AAPL': Decimal('20'), 'MSFT': Decimal('20')})
+        self.assertEqual(fetcher.calls, 2)
+        stats = quote_cache.get_quote_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_quotes_endpoint(self):
+        self.hold('IBM', 1, '1')
+        quote_cache.set_quote('IBM', Decimal('150.25'))
+        response = self.client.get('/api/quotes/', {'symbols': 'ibm,NOPE'})
+        self.assertEqual(response.json(), {'quotes': {'IBM': 150.25}, 'unknown': ['NOPE']})
+        self.assertEqual(self.client.get('/api/quotes/').status_code, 400)
+
+    def test_portfolio_valuation(self):
+        self.hold('IBM', 10, '100.00')
+        self.hold('AAPL', 5, '200.00')
+        quote_cache.set_quote('IBM', Decimal('110.00'))
+        quote_cache.set_quote('AAPL', Decimal('190.00'))
+        data = self.client.get('/api/portfolio/').json()
+        self.assertEqual(data['positions_value'], 2050.0)
+        self.assertEqual(data['total_equity'], 3050.0)
+        self.assertEqual(data['unrealized_pnl'], 50.0)
+        self.assertEqual([p['symbol'] for p in data['positions']], ['AAPL', 'IBM'])
+        self.assertEqual(data['positions'][1]['unrealized_pnl'], 100.0)
+
+    def test_portfolio_query_count_does_not_grow_with_holdings(self):
+        for i in range(30):
+            self.hold(f'S{i}', 1, '1.00')
+            quote_cache.set_quote(f'S{i}', Decimal('2.00'))
+        # Session, user, profile, holdings joined with stocks, buy totals.
+        with self.assertNumQueries(5):
+            data = self.client.get('/api/portfolio/').json()
+        self.assertEqual(data['unrealized_pnl'], 30.0)
+
+
+class ChartDataTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.client.force_login(self.user)
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        quote_cache.set_quote('IBM', Decimal('100.00'))
+        reset_price_store()
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        ys = [1.0] * 1000
+        ys[500] = 50.0
+        keep = lttb(list(range(1000)), ys, 20)
+        self.assertEqual(len(keep), 20)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(500, keep)
+        self.assertEqual(lttb([1, 2], [1, 2], 20), [0, 1])
+
+    def test_bucket_ohlc_weekly(self):
+        rows = [
+            (date(2024, 7, 1).toordinal() - EPOCH_ORDINAL, 10, 12, 9, 11, 100),
+            (date(2024, 7, 2).toordinal() - EPOCH_ORDINAL, 11, 15, 10, 14, 200),
+            (date(2024, 7, 8).toordinal() - EPOCH_ORDINAL, 14, 14, 13, 13, 50),
+        ]
+        bars = bucket_ohlc(PriceSeries('IBM', np.array(rows, dtype=float).T.copy()), 'weekly')
+        self.assertEqual(np.datetime_as_string(bars['dates']).tolist(), ['2024-07-01', '2024-07-08'])
+        self.assertEqual(bars['open'].tolist(), [10, 14])
+        self.assertEqual(bars['high'].tolist(), [15, 14])
+        self.assertEqual(bars['low'].tolist(), [9, 13])
+        self.assertEqual(bars['close'].tolist(), [14, 13])
+        self.assertEqual(bars['volume'].tolist(), [300, 50])
+
+    @override_settings(SYNC_HISTORY_IN_REQUESTS=False, CHART_DEFAULT_POINTS=50)
+    def test_stock_details_range_and_resolution(self):
+        upsert_historical_prices(self.stock, make_price_rows(400, start=date(2023, 1, 1)))
+        url = '/api/stock_details/IBM/'
+        self.assertEqual(len(self.client.get(url).json()['historical_data']['labels']), 50)
+        ranged = self.client.get(url, {'start': '2023-02-01', 'end': '2023-02-10', 'points': 100}).json()['historical_data']
+        self.assertEqual(ranged['labels'][0], '2023-02-01')
+        self.assertEqual(len(ranged['labels']), 10)
+        monthly = self.client.get(url, {'interval': 'monthly'}).json()['historical_data']
+        self.assertEqual(len(monthly['labels']), 14)
+        self.assertEqual(monthly['open_prices'][0], 99.5)
+        self.assertEqual(self.client.get(url, {'interval': 'hourly'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+
+
+class PriceStoreTests(TestCase):
+
+    def setUp(self):
+        reset_price_store()
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        upsert_historical_prices(self.stock, make_price_rows(30, start=date(2024, 1, 1)))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.snapshot_dir = tmp.name
+
+    def test_series_columns_and_range(self):
+        series = PriceStore().get('ibm')
+        self.assertEqual(len(series), 30)
+        self.assertEqual(series.close[:2].tolist(), [100.0, 101.0])
+        self.assertEqual(series.last_date, date(2024, 1, 30))
+        window = series.between(date(2024, 1, 10), date(2024, 1, 12))
+        self.assertEqual(np.datetime_as_string(window.dates).tolist(), ['2024-01-10', '2024-01-11', '2024-01-12'])
+
+    def test_lru_bound(self):
+        Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        store = PriceStore(max_symbols=1)
+        store.get('IBM')
+        store.get('AAPL')
+        self.assertEqual(list(store._resident), ['AAPL'])
+
+    def test_snapshots_are_memory_mapped_and_shared(self):
+        writer = PriceStore(snapshot_dir=self.snapshot_dir)
+        reader = PriceStore(snapshot_dir=self.snapshot_dir)  # stands in for another worker process
+        writer.get('IBM')
+        with self.assertNumQueries(0):
+            series = reader.get('IBM')
+        self.assertIsInstance(series.block, np.memmap)
+        upsert_historical_prices(self.stock, make_price_rows(1, start=date(2024, 1, 31)))
+        writer.refresh('IBM')
+        self.assertEqual(len(reader.get('IBM')), 31)
+
+    def test_ingest_refreshes_the_store(self):
+        self.assertEqual(len(get_price_store().get('IBM')), 30)
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_historical_prices(self.stock, make_price_rows(2, start=date(2024, 1, 31)))
+        self.assertEqual(len(get_price_store().get('IBM')), 32)
+
+
+def random_walk_series(count, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    block = np.vstack([np.arange(count, dtype=float), close, close * 1.01, close * 0.99, close, np.full(count, 1000.0)])
+    return PriceSeries('TEST', block)
+
+
+class FixedStore:
+    """Price store stand-in that hands out whatever series the test sets."""
+
+    def __init__(self, series):
+        self.series = series
+
+    def get(self, symbol):
+        return self.series
+
+
+class IndicatorTests(SimpleTestCase):
+
+    def test_ewm_matches_the_recursion(self):
+        x = random_walk_series(3000).close
+        for alpha in (2 / 201, 2 / 13, 1 / 14, 0.9):
+            expected = np.empty_like(x)
+            prev = x[0]
+            for i, value in enumerate(x):
+                prev = expected[i] = (1 - alpha) * prev + alpha * value
+            np.testing.assert_allclose(ewm(x, alpha), expected, rtol=1e-9)
+        # An alpha that rounds 1 - alpha to 1.0 leaves the mean at its seed.
+        np.testing.assert_array_equal(ewm(np.arange(10.), 2 / (1e17 + 1)), np.zeros(10))
+
+    def test_sma_and_drawdown(self):
+        series = PriceSeries('T', np.vstack([np.arange(5.0), [1, 2, 3, 2, 4.0], [0] * 5, [0] * 5, [1, 2, 3, 2, 4.0], [0] * 5]))
+        sma, _ = INDICATORS['sma'](window=2).compute(series)
+        np.testing.assert_allclose(sma['sma'], [np.nan, 1.5, 2.5, 2.5, 3.0])
+        drawdown, _ = INDICATORS['drawdown']().compute(series)
+        np.testing.assert_allclose(drawdown['drawdown'], [0, 0, 0, -1 / 3, 0])
+
+    def test_rsi_bounds(self):
+        rsi, _ = INDICATORS['rsi']().compute(random_walk_series(500))
+        values = rsi['rsi'][1:]
+        self.assertTrue(np.all((values >= 0) & (values <= 100)))
+
+    def test_incremental_extension_matches_full_recompute(self):
+        full = random_walk_series(600)
+        for name, cls in INDICATORS.items():
+            indicator = cls()
+            head, state = indicator.compute(PriceSeries('TEST', full.block[:, :550]))
+            tail, _ = indicator.extend(full, 550, state)
+            expected, _ = indicator.compute(full)
+            for key in expected:
+                np.testing.assert_allclose(np.concatenate([head[key], tail[key]]), expected[key], rtol=1e-9, err_msg=name)
+
+    def test_engine_memoizes_and_extends(self):
+        full = random_walk_series(600)
+        store = FixedStore(PriceSeries('TEST', full.block[:, :550]))
+        engine = IndicatorEngine(store=store)
+        first, _ = engine.compute('TEST', 'macd')
+        self.assertIs(engine.compute('TEST', 'macd')[0], first)
+        store.series = full
+        with mock.patch.object(INDICATORS['macd'], 'compute', side_effect=AssertionError('full recompute')):
+            extended, _ = engine.compute('TEST', 'macd')
+        self.assertEqual(len(extended['macd']), 600)
+        with self.assertRaises(ValueError):
+            engine.compute('TEST', 'sma', window='abc')
+        with self.assertRaises(ValueError):
+            engine.compute('TEST', 'stochastic')
+
+
+class IndicatorViewTests(TestCase):
+
+    def setUp(self):
+        reset_price_store()
+        reset_indicator_engine()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.client.force_login(self.user)
+        stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        upsert_historical_prices(stock, make_price_rows(30, start=date(2024, 1, 1)))
+
+    def test_indicator_endpoint(self):
+        data = self.client.get('/api/indicators/ibm/', {'name': 'sma', 'window': 3, 'end': '2024-01-05'}).json()
+        self.assertEqual(data['labels'][0], '2024-01-01')
+        self.assertEqual(data['values']['sma'], [None, None, 101.0, 102.0, 103.0])
+        ranged = self.client.get('/api/indicators/IBM/', {'name': 'bollinger', 'start': '2024-01-29'}).json()
+        self.assertEqual(ranged['labels'], ['2024-01-29', '2024-01-30'])
+        self.assertEqual(set(ranged['values']), {'middle', 'upper', 'lower'})
+        self.assertEqual(self.client.get('/api/indicators/IBM/', {'name': 'sma', 'span': 3}).status_code, 400)
+        for k in ('inf', 'nan', '-1'):
+            self.assertEqual(self.client.get('/api/indicators/IBM/', {'name': 'bollinger', 'k': k}).status_code, 400)
+        for name, param in (('ema', 'window'), ('rsi', 'window'), ('macd', 'slow')):
+            self.assertEqual(self.client.get('/api/indicators/IBM/', {'name': name, param: 10 ** 17}).status_code, 400)
+
+
+class TradeExecutionTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, cash_balance=Decimal('1000.00'))
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        quote_cache.set_quote('IBM', Decimal('100.00'))
+        self.client.force_login(self.user)
+
+    def test_buy_and_sell_update_balances_in_place(self):
+        result = execute_buy(self.profile.pk, self.stock, 3, Decimal('100.00'))
+        self.assertEqual(result.cash_balance, Decimal('700.00'))
+        execute_buy(self.profile.pk, self.stock, 2, Decimal('100.00'))
+        result = execute_sell(self.profile.pk, self.stock, 4, Decimal('120.00'))
+        self.assertEqual(result.cash_balance, Decimal('980.00'))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.cash_balance, Decimal('980.00'))
+        self.assertEqual(Holding.objects.get(user_profile=self.profile).quantity, 1)
+        execute_sell(self.profile.pk, self.stock, 1, Decimal('120.00'))
+        self.assertFalse(Holding.objects.exists())
+        self.assertEqual(Transaction.objects.count(), 4)
+
+    def test_rejected_trades_change_nothing(self):
+        with self.assertRaises(InsufficientFunds):
+            execute_buy(self.profile.pk, self.stock, 11, Decimal('100.00'))
+        with self.assertRaises(InsufficientShares):
+            execute_sell(self.profile.pk, self.stock, 1, Decimal('100.00'))
+        with self.assertRaises(TradeError):
+            execute_buy(self.profile.pk, self.stock, 0, Decimal('100.00'))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.cash_balance, Decimal('1000.00'))
+        self.assertFalse(Holding.objects.exists() or Transaction.objects.exists())
+
+    def test_views_report_rejections_as_400(self):
+        response = self.client.post('/buy/', {'symbol': 'IBM', 'quantity': 11})
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Insufficient funds.'))
+        self.client.post('/buy/', {'symbol': 'IBM', 'quantity': 2})
+        response = self.client.post('/sell/', {'symbol': 'IBM', 'quantity': 3})
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Insufficient shares to sell.'))
+        response = self.client.post('/sell/', {'symbol': 'IBM', 'quantity': 2})
+        self.assertEqual(response.json()['new_cash_balance'], 1000.0)
+
+
+class ConcurrentTradeTests(TransactionTestCase):
+    """Many threads trading one account must never overdraw it or sell shares it doesn't hold."""
+
+    def test_concurrent_buys_and_sells_keep_the_books_consistent(self):
+        user = User.objects.create_user('trader', password='secret')
+        profile = UserProfile.objects.create(user=user, cash_balance=Decimal('1000.00'))
+        stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        price = Decimal('10.00')
+        start = threading.Barrier(8)
+        outcomes = []
+
+        def trade(worker):
+            start.wait()
+            try:
+                for i in range(15):
+                    execute = execute_buy if (worker + i) % 3 else execute_sell
+                    try:
+                        execute(profile.pk, stock, 7, price)
+                        outcomes.append(execute)
+                    except TradeError:
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trade, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        buys = Transaction.objects.filter(transaction_type='BUY').count()
+        sells = Transaction.objects.filter(transaction_type='SELL').count()
+        self.assertEqual(buys + sells, len(outcomes))
+        self.assertGreater(sells, 0)
+        profile.refresh_from_db()
+        self.assertEqual(profile.cash_balance, Decimal('1000.00') - (buys - sells) * 7 * price)
+        self.assertGreaterEqual(profile.cash_balance, 0)
+        held = Holding.objects.filter(user_profile=profile).values_list('quantity', flat=True).first() or 0
+        self.assertEqual(held, (buys - sells) * 7)
+
+
+@override_settings(TRANSACTION_HISTORY_PAGE_SIZE=4, TRANSACTION_EXPORT_CHUNK_SIZE=3)
+class TransactionHistoryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.ibm = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        self.aapl = Stock.objects.create(symbol='AAPL', name='Apple Inc.')
+        for i in range(10):
+            Transaction.objects.create(
+                user_profile=self.profile, stock=self.ibm if i % 2 else self.aapl,
+                transaction_type='BUY', quantity=i + 1, price=Decimal('10.50'),
+            )
+        # Several rows share a timestamp, so ordering must fall back to id to stay stable.
+        Transaction.objects.filter(quantity__in=[4, 5, 6]).update(transaction_date=datetime(2024, 1, 2, 15, 30, tzinfo=MARKET_TZ))
+        self.client.force_login(self.user)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            response = self.client.get('/history/', {'cursor': cursor} if cursor else {})
+            rows = response.context['transactions']
+            self.assertLessEqual(len(rows), 4)
+            seen.extend(row.pk for row in rows)
+            pages += 1
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(pages, 3)
+        expected = list(Transaction.objects.order_by('-transaction_date', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_page_query_count_is_constant(self):
+        # Session, user, profile and one page of transactions joined with their stocks.
+        with self.assertNumQueries(4):
+            response = self.client.get('/history/')
+        self.assertContains(response, '$105.00')  # 10 x 10.50, computed in SQL
+
+    def test_export_reads_keyset_chunks(self):
+        # Session, user, profile, then four pages of three rows; shared timestamps fall back to id.
+        with self.assertNumQueries(7):
+            response = self.client.get('/history/export/', {'format': 'jsonl'})
+            records = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(records), 10)
+
+    def test_bad_cursor_is_400(self):
+        self.assertEqual(self.client.get('/history/', {'cursor': 'not-a-cursor'}).status_code, 400)
+
+    def test_streaming_exports(self):
+        response = self.client.get('/history/export/')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,date,type,symbol,quantity,price,total_amount')
+        self.assertEqual(len(lines), 11)
+        self.assertTrue(lines[1].endswith(',BUY,IBM,10,10.50,105.00'))
+        expected = list(Transaction.objects.order_by('-transaction_date', '-id').values_list('pk', flat=True))
+        self.assertEqual([int(line.split(',')[0]) for line in lines[1:]], expected)
+
+        response = self.client.get('/history/export/', {'format': 'jsonl'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 10)
+        self.assertEqual((records[0]['symbol'], records[0]['total_amount']), ('IBM', '105.00'))
+        self.assertEqual(self.client.get('/history/export/', {'format': 'xml'}).status_code, 400)
+
+
+@override_settings(SYNC_HISTORY_IN_REQUESTS=False)
+class QueryBudgetTests(TestCase):
+    """Pins the number of queries each view in views.py makes.
+
+    Every fixture holds many rows, so a per-row lookup (an N+1) shows up as a failure here
+    rather than as a slow page in production. The first two queries of every request are
+    the session and the user, loaded by the auth middleware.
+    """
+    HOLDINGS = 25
+
+    def setUp(self):
+        caches['quotes'].clear()
+        reset_price_store()
+        reset_indicator_engine()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user)
+        for i in range(self.HOLDINGS):
+            stock = Stock.objects.create(symbol=f'S{i}', name=f'Stock {i}')
+            Holding.objects.create(user_profile=self.profile, stock=stock, quantity=2)
+            Transaction.objects.create(user_profile=self.profile, stock=stock, transaction_type='BUY', quantity=2, price='5.00')
+            quote_cache.set_quote(stock.symbol, Decimal('6.00'))
+        self.stock = Stock.objects.get(symbol='S0')
+        upsert_historical_prices(self.stock, make_price_rows(60))
+        self.client.force_login(self.user)
+
+    def test_home(self):
+        # Profile, holdings joined with stocks; the stock universe is searched through /api/search/.
+        with self.assertNumQueries(4):
+            response = self.client.get('/home/')
+        self.assertContains(response, 'Stock 24')
+        # Then the portfolio fragment comes from the cache until the account changes.
+        with self.assertNumQueries(2):
+            response = self.client.get('/home/')
+        self.assertContains(response, 'Stock 24')
+
+    def test_home_fragment_follows_trades(self):
+        self.client.get('/home/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/sell/', {'symbol': 'S1', 'quantity': 2})
+        with self.assertNumQueries(4):
+            response = self.client.get('/home/')
+        self.assertNotContains(response, 'holding-row-S1"')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get('/reset_account/')
+        self.assertContains(self.client.get('/home/'), 'You currently have no stock holdings.')
+
+    def test_logout(self):
+        # Re-reads and deletes the session.
+        with self.assertNumQueries(4):
+            self.client.get('/logout/')
+
+    def test_buy(self):
+        # Profile and stock, then the trade: lock the profile, debit cash, find the holding,
+        # add shares, insert the transaction. SAVEPOINT/RELEASE stand in for BEGIN/COMMIT here.
+        with self.assertNumQueries(11):
+            response = self.client.post('/buy/', {'symbol': 'S1', 'quantity': 1})
+        self.assertEqual(response.status_code, 200)
+
+    def test_sell(self):
+        # Profile, stock, holding, then the trade: lock the profile, remove shares, drop an
+        # emptied holding, credit cash, insert the transaction, plus the savepoint pair.
+        with self.assertNumQueries(12):
+            response = self.client.post('/sell/', {'symbol': 'S1', 'quantity': 1})
+        self.assertEqual(response.status_code, 200)
+
+    def test_reset_account(self):
+        # Profile, then in one savepoint: reset the cash, cancel open orders, one DELETE
+        # each for transactions, holdings and today's snapshots, retire pruned archive rows,
+        # and the reset marker.
+        with self.assertNumQueries(12):
+            self.client.get('/reset_account/')
+        self.assertFalse(Holding.objects.exists())
+
+    def test_transaction_history(self):
+        # Profile, one page of transactions joined with their stocks.
+        with self.assertNumQueries(4):
+            self.client.get('/history/')
+
+    def test_transaction_export(self):
+        # Profile, then one query per TRANSACTION_EXPORT_CHUNK_SIZE rows exported.
+        with self.assertNumQueries(4):
+            response = self.client.get('/history/export/')
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), self.HOLDINGS + 1)
+
+    def test_stock_details(self):
+        # Stock, then the price store loads the history once; the second read is served from memory.
+        with self.assertNumQueries(4):
+            self.client.get('/api/stock_details/S0/')
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/stock_details/S0/')
+        self.assertEqual(len(response.json()['historical_data']['labels']), 60)
+
+    def test_quotes(self):
+        # One query resolves every requested symbol.
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/quotes/', {'symbols': ','.join(f'S{i}' for i in range(self.HOLDINGS))})
+        self.assertEqual(len(response.json()['quotes']), self.HOLDINGS)
+
+    def test_search(self):
+        # The first lookup builds the symbol index; later ones never touch the database.
+        reset_symbol_index()
+        with self.assertNumQueries(3):
+            self.client.get('/api/search/', {'q': 'S1'})
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/search/', {'q': 'stock'})
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_portfolio(self):
+        # Profile, holdings joined with stocks, buy totals.
+        with self.assertNumQueries(5):
+            self.client.get('/api/portfolio/')
+
+    def test_indicators(self):
+        # Stock, then one history load; later indicators reuse the resident series.
+        with self.assertNumQueries(4):
+            self.client.get('/api/indicators/S0/', {'name': 'sma'})
+        with self.assertNumQueries(3):
+            self.client.get('/api/indicators/S0/', {'name': 'rsi'})
+
+    def test_portfolio_history(self):
+        # Profile, then one range scan of the snapshots.
+        PortfolioSnapshot.objects.bulk_create(
+            PortfolioSnapshot(user_profile=self.profile, date=date(2024, 1, 1) + timedelta(days=i),
+                              cash_balance=100, positions_value=i, total_equity=100 + i)
+            for i in range(60)
+        )
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/portfolio/history/')
+        self.assertEqual(len(response.json()['snapshots']), 60)
+
+    def test_orders(self):
+        for i in range(self.HOLDINGS):
+            place_order(self.profile.pk, Stock.objects.get(symbol=f'S{i}'), 'SELL', 'LIMIT', 1, limit_price='9.00')
+        # Profile, then the orders joined with their stocks.
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/orders/', {'status': 'open'})
+        self.assertEqual(len(response.json()['orders']), self.HOLDINGS)
+        # Profile and stock, then in one savepoint: reserve the shares (a guarded UPDATE) and insert the order.
+        with self.assertNumQueries(8):
+            response = self.client.post('/api/orders/', {'symbol': 'S1', 'side': 'SELL', 'order_type': 'LIMIT', 'quantity': 1, 'limit_price': '9.00'})
+        self.assertEqual(response.json()['order']['status'], 'OPEN')
+
+    def test_cancel_order(self):
+        order = place_order(self.profile.pk, self.stock, 'SELL', 'LIMIT', 1, limit_price='9.00')
+        # Profile, then in one savepoint: lock the profile, then the order, release its shares
+        # and close it; then its stock for the response.
+        with self.assertNumQueries(10):
+            response = self.client.post(f'/api/orders/{order.pk}/cancel/')
+        self.assertEqual(response.json()['order']['status'], 'CANCELLED')
+
+    def test_batch_orders(self):
+        legs = [{'symbol': f'S{i}', 'side': 'SELL', 'quantity': 1} for i in range(self.HOLDINGS)]
+        # Profile and every leg's stock in one query, then in one savepoint: lock the profile,
+        # the legs' holdings, credit cash, one bulk UPDATE of the holdings, one bulk INSERT.
+        with self.assertNumQueries(11):
+            response = self.client.post('/api/orders/batch/', json.dumps({'legs': legs}), content_type='application/json')
+        self.assertEqual(len(response.json()['results']), self.HOLDINGS)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics(self):
+        # Rendered from this process's registry; the session is never loaded.
+        with self.assertNumQueries(0):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+
+class PortfolioSnapshotTests(TestCase):
+
+    def setUp(self):
+        reset_price_store()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        upsert_historical_prices(self.stock, make_price_rows(10, start=date(2024, 7, 1)))  # Closes 100, 101, ...
+        self.client.force_login(self.user)
+
+    def trade(self, kind, quantity, price, when):
+        transaction = Transaction.objects.create(
+            user_profile=self.profile, stock=self.stock, transaction_type=kind, quantity=quantity, price=price
+        )
+        Transaction.objects.filter(pk=transaction.pk).update(transaction_date=when)
+        amount = quantity * Decimal(price)
+        self.profile.cash_balance += -amount if kind == 'BUY' else amount
+        self.profile.save()
+
+    def equity(self):
+        return {
+            row.date: row.total_equity
+            for row in PortfolioSnapshot.objects.filter(user_profile=self.profile)
+        }
+
+    def test_incremental_build(self):
+        self.trade('BUY', 10, '100.00', datetime(2024, 7, 1, 10, 0, tzinfo=MARKET_TZ))
+        self.assertEqual(build_snapshots(self.profile, through=date(2024, 7, 3)), 3)
+        self.assertEqual(self.equity(), {
+            date(2024, 7, 1): Decimal('10000.00'), date(2024, 7, 2): Decimal('10010.00'), date(2024, 7, 3): Decimal('10020.00'),
+        })
+        # The next run starts from the stored Jul 3 state and skips the Jul 4 holiday.
+        self.trade('SELL', 5, '104.00', datetime(2024, 7, 5, 11, 0, tzinfo=MARKET_TZ))
+        with self.assertNumQueries(5):  # Last snapshot, new trades, one insert in a savepoint
+            written = build_snapshots(self.profile, through=date(2024, 7, 8))
+        self.assertEqual(written, 2)
+        snapshot = PortfolioSnapshot.objects.get(date=date(2024, 7, 8))
+        self.assertEqual((snapshot.cash_balance, snapshot.holdings), (Decimal('9520.00'), {'IBM': 5}))
+        self.assertEqual(snapshot.total_equity, Decimal('10055.00'))
+        self.assertEqual(build_snapshots(self.profile, through=date(2024, 7, 8)), 0)
+
+        with self.assertNumQueries(4):
+            data = self.client.get('/api/portfolio/history/', {'start': '2024-07-02'}).json()
+        self.assertEqual([row['date'] for row in data['snapshots']], ['2024-07-02', '2024-07-03', '2024-07-05', '2024-07-08'])
+        self.assertEqual(data['snapshots'][0]['time_weighted_return'], 0)
+        self.assertAlmostEqual(data['time_weighted_return'], 10055 / 10010 - 1, places=6)
+
+    def test_reset_restarts_history_from_starting_cash(self):
+        self.trade('BUY', 10, '100.00', datetime(2024, 7, 1, 10, 0, tzinfo=MARKET_TZ))
+        build_snapshots(self.profile, through=date(2024, 7, 3))
+        today = datetime.now(MARKET_TZ).date()
+        PortfolioSnapshot.objects.create(
+            user_profile=self.profile, date=today, cash_balance=0, positions_value=0, total_equity=0
+        )
+        self.profile.reset_account()
+        marker = PortfolioSnapshot.objects.get(user_profile=self.profile, date=today)
+        self.assertTrue(marker.is_reset)
+        self.assertEqual(marker.total_equity, Decimal('10000.00'))
+        self.assertEqual(PortfolioSnapshot.objects.filter(date__lt=today).count(), 3)
+
+        # A trade after the reset is folded into the marker day when it is rebuilt.
+        self.trade('BUY', 1, '50.00', datetime.now(MARKET_TZ))
+        self.assertEqual(build_snapshots(self.profile, through=today), 1)
+        marker = PortfolioSnapshot.objects.get(user_profile=self.profile, date=today)
+        self.assertTrue(marker.is_reset)
+        self.assertEqual(marker.cash_balance, Decimal('9950.00'))
+        self.assertEqual(marker.total_equity, Decimal('10059.00'))  # Priced at the last stored close, 109
+
+        data = self.client.get('/api/portfolio/history/').json()
+        self.assertAlmostEqual(data['time_weighted_return'], (10020 / 10000) * (10059 / 10000) - 1, places=6)
+
+    def test_command(self):
+        self.trade('BUY', 10, '100.00', datetime(2024, 7, 1, 10, 0, tzinfo=MARKET_TZ))
+        out = io.StringIO()
+        call_command('build_portfolio_snapshots', through='2024-07-03', stdout=out)
+        self.assertIn('trader: +3 snapshots', out.getvalue())
+
+
+class AccountLifecycleTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, cash_balance=Decimal('500.00'))
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        Holding.objects.create(user_profile=self.profile, stock=self.stock, quantity=5)
+        for day in range(1, 6):
+            Transaction.objects.create(user_profile=self.profile, stock=self.stock, transaction_type='BUY', quantity=1, price=Decimal('100.00'))
+        for day, transaction in enumerate(Transaction.objects.order_by('pk'), start=1):
+            Transaction.objects.filter(pk=transaction.pk).update(transaction_date=datetime(2024, 7, day, 10, 0, tzinfo=MARKET_TZ))
+
+    def test_reset_is_all_or_nothing(self):
+        with mock.patch.object(PortfolioSnapshot.objects, 'create', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                self.profile.reset_account()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.cash_balance, Decimal('500.00'))
+        self.assertEqual((Transaction.objects.count(), Holding.objects.count()), (5, 1))
+
+    def test_reset_can_archive_transactions(self):
+        ids = list(Transaction.objects.order_by('pk').values_list('pk', flat=True))
+        self.profile.reset_account(archive=True)
+        self.assertEqual((Transaction.objects.count(), Holding.objects.count()), (0, 0))
+        archived = ArchivedTransaction.objects.order_by('original_id')
+        self.assertEqual(list(archived.values_list('original_id', flat=True)), ids)
+        self.assertEqual(archived[0].transaction_date, datetime(2024, 7, 1, 10, 0, tzinfo=MARKET_TZ))
+        self.assertEqual({row.reason for row in archived}, {ArchivedTransaction.RESET})
+        self.assertEqual(self.profile.cash_balance, Decimal('10000.00'))
+
+    def test_prune_history_archives_in_chunks(self):
+        upsert_historical_prices(self.stock, make_price_rows(10, start=date(2024, 6, 25)))
+        PortfolioSnapshot.objects.create(user_profile=self.profile, date=date(2024, 7, 4), cash_balance=500,
+                                         positions_value=400, total_equity=900, holdings={'IBM': 4})
+        out = io.StringIO()
+        call_command('prune_history', transactions_before='2024-07-04', prices_before='2024-07-01',
+                     archive=True, chunk_size=2, stdout=out)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(ArchivedTransaction.objects.filter(reason=ArchivedTransaction.PRUNE).count(), 3)
+        self.assertEqual(HistoricalPrice.objects.filter(date__lt=date(2024, 7, 1)).count(), 0)
+        self.assertEqual(HistoricalPrice.objects.count(), 4)
+        self.assertIn('archived transactions: 2 removed\narchived transactions: 3 removed', out.getvalue())
+        self.assertIn('Removed 3 transactions and 6 prices', out.getvalue())
+
+    def test_prune_keeps_what_snapshots_and_cost_basis_need(self):
+        Transaction.objects.filter(transaction_date__day=1).update(price=Decimal('50.00'))
+        self.assertEqual(average_buy_prices(self.profile), {self.stock.pk: Decimal('90.00')})
+        # No snapshot covers the cutoff yet, so nothing can go.
+        self.assertEqual(sum(prune_transactions(datetime(2024, 7, 4, tzinfo=MARKET_TZ), archive=True)), 0)
+        PortfolioSnapshot.objects.create(user_profile=self.profile, date=date(2024, 7, 4), cash_balance=500,
+                                         positions_value=400, total_equity=900, holdings={'IBM': 4})
+        self.assertEqual(sum(prune_transactions(datetime(2024, 7, 4, tzinfo=MARKET_TZ), archive=True)), 3)
+        self.assertEqual(average_buy_prices(self.profile), {self.stock.pk: Decimal('90.00')})
+        # A reset's archive is the old account's and doesn't count.
+        self.profile.reset_account(archive=True)
+        Transaction.objects.create(user_profile=self.profile, stock=self.stock, transaction_type='BUY', quantity=1, price=Decimal('70.00'))
+        self.assertEqual(average_buy_prices(self.profile), {self.stock.pk: Decimal('70.00')})
+
+
+class SymbolSearchTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        reset_symbol_index()
+        self.addCleanup(reset_symbol_index)
+        for symbol, name in [('IBM', 'International Business Machines'), ('IBMX', 'IBM Index Fund'),
+                             ('AAPL', 'Apple Inc.'), ('BIB', 'Ibis Biotech'), ('MSFT', 'Microsoft Corp')]:
+            Stock.objects.create(symbol=symbol, name=name)
+        self.user = User.objects.create_user('trader', password='secret')
+        self.client.force_login(self.user)
+
+    def search(self, query):
+        return [result['symbol'] for result in self.client.get('/api/search/', {'q': query}).json()['results']]
+
+    def test_ranks_exact_then_symbol_prefix_then_name_words(self):
+        self.assertEqual(self.search('ibm'), ['IBM', 'IBMX'])
+        self.assertEqual(self.search('ib'), ['IBM', 'IBMX', 'BIB'])
+        self.assertEqual(self.search('business mach'), ['IBM'])
+        self.assertEqual(self.search('  '), [])
+
+    def test_index_follows_stock_changes(self):
+        self.assertEqual(self.search('micro'), ['MSFT'])
+        index = get_symbol_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Stock.objects.create(symbol='MU', name='Micron Technology')
+            Stock.objects.filter(symbol='MSFT').get().delete()
+            apple = Stock.objects.get(symbol='AAPL')
+            apple.name = 'Apple Microdevices'
+            apple.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_symbol_index().search('micro'), [('MU', 'Micron Technology'), ('AAPL', 'Apple Microdevices')])
+        self.assertIs(get_symbol_index(), index)  # Updated in place, not rebuilt
+
+    def test_change_in_another_process_rebuilds(self):
+        index = get_symbol_index()
+        Stock.objects.bulk_create([Stock(symbol='NVDA', name='NVIDIA Corp')])  # No signals, as from a bulk load
+        self.assertEqual(self.search('nv'), [])
+        index.version -= 1  # As if another worker bumped the shared version
+        self.assertEqual(self.search('nv'), ['NVDA'])
+        self.assertIsNot(get_symbol_index(), index)
+
+    def test_sorted_index_add_and_remove(self):
+        index = SymbolIndex([(1, 'AA', 'Alcoa'), (2, 'AAL', 'American Airlines')])
+        index.add(3, 'A', 'Agilent Technologies')
+        index.add(1, 'AAA', 'Alcoa Holdings')  # Renamed symbol replaces the old entries
+        self.assertEqual([symbol for symbol, _ in index.search('a')], ['A', 'AAA', 'AAL'])
+        index.remove(2)
+        self.assertEqual(index.search('american'), [])
+        self.assertEqual(len(index), 2)
+
+
+class LoadUniverseTests(TestCase):
+
+    def setUp(self):
+        reset_price_store()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = Path(self.directory.name)
+        Stock.objects.create(symbol='IBM', name='IBM (kept)')
+        (self.root / 'listing.csv').write_text(
+            "symbol,name,exchange,assetType\n"
+            "IBM,International Business Machines,NYSE,Stock\n"
+            "aapl,Apple Inc,NASDAQ,Stock\n"
+            "MSFT,Microsoft Corporation,NASDAQ,Stock\n"
+            "WAYTOOLONGSYMBOL,Skipped,NYSE,Stock\n"
+        )
+        history = self.root / 'history'
+        history.mkdir()
+        (history / 'AAPL.csv').write_text("timestamp,open,high,low,close,volume\n"
+                                          "2024-07-02,10.004,11,9,10.5,100\n2024-07-01,10,11,9,10,200\n")
+        with gzip.open(history / 'MSFT.csv.gz', 'wt') as f:
+            f.write("date,open,high,low,close,volume\n2024-07-01,400,410,395,405,300\n")
+        (history / 'BAD.csv').write_text("date,open\n2024-07-01,1\n")
+        (history / 'IBM.csv').write_text("date,close\n2024-07-01,1\n")
+
+    def test_loads_listing_and_history(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('load_universe', str(self.root / 'listing.csv'), history_dir=str(self.root / 'history'),
+                     workers=2, batch_size=2, stdout=out, stderr=err)
+        self.assertEqual(dict(Stock.objects.values_list('symbol', 'name')), {
+            'IBM': 'IBM (kept)', 'AAPL': 'Apple Inc', 'MSFT': 'Microsoft Corporation',
+        })
+        aapl = list(HistoricalPrice.objects.filter(stock__symbol='AAPL').values_list('date', 'open_price', 'volume'))
+        self.assertEqual(aapl, [(date(2024, 7, 1), Decimal('10.00'), 200), (date(2024, 7, 2), Decimal('10.00'), 100)])
+        self.assertEqual(HistoricalPrice.objects.filter(stock__symbol='MSFT').count(), 1)
+        self.assertIn('IBM: ValueError', err.getvalue())
+        self.assertIn('Skipped 1 history files', out.getvalue())
+        self.assertIn('Loaded 2 new stocks and read 3 bars from 2 files (1 failed)', out.getvalue())
+
+    def test_rerun_keeps_stored_rows(self):
+        call_command('load_universe', str(self.root / 'listing.csv'), history_dir=str(self.root / 'history'),
+                     workers=1, stdout=io.StringIO(), stderr=io.StringIO())
+        HistoricalPrice.objects.filter(stock__symbol='MSFT').update(close_price=Decimal('1.00'))
+        out = io.StringIO()
+        with self.assertNumQueries(5):  # Count, one INSERT, count; then the stock ids and one INSERT for every bar.
+            call_command('load_universe', str(self.root / 'listing.csv'), history_dir=str(self.root / 'history'),
+                         workers=1, stdout=out, stderr=io.StringIO())
+        self.assertIn('Loaded 0 new stocks', out.getvalue())
+        self.assertEqual(HistoricalPrice.objects.get(stock__symbol='MSFT').close_price, Decimal('1.00'))
+        self.assertEqual(HistoricalPrice.objects.count(), 3)
+
+
+def price_block(closes, first_day=19000):
+    closes = np.asarray(closes, dtype=float)
+    days = np.arange(first_day, first_day + len(closes), dtype=float)
+    return np.vstack([days, closes, closes, closes, closes, np.full(len(closes), 1000.0)])
+
+
+class BacktestTests(SimpleTestCase):
+
+    def test_threshold_strategy_matches_trade_semantics(self):
+        universe = Universe(['AAA'], {'AAA': price_block([100, 106, 110, 99, 98, 107])})
+        result = simulate(Strategy('close > 105', 'close < 100', allocation=0.5), universe)
+        self.assertEqual(
+            [(t.transaction_type, t.quantity, t.price) for t in result.trades],
+            [('BUY', 47, 106.0), ('SELL', 47, 99.0), ('BUY', 46, 107.0)],
+        )
+        # 10000 - 47 * 106 = 5018; +47 * 99 = 9671; -46 * 107 = 4749.
+        np.testing.assert_allclose(result.cash, [10000, 5018, 5018, 9671, 9671, 4749])
+        np.testing.assert_allclose(result.equity, [10000, 10000, 10188, 9671, 9671, 9671])
+
+    def test_buys_that_cash_cannot_cover_are_skipped(self):
+        blocks = {symbol: price_block([10, 20]) for symbol in ('AAA', 'BBB', 'CCC')}
+        universe = Universe(['AAA', 'BBB', 'CCC'], blocks)
+        result = simulate(Strategy('close > 15', 'close > 1000', allocation=0.45), universe)
+        self.assertEqual([t.symbol for t in result.trades], ['AAA', 'BBB'])
+        self.assertEqual(result.cash[-1], 10000 - 2 * 225 * 20)
+
+    def test_universe_aligns_symbols_and_respects_the_range(self):
+        universe = Universe(['AAA', 'BBB'], {'AAA': price_block([1, 2, 3, 4]), 'BBB': price_block([5, 6], first_day=19002)},
+                            start=date(2022, 1, 9))
+        self.assertEqual(universe.days.tolist(), [19001, 19002, 19003])
+        np.testing.assert_array_equal(universe.operand('close'), [[2, np.nan], [3, 5], [4, 6]])
+        # Indicators see bars before start, so the first in-range SMA is already warm.
+        np.testing.assert_allclose(universe.operand('sma(window=2)')[:, 0], [1.5, 2.5, 3.5])
+        with self.assertRaises(ValueError):
+            universe.operand('macd(fast=3)')
+        with self.assertRaises(ValueError):
+            universe.operand('nope(window=2)')
+
+    def test_crossover_and_sweep(self):
+        closes = 100 + 10 * np.sin(np.arange(300) / 10)
+        universe = Universe(['AAA', 'BBB'], {'AAA': price_block(closes), 'BBB': price_block(closes[::-1])})
+        strategy = Strategy('sma(window={fast}) crosses_above sma(window={slow})',
+                            'sma(window={fast}) crosses_below sma(window={slow})')
+        single = simulate(strategy.format(fast=5, slow=20), universe)
+        self.assertGreater(len(single.trades), 4)
+        self.assertEqual(single.trades[0].transaction_type, 'BUY')
+
+        grid = {'fast': [3, 5], 'slow': [20, 30]}
+        serial = sweep(strategy, grid, universe, workers=1)
+        parallel = sweep(strategy, grid, universe, workers=2)
+        self.assertEqual([r.params for r in serial], [{'fast': 3, 'slow': 20}, {'fast': 3, 'slow': 30}, {'fast': 5, 'slow': 20}, {'fast': 5, 'slow': 30}])
+        self.assertEqual(serial, parallel)
+        self.assertEqual(serial[2].trades, len(single.trades))
+
+
+class TriggerEngineTests(SimpleTestCase):
+
+    def test_each_book_triggers_on_its_side_of_the_level(self):
+        engine = TriggerEngine()
+        engine.add(1, 'IBM', 'BUY', Order.LIMIT, limit_price='95')
+        engine.add(2, 'IBM', 'SELL', Order.LIMIT, limit_price='105')
+        engine.add(3, 'IBM', 'BUY', Order.STOP, stop_price='110')
+        engine.add(4, 'IBM', 'SELL', Order.STOP, stop_price='90')
+        engine.add(5, 'AAPL', 'BUY', Order.LIMIT, limit_price='1000')
+        self.assertEqual(engine.on_price('IBM', 100), ([], []))
+        self.assertEqual(engine.on_price('IBM', 95), ([1], []))
+        self.assertEqual(engine.on_price('IBM', 89.99), ([4], []))
+        self.assertEqual(engine.on_price('IBM', 120), ([3, 2], []))
+        self.assertEqual(len(engine), 1)
+
+    def test_only_crossed_orders_are_popped_best_level_first(self):
+        engine = TriggerEngine()
+        for order_id in range(1000):
+            engine.add(order_id, 'IBM', 'BUY', Order.LIMIT, limit_price=order_id / 10)
+        fills, _ = engine.on_price('IBM', 99.75)
+        self.assertEqual(fills, [999, 998])
+        self.assertEqual(len(engine), 998)
+
+    def test_stop_limit_activates_then_rests_as_a_limit(self):
+        engine = TriggerEngine()
+        engine.add(1, 'IBM', 'BUY', Order.STOP_LIMIT, limit_price='101', stop_price='100')
+        engine.add(2, 'IBM', 'BUY', Order.STOP_LIMIT, limit_price='104', stop_price='100')
+        self.assertEqual(engine.on_price('IBM', 102), ([2], [1, 2]))
+        self.assertEqual(engine.on_price('IBM', 101.5), ([], []))
+        self.assertEqual(engine.on_price('IBM', 101), ([1], []))
+
+    def test_discarded_orders_never_trigger(self):
+        engine = TriggerEngine()
+        engine.add(1, 'IBM', 'SELL', Order.LIMIT, limit_price='10')
+        engine.discard(1)
+        self.assertEqual(engine.on_price('IBM', 50), ([], []))
+
+    def test_heaps_are_compacted_once_discarded_orders_dominate(self):
+        engine = TriggerEngine()
+        for order_id in range(3000):
+            engine.add(order_id, 'IBM', 'BUY', Order.LIMIT, limit_price=order_id % 50 + 1)
+        for order_id in range(2900):
+            engine.discard(order_id)
+            entries = sum(len(heap) for book in engine._books.values() for heap in book.values())
+            self.assertLessEqual(entries - len(engine), max(COMPACT_MIN_DEAD, len(engine)))
+        self.assertLess(entries, 1000)
+        fills, _ = engine.on_price('IBM', 50)
+        self.assertEqual(sorted(fills), [order_id for order_id in range(2900, 3000) if order_id % 50 == 49])
+
+
+class OrderTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        reset_order_matcher()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, cash_balance=Decimal('1000.00'))
+        self.stock = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        self.client.force_login(self.user)
+
+    def refresh(self):
+        self.profile.refresh_from_db()
+        return self.profile
+
+    def test_limit_buy_reserves_cash_and_fills_when_triggered(self):
+        order = place_order(self.profile.pk, self.stock, 'buy', 'limit', 8, limit_price='100.00')
+        self.assertEqual(self.refresh().reserved_cash, Decimal('800.00'))
+        # Reserved cash can't be spent by a market order.
+        with self.assertRaises(InsufficientFunds):
+            execute_buy(self.profile.pk, self.stock, 3, Decimal('100.00'))
+        matcher = get_order_matcher()
+        self.assertEqual(matcher.on_price('IBM', Decimal('100.50')), [])
+        filled = matcher.on_price('IBM', Decimal('99.00'))
+        self.assertEqual([(o.pk, o.status, o.fill_price) for o in filled], [(order.pk, Order.FILLED, Decimal('99.00'))])
+        profile = self.refresh()
+        self.assertEqual((profile.cash_balance, profile.reserved_cash), (Decimal('208.00'), Decimal('0.00')))
+        self.assertEqual(Holding.objects.get().quantity, 8)
+        self.assertEqual(Transaction.objects.get().price, Decimal('99.00'))
+
+    def test_stop_sell_reserves_shares_and_cancel_releases_them(self):
+        execute_buy(self.profile.pk, self.stock, 10, Decimal('50.00'))
+        order = place_order(self.profile.pk, self.stock, 'SELL', 'STOP', 6, stop_price='45.00')
+        get_order_matcher().load_new_orders()
+        self.assertEqual(Holding.objects.get().reserved_quantity, 6)
+        with self.assertRaises(InsufficientShares):
+            execute_sell(self.profile.pk, self.stock, 5, Decimal('50.00'))
+        with self.assertRaises(InsufficientShares):
+            place_order(self.profile.pk, self.stock, 'SELL', 'LIMIT', 5, limit_price='60.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_order(self.profile.pk, order.pk)
+        self.assertEqual(Holding.objects.get().reserved_quantity, 0)
+        self.assertEqual(len(get_order_matcher().engine), 0)
+        with self.assertRaises(TradeError):
+            cancel_order(self.profile.pk, order.pk)
+        # An order cancelled by another process may still trigger here until the next resync; the fill skips it.
+        self.assertEqual(fill_order(order.pk, Decimal('40.00')).status, Order.CANCELLED)
+        self.assertEqual(Holding.objects.get().quantity, 10)
+
+    def test_fill_and_cancel_lock_the_profile_before_the_order(self):
+        def tables_locked(call, *args):
+            with CaptureQueriesContext(connection) as queries:
+                call(*args)
+            selects = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+            return ['profile' if 'FROM "trading_userprofile"' in sql else 'order' for sql in selects
+                    if 'FROM "trading_userprofile"' in sql or 'FROM "trading_order"' in sql]
+        order = place_order(self.profile.pk, self.stock, 'BUY', 'LIMIT', 1, limit_price='10.00')
+        # The fill reads the owner without a lock, then locks profile, then order, as reset_account does.
+        self.assertEqual(tables_locked(fill_order, order.pk, Decimal('10.00'))[:3], ['order', 'profile', 'order'])
+        order = place_order(self.profile.pk, self.stock, 'BUY', 'LIMIT', 1, limit_price='10.00')
+        self.assertEqual(tables_locked(cancel_order, self.profile.pk, order.pk)[:2], ['profile', 'order'])
+
+    def test_matcher_resync_picks_up_late_commits_and_drops_closed_orders(self):
+        first = place_order(self.profile.pk, self.stock, 'BUY', 'LIMIT', 1, limit_price='90.00')
+        second = place_order(self.profile.pk, self.stock, 'BUY', 'LIMIT', 1, limit_price='80.00')
+        third = place_order(self.profile.pk, self.stock, 'BUY', 'LIMIT', 1, limit_price='70.00')
+        # first commits only after the matcher has seen the higher ids.
+        Order.objects.filter(pk=first.pk).update(status=Order.REJECTED)
+        matcher = OrderMatcher(resync_interval=3600)
+        matcher.on_price('IBM', Decimal('100.00'))
+        Order.objects.filter(pk=first.pk).update(status=Order.OPEN)
+        Order.objects.filter(pk=third.pk).update(status=Order.CANCELLED)  # By another process
+        self.assertEqual(matcher.on_price('IBM', Decimal('85.00')), [])
+        matcher.resync_interval = 0
+        filled = matcher.on_price('IBM', Decimal('85.00'))
+        self.assertEqual([o.pk for o in filled], [first.pk])
+        self.assertEqual(set(matcher.engine.order_ids()), {second.pk})
+
+    def test_stop_buy_reserves_a_margin_for_the_gap(self):
+        order = place_order(self.profile.pk, self.stock, 'BUY', 'STOP', 9, stop_price='100.00')
+        self.assertEqual(self.refresh().reserved_cash, Decimal('945.00'))
+        with self.assertRaises(InsufficientFunds):
+            execute_buy(self.profile.pk, self.stock, 1, Decimal('100.00'))
+        filled = fill_order(order.pk, Decimal('104.00'))
+        self.assertEqual(filled.status, Order.FILLED)
+        profile = self.refresh()
+        self.assertEqual((profile.cash_balance, profile.reserved_cash), (Decimal('64.00'), Decimal('0.00')))
+
+    def test_fill_that_cash_no_longer_covers_is_rejected(self):
+        order = place_order(self.profile.pk, self.stock, 'BUY', 'STOP', 9, stop_price='100.00')
+        execute_buy(self.profile.pk, self.stock, 1, Decimal('50.00'))
+        # Gapped through the stop and past the margin: 9 x 120 is more than the 950 cash left.
+        filled = fill_order(order.pk, Decimal('120.00'))
+        self.assertEqual(filled.status, Order.REJECTED)
+        profile = self.refresh()
+        self.assertEqual((profile.cash_balance, profile.reserved_cash), (Decimal('950.00'), Decimal('0.00')))
+
+    def test_validation(self):
+        for kwargs in ({'side': 'HOLD', 'order_type': 'LIMIT', 'limit_price': '1'},
+                       {'side': 'BUY', 'order_type': 'LIMIT'},
+                       {'side': 'BUY', 'order_type': 'STOP_LIMIT', 'limit_price': '1'},
+                       {'side': 'BUY', 'order_type': 'LIMIT', 'limit_price': '-1'}):
+            with self.assertRaises(TradeError):
+                place_order(self.profile.pk, self.stock, quantity=1, **kwargs)
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_endpoints(self):
+        quote_cache.set_quote('IBM', Decimal('100.00'))
+        response = self.client.post('/api/orders/', {'symbol': 'ibm', 'side': 'BUY', 'order_type': 'LIMIT', 'quantity': 2, 'limit_price': '90'})
+        resting = response.json()['order']
+        self.assertEqual(resting['status'], 'OPEN')
+        # A limit above the current quote is marketable and fills at the quote right away.
+        response = self.client.post('/api/orders/', {'symbol': 'IBM', 'side': 'BUY', 'order_type': 'LIMIT', 'quantity': 3, 'limit_price': '105'})
+        self.assertEqual((response.json()['order']['status'], response.json()['order']['fill_price']), ('FILLED', 100.0))
+        response = self.client.post('/api/orders/', {'symbol': 'IBM', 'side': 'BUY', 'order_type': 'LIMIT', 'quantity': 100, 'limit_price': '90'})
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Insufficient funds.'))
+
+        self.assertEqual([o['id'] for o in self.client.get('/api/orders/', {'status': 'open'}).json()['orders']], [resting['id']])
+        response = self.client.post(f"/api/orders/{resting['id']}/cancel/")
+        self.assertEqual(response.json()['order']['status'], 'CANCELLED')
+        self.assertEqual(self.client.get('/api/portfolio/').json()['reserved_cash'], 0.0)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        reset_metrics_registry()
+        reset_provider()
+        self.addCleanup(reset_provider)
+        self.user = User.objects.create_user('trader', password='secret')
+        UserProfile.objects.create(user=self.user)
+        Stock.objects.create(symbol='IBM', name='International Business Machines')
+        self.client.force_login(self.user)
+
+    def test_requests_are_measured_per_view(self):
+        self.client.get('/api/quotes/', {'symbols': 'IBM'})  # Miss: one market data call
+        self.client.get('/api/quotes/', {'symbols': 'IBM'})  # Hit
+        registry = get_metrics_registry()
+        self.assertEqual(registry.value('http_request_duration_seconds', view='quotes', method='GET', status=200)[0], 2)
+        # Two requests of three queries each: session, user, stocks.
+        self.assertEqual(registry.value('http_request_db_queries', view='quotes'), (2, 6))
+        self.assertEqual(registry.value('http_request_upstream_calls', view='quotes'), (2, 1))
+        self.assertEqual(registry.value('upstream_requests_total', symbol='IBM', kind='quote', outcome='ok'), 1)
+        self.assertEqual(registry.value('http_request_cache_events_total', view='quotes', event='misses'), 1)
+        self.assertEqual(registry.value('http_request_cache_events_total', view='quotes', event='hits'), 1)
+
+        with override_settings(METRICS_TOKEN='s3cret'):
+            body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_db_queries_bucket{view="quotes",le="3"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{view="quotes",method="GET",status="200"} 2', body)
+        self.assertIn('quote_cache_events_total{event="hits"} 1', body)
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)  # Off until a token is configured
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    def test_slow_sampled_requests_write_folded_stacks(self):
+        directory = tempfile.mkdtemp()
+        with override_settings(METRICS_PROFILE_SAMPLE_RATE=1, METRICS_SLOW_REQUEST_SECONDS=0, METRICS_PROFILE_DIR=directory, METRICS_PROFILE_INTERVAL=0.001):
+            with mock.patch('trading.views.get_quotes', side_effect=lambda symbols: time.sleep(0.05) or {}):
+                self.client.get('/api/quotes/', {'symbols': 'IBM'})
+        [name] = os.listdir(directory)
+        self.assertTrue(name.startswith('quotes-'))
+        with open(os.path.join(directory, name)) as f:
+            self.assertIn('views.py:quotes_view', f.read())
+        self.assertEqual(get_metrics_registry().value('slow_request_profiles_total', view='quotes'), 1)
+
+    @override_settings(TRANSACTION_EXPORT_CHUNK_SIZE=2)
+    def test_streaming_responses_are_measured_to_the_last_chunk(self):
+        profile = UserProfile.objects.get(user=self.user)
+        for _ in range(5):
+            Transaction.objects.create(user_profile=profile, stock=Stock.objects.get(symbol='IBM'), transaction_type='BUY', quantity=1, price='1.00')
+        response = self.client.get('/history/export/')
+        registry = get_metrics_registry()
+        self.assertEqual(registry.value('http_request_duration_seconds', view='export_transactions', method='GET', status=200), 0)
+        b''.join(response.streaming_content)
+        response.close()
+        # Session, user and profile, then three keyset chunks read while streaming.
+        self.assertEqual(registry.value('http_request_db_queries', view='export_transactions'), (1, 6))
+
+    @override_settings(METRICS_PROFILE_SAMPLE_RATE=1)
+    async def test_async_requests_are_not_sampled(self):
+        with mock.patch('trading.metrics.StackSampler') as sampler:
+            await self.async_client.get('/metrics')
+        sampler.assert_not_called()
+
+    def test_stack_sampler_sees_the_busy_function(self):
+        def spin():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = StackSampler(interval=0.001).start()
+        spin()
+        sampler.stop()
+        self.assertIn('tests.py:spin', sampler.folded())
+
+
+class BatchOrderTests(TestCase):
+
+    def setUp(self):
+        caches['quotes'].clear()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, cash_balance=Decimal('1000.00'))
+        self.ibm = Stock.objects.create(symbol='IBM', name='International Business Machines')
+        self.aapl = Stock.objects.create(symbol='AAPL', name='Apple')
+        Holding.objects.create(user_profile=self.profile, stock=self.aapl, quantity=10)
+        quote_cache.set_quote('IBM', Decimal('100.00'))
+        quote_cache.set_quote('AAPL', Decimal('50.00'))
+        self.client.force_login(self.user)
+
+    def batch(self, *legs):
+        body = {'legs': [{'symbol': symbol, 'side': side, 'quantity': quantity} for symbol, side, quantity in legs]}
+        return self.client.post('/api/orders/batch/', json.dumps(body), content_type='application/json')
+
+    def test_sells_fund_buys_in_one_transaction(self):
+        # Buying 14 IBM (1400) only fits because selling all AAPL (500) funds it.
+        response = self.batch(('AAPL', 'sell', 10), ('ibm', 'BUY', 14))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['new_cash_balance'], 100.0)
+        self.assertEqual([(r['symbol'], r['status'], r['amount']) for r in data['results']],
+                         [('AAPL', 'FILLED', 500.0), ('IBM', 'FILLED', 1400.0)])
+        self.assertEqual(list(Holding.objects.filter(user_profile=self.profile).values_list('stock__symbol', 'quantity')), [('IBM', 14)])
+        self.assertEqual(Transaction.objects.filter(user_profile=self.profile).count(), 2)
+
+    def test_any_bad_leg_rejects_the_whole_batch(self):
+        response = self.batch(('IBM', 'BUY', 1), ('AAPL', 'SELL', 6), ('AAPL', 'SELL', 5), ('MSFT', 'BUY', 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['NOT_EXECUTED', 'NOT_EXECUTED', 'NOT_EXECUTED', 'REJECTED'])
+        response = self.batch(('IBM', 'BUY', 1), ('AAPL', 'SELL', 6), ('AAPL', 'SELL', 5))
+        self.assertEqual([r['status'] for r in response.json()['results']], ['NOT_EXECUTED', 'REJECTED', 'REJECTED'])
+        response = self.batch(('AAPL', 'SELL', 10), ('IBM', 'BUY', 16))
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Insufficient funds.'))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.cash_balance, Decimal('1000.00'))
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(self.batch(('IBM', 'BUY', 0)).json()['results'][0]['message'], 'quantity must be a positive whole number.')
+
+    def test_statement_count_does_not_grow_with_legs(self):
+        self.profile.cash_balance = Decimal('100000.00')
+        self.profile.save()
+        stocks = Stock.objects.bulk_create([Stock(symbol=f'S{i:02d}', name=f'Stock {i}') for i in range(30)])
+        for stock in stocks:
+            quote_cache.set_quote(stock.symbol, Decimal('10.00'))
+        counts = []
+        for batch in (stocks[:3], stocks[3:]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(*[(stock.symbol, 'BUY', 2) for stock in batch])
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Holding.objects.filter(user_profile=self.profile, stock__in=stocks, quantity=2).count(), 30)
+
+
+class MarketDataProviderTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_provider()
+        self.addCleanup(reset_provider)
+
+    def test_replay_provider_serves_recorded_csv_and_json(self):
+        history = fetch_daily_historical_data('ibm')
+        self.assertEqual(len(history), 150)
+        self.assertEqual(history[0]['date'], date(2024, 1, 2))
+        self.assertEqual(history[-1]['close_price'], Decimal('134.55'))
+        compact = fetch_daily_historical_data('IBM', outputsize='compact')
+        self.assertEqual((len(compact), compact[-1]['date']), (100, date(2024, 7, 29)))
+        self.assertEqual(fetch_current_price('IBM'), Decimal('134.55'))
+        self.assertEqual(fetch_current_price('AAPL'), Decimal('196.25'))
+        self.assertEqual(asyncio.run(async_client.afetch_current_price('AAPL')), Decimal('196.25'))
+        with mock.patch('builtins.print'):
+            self.assertIsNone(fetch_current_price('NOPE'))
+
+    def test_parse_daily_series_is_column_wise_and_oldest_first(self):
+        rows = parse_daily_series(daily_series_response({'2024-07-05': '11.5000', '2024-07-03': '10.0000'}), 'IBM')
+        self.assertIsInstance(rows, PriceColumns)
+        self.assertEqual(rows.dates, [date(2024, 7, 3), date(2024, 7, 5)])
+        self.assertEqual(rows.close_price, [Decimal('10.0000'), Decimal('11.5000')])
+        self.assertEqual(list(rows)[-1], {
+            'date': date(2024, 7, 5), 'open_price': Decimal('11.5'), 'high_price': Decimal('11.5'),
+            'low_price': Decimal('11.5'), 'close_price': Decimal('11.5'), 'volume': 100,
+        })
+        self.assertEqual(rows[-1:].dates, [date(2024, 7, 5)])
+
+    def test_parse_daily_series_skips_malformed_bars(self):
+        data = daily_series_response({'2024-07-01': '1.00', '2024-07-02': 'n/a', '2024-07-03': '3.00', '2024-07-05': '5.00'})
+        del data['Time Series (Daily)']['2024-07-03']['5. volume']
+        with mock.patch('builtins.print') as printed:
+            rows = parse_daily_series(data, 'IBM')
+        self.assertEqual(rows.dates, [date(2024, 7, 1), date(2024, 7, 5)])
+        self.assertEqual(printed.call_count, 2)
+
+    def test_replay_provider_rereads_changed_files(self):
+        directory = tempfile.mkdtemp()
+        path = f"{directory}/XYZ.csv"
+        with open(path, 'w') as f:
+            f.write('date,open,high,low,close,volume\n2024-07-01,1,1,1,1.50,10\n')
+        provider = ReplayProvider(directory)
+        self.assertEqual(provider.latest_price('xyz'), Decimal('1.50'))
+        with open(path, 'a') as f:
+            f.write('2024-07-02,1,1,1,2.25,10\n')
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+        self.assertEqual(provider.latest_price('XYZ'), Decimal('2.25'))
+
+    def test_alpha_vantage_provider_reuses_connections_and_times_out(self):
+        body = json.dumps(daily_series_response({'2024-07-05': '11.50'})).encode()
+        clients = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                clients.append(self.client_address)
+                if 'SLOW' in self.path:
+                    time.sleep(1)
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        with override_settings(ALPHA_VANTAGE_URL=f"http://127.0.0.1:{server.server_port}/query"):
+            provider = AlphaVantageProvider(timeout=0.2)
+            self.assertEqual(provider.latest_price('IBM'), Decimal('11.50'))
+            self.assertEqual(provider.daily_history('IBM')[0]['close_price'], Decimal('11.50'))
+            self.assertEqual(len(set(clients)), 1)  # Both requests rode one keep-alive connection
+            started = time.perf_counter()
+            with mock.patch('builtins.print'):
+                self.assertIsNone(provider.latest_price('SLOW'))
+            self.assertLess(time.perf_counter() - started, 0.9)
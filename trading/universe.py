@@ -0,0 +1,151 @@
+# trading/universe.py
+import csv
+import gzip
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from decimal import InvalidOperation
+from pathlib import Path
+from .ingest import _normalize_columns
+from .market_data import read_price_csv
+from .models import HistoricalPrice, Stock
+from .price_store import get_price_store
+from .search import invalidate_symbol_index
+
+SYMBOL_COLUMNS = ('symbol', 'ticker')
+NAME_COLUMNS = ('name', 'security name', 'company name')
+
+ParsedHistory = namedtuple('ParsedHistory', ['symbol', 'rows', 'error'])
+HistoryLoadResult = namedtuple('HistoryLoadResult', ['files', 'rows', 'failed', 'unknown'])
+
+
+def _open_text(path):
+    return gzip.open(path, 'rt', newline='') if str(path).endswith('.gz') else open(path, newline='')
+
+def _column(header, names, path):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    raise ValueError(f"{path} has no {' or '.join(names)} column")
+
+def read_listing(path):
+    """Yields (symbol, name) for every row of a listing CSV (.csv or .csv.gz), reading one line at a time.
+
+    Needs a symbol (or ticker) and a name column; Alpha Vantage's LISTING_STATUS export
+    and most exchange listing files work as they are. Symbols longer than Stock.symbol
+    allows are skipped.
+    """
+    max_symbol = Stock._meta.get_field('symbol').max_length
+    max_name = Stock._meta.get_field('name').max_length
+    with _open_text(path) as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        symbol_at, name_at = _column(header, SYMBOL_COLUMNS, path), _column(header, NAME_COLUMNS, path)
+        for record in reader:
+            if len(record) <= max(symbol_at, name_at):
+                continue
+            symbol = record[symbol_at].strip().upper()
+            if symbol and len(symbol) <= max_symbol:
+                yield symbol, (record[name_at].strip() or symbol)[:max_name]
+
+def load_listing(listing, batch_size=5000):
+    """Inserts the (symbol, name) pairs from listing as Stock rows; symbols already stored are left alone.
+
+    Returns the number of new stocks. Each batch is one INSERT that skips existing
+    symbols (bulk_create with ignore_conflicts), so a re-run or an overlapping listing
+    is cheap, and memory stays bounded however long the listing is.
+    """
+    before = Stock.objects.count()
+    batch = {}
+    for symbol, name in listing:
+        batch.setdefault(symbol, name)
+        if len(batch) >= batch_size:
+            Stock.objects.bulk_create([Stock(symbol=s, name=n) for s, n in batch.items()], ignore_conflicts=True)
+            batch = {}
+    if batch:
+        Stock.objects.bulk_create([Stock(symbol=s, name=n) for s, n in batch.items()], ignore_conflicts=True)
+    # bulk_create sends no post_save, so tell every worker's search index to rebuild.
+    invalidate_symbol_index()
+    return Stock.objects.count() - before
+
+
+def history_files(directory):
+    """SYMBOL.csv and SYMBOL.csv.gz files in directory, in symbol order."""
+    return sorted(
+        path for path in Path(directory).iterdir()
+        if path.is_file() and (path.name.endswith('.csv') or path.name.endswith('.csv.gz'))
+    )
+
+def _symbol_for(path):
+    return path.name.split('.', 1)[0].upper()
+
+def _init_worker():
+    from django.apps import apps
+    if not apps.ready:  # Spawned (not forked) workers start without Django configured.
+        import django
+        django.setup()
+
+def parse_history_file(path):
+    """Parses one history CSV into rounded (date, open, high, low, close, volume) tuples; runs in a pool worker."""
+    symbol = _symbol_for(path)
+    try:
+        rows = _normalize_columns(read_price_csv(path))
+    except (OSError, ValueError, TypeError, IndexError, InvalidOperation) as e:
+        return ParsedHistory(symbol, [], f"{type(e).__name__}: {e}")
+    return ParsedHistory(symbol, [(day, *values) for day, values in rows.items()], None)
+
+def _parsed(paths, workers):
+    """parse_history_file over paths in order, across workers processes.
+
+    At most a few files per worker are parsed ahead of the database writes, so a slow
+    database holds back the pool instead of the parsed files piling up in memory.
+    """
+    if workers == 1:
+        yield from map(parse_history_file, paths)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(parse_history_file, path))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def load_history(paths, workers=None, batch_size=5000, on_file=None):
+    """Inserts the bars in each SYMBOL.csv of paths as HistoricalPrice rows for that symbol's Stock.
+
+    Files are parsed in a process pool while this process writes; bars are inserted in
+    batches of batch_size spanning files, skipping dates already stored for a stock.
+    Files for symbols with no Stock row are skipped. on_file(parsed) is called per file.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    stock_ids = dict(Stock.objects.values_list('symbol', 'id'))
+    known = [path for path in paths if _symbol_for(path) in stock_ids]
+    files = rows = failed = 0
+    batch, loaded = [], []
+
+    for parsed in _parsed(known, workers):
+        if on_file is not None:
+            on_file(parsed)
+        if parsed.error:
+            failed += 1
+            continue
+        files += 1
+        rows += len(parsed.rows)
+        stock_id = stock_ids[parsed.symbol]
+        loaded.append(parsed.symbol)
+        for day, open_price, high_price, low_price, close_price, volume in parsed.rows:
+            batch.append(HistoricalPrice(
+                stock_id=stock_id, date=day, open_price=open_price, high_price=high_price,
+                low_price=low_price, close_price=close_price, volume=volume,
+            ))
+            if len(batch) >= batch_size:
+                HistoricalPrice.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    HistoricalPrice.objects.bulk_create(batch, ignore_conflicts=True)
+    store = get_price_store()
+    for symbol in loaded:
+        store.discard(symbol)  # Reloaded from the table on its next read.
+    return HistoryLoadResult(files, rows, failed, len(paths) - len(known))
@@ -1,27 +1,47 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout as auth_logout
-from .models import UserProfile, Stock, HistoricalPrice, Holding, Transaction
-from django.db import transaction as db_transaction
-from django.http import JsonResponse
+from .models import UserProfile, Stock, Holding, Order
+from .execution import BatchLeg, BatchRejected, execute_batch, execute_buy, execute_sell, TradeError
+from .orders import cancel_order, match_order, place_order
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
+from django.utils.functional import SimpleLazyObject
+from django.core.handlers.asgi import ASGIRequest
 from decimal import Decimal
-from .api_utils import fetch_daily_historical_data, fetch_current_price
-from datetime import datetime
+from .quote_cache import get_quote, get_quotes
+from .portfolio import value_portfolio
+from .metrics import get_metrics_registry
+from .snapshots import portfolio_history
+from .charting import chart_data, parse_chart_options
+from .indicators import get_indicator_engine
+from .ingest import sync_stock_history
+from .history import history_page, iter_csv, iter_json_lines, transaction_history
+from .search import get_symbol_index
+from .page_cache import fragment_cache_alias, holdings_version
+import hmac
 import json
+import math
+from datetime import date
+import numpy as np
 
 @login_required
 def home_view(request):
-    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-
-    stocks = Stock.objects.all()
-    portfolio_holdings = Holding.objects.filter(user_profile=user_profile)
+    """The trading page. The portfolio section is a per-user cached fragment keyed by
+    holdings_version, so the profile and holdings are only loaded when it has changed."""
+    # Lazy: neither query runs when the cached fragment is current.
+    user_profile = SimpleLazyObject(lambda: UserProfile.objects.get_or_create(user=request.user)[0])
+    portfolio_holdings = Holding.objects.filter(user_profile__user=request.user).select_related('stock')
 
     context = {
         'user_profile': user_profile,
-        'stocks': stocks,
         'portfolio_holdings': portfolio_holdings,
-        'cash_balance': user_profile.cash_balance,
+        'holdings_version': holdings_version(request.user.pk),
+        'fragment_cache': fragment_cache_alias(),
+        'fragment_ttl': getattr(settings, 'HOME_FRAGMENT_TTL', 300),
+        # /api/quotes/stream/ only works under ASGI; elsewhere the page just fetches prices.
+        'quote_streaming': isinstance(request, ASGIRequest),
     }
     return render(request, 'trading/home.html', context)
 
@@ -32,34 +52,20 @@ def buy_stock(request):
     stock_symbol = request.POST.get('symbol').upper()
     quantity = int(request.POST.get('quantity'))
     stock = get_object_or_404(Stock, symbol=stock_symbol)
-    current_price = fetch_current_price(stock.symbol) # **Get actual current price**
+    current_price = get_quote(stock.symbol) # Cached; goes upstream only on a miss
+    return _complete_buy(user_profile, stock, quantity, current_price)
 
+def _complete_buy(user_profile, stock, quantity, current_price):
+    """Executes a buy at current_price. Shared by the sync and async views."""
     if current_price is None:
         return JsonResponse({'success': False, 'message': 'Could not fetch current price for trading.'}, status=500)
-    total_cost = quantity * current_price
-    if user_profile.cash_balance < total_cost:
-        return JsonResponse({'success': False, 'message': 'Insufficient funds.'}, status=400)
     try:
-        with db_transaction.atomic():
-            user_profile.cash_balance -= total_cost
-            user_profile.save()
-            holding, created = Holding.objects.get_or_create(
-                user_profile=user_profile,
-                stock=stock,
-                defaults={'quantity': 0}
-            )
-            holding.quantity += quantity
-            holding.save()
-            Transaction.objects.create(
-                user_profile=user_profile,
-                stock=stock,
-                transaction_type='BUY',
-                quantity=quantity,
-                price=current_price # Record the actual price
-            )
-        return JsonResponse({'success': True, 'message': 'Stock bought successfully.', 'new_cash_balance': float(user_profile.cash_balance)})
+        result = execute_buy(user_profile.pk, stock, quantity, current_price)
+    except TradeError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Transaction failed: {str(e)}'}, status=500)
+    return JsonResponse({'success': True, 'message': 'Stock bought successfully.', 'new_cash_balance': float(result.cash_balance)})
 
 
 @login_required
@@ -69,32 +75,162 @@ def sell_stock(request):
     stock_symbol = request.POST.get('symbol').upper()
     quantity = int(request.POST.get('quantity'))
     stock = get_object_or_404(Stock, symbol=stock_symbol)
-    holding = get_object_or_404(Holding, user_profile=user_profile, stock=stock)
-    current_price = fetch_current_price(stock.symbol) # **Get actual current price**
+    get_object_or_404(Holding, user_profile=user_profile, stock=stock)
+    current_price = get_quote(stock.symbol) # Cached; goes upstream only on a miss
+    return _complete_sell(user_profile, stock, quantity, current_price)
+
+def _complete_sell(user_profile, stock, quantity, current_price):
+    """Executes a sell at current_price. Shared by the sync and async views."""
     if current_price is None:
         return JsonResponse({'success': False, 'message': 'Could not fetch current price for trading.'}, status=500)
-    if holding.quantity < quantity:
-        return JsonResponse({'success': False, 'message': 'Insufficient shares to sell.'}, status=400)
-    total_revenue = quantity * current_price
     try:
-        with db_transaction.atomic():
-            user_profile.cash_balance += total_revenue
-            user_profile.save()
-            holding.quantity -= quantity
-            if holding.quantity == 0:
-                holding.delete()
-            else:
-                holding.save()
-            Transaction.objects.create(
-                user_profile=user_profile,
-                stock=stock,
-                transaction_type='SELL',
-                quantity=quantity,
-                price=current_price # Record the actual price
-            )
-        return JsonResponse({'success': True, 'message': 'Stock sold successfully.', 'new_cash_balance': float(user_profile.cash_balance)})
+        result = execute_sell(user_profile.pk, stock, quantity, current_price)
+    except TradeError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Transaction failed: {str(e)}'}, status=500)
+    return JsonResponse({'success': True, 'message': 'Stock sold successfully.', 'new_cash_balance': float(result.cash_balance)})
+
+
+def _order_json(order):
+    return {
+        'id': order.pk,
+        'symbol': order.stock.symbol,
+        'side': order.side,
+        'order_type': order.order_type,
+        'quantity': order.quantity,
+        'limit_price': _money(order.limit_price),
+        'stop_price': _money(order.stop_price),
+        'stop_triggered': order.stop_triggered,
+        'status': order.status,
+        'fill_price': _money(order.fill_price),
+        'created_at': order.created_at.isoformat(),
+    }
+
+@login_required
+def orders_view(request):
+    """GET lists the user's orders (?status=OPEN to filter); POST places a limit, stop or stop-limit order.
+
+    POST fields: symbol, side (BUY/SELL), order_type (LIMIT/STOP/STOP_LIMIT), quantity, and
+    limit_price and/or stop_price. An order the current quote already crosses fills at once;
+    the rest are filled by the trigger engine as prices arrive.
+    """
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    if request.method == 'GET':
+        orders = Order.objects.filter(user_profile=user_profile).select_related('stock').order_by('-id')
+        if request.GET.get('status'):
+            orders = orders.filter(status=request.GET['status'].upper())
+        return JsonResponse({'orders': [_order_json(order) for order in orders[:200]]})
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Use GET or POST.'}, status=405)
+    stock = get_object_or_404(Stock, symbol=request.POST.get('symbol', '').upper())
+    try:
+        quantity = int(request.POST.get('quantity', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'quantity must be a whole number.'}, status=400)
+    try:
+        order = place_order(
+            user_profile.pk, stock, request.POST.get('side'), request.POST.get('order_type'), quantity,
+            request.POST.get('limit_price'), request.POST.get('stop_price'),
+        )
+    except TradeError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    current_price = get_quote(stock.symbol)
+    if current_price is not None:
+        order = match_order(order, current_price)
+    return JsonResponse({'success': True, 'order': _order_json(order)})
+
+def _parse_legs(body):
+    """[(symbol, side, quantity)] from a batch request body, plus {index: error} for malformed legs."""
+    legs, errors = [], {}
+    for index, leg in enumerate(body):
+        if not isinstance(leg, dict):
+            legs.append((None, None, None))
+            errors[index] = 'Each leg must be an object with symbol, side and quantity.'
+            continue
+        symbol, side, quantity = str(leg.get('symbol', '')).strip().upper(), str(leg.get('side', '')).upper(), leg.get('quantity')
+        legs.append((symbol, side, quantity))
+        if side not in ('BUY', 'SELL'):
+            errors[index] = 'side must be BUY or SELL.'
+        elif not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            errors[index] = 'quantity must be a positive whole number.'
+    return legs, errors
+
+def _leg_json(index, symbol, side, quantity, status, **extra):
+    return {'index': index, 'symbol': symbol, 'side': side, 'quantity': quantity, 'status': status, **extra}
+
+def _rejected_batch(legs, errors, message, status=400):
+    return JsonResponse({
+        'success': False,
+        'message': message,
+        'results': [
+            _leg_json(index, *leg, 'REJECTED', message=errors[index]) if index in errors else _leg_json(index, *leg, 'NOT_EXECUTED')
+            for index, leg in enumerate(legs)
+        ],
+    }, status=status)
+
+@login_required
+@require_POST
+def batch_orders_view(request):
+    """Executes a JSON list of market buy/sell legs all-or-nothing at current quotes.
+
+    Body: {"legs": [{"symbol": "IBM", "side": "BUY", "quantity": 10}, ...]}. Quotes for all
+    legs come from one batched lookup and the trades apply in one transaction, so the
+    cost barely grows with the number of legs. Sells fund buys in the same batch.
+    """
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    try:
+        body = json.loads(request.body).get('legs')
+    except (ValueError, AttributeError):
+        body = None
+    if not isinstance(body, list) or not body:
+        return JsonResponse({'success': False, 'message': 'Send a JSON body like {"legs": [{"symbol": "IBM", "side": "BUY", "quantity": 10}]}.'}, status=400)
+    max_legs = getattr(settings, 'ORDER_BATCH_MAX_LEGS', 100)
+    if len(body) > max_legs:
+        return JsonResponse({'success': False, 'message': f'At most {max_legs} legs per batch.'}, status=400)
+
+    legs, errors = _parse_legs(body)
+    stocks = Stock.objects.in_bulk({symbol for symbol, _, _ in legs if symbol}, field_name='symbol')
+    for index, (symbol, _, _) in enumerate(legs):
+        if index not in errors and symbol not in stocks:
+            errors[index] = f'Unknown symbol {symbol or "(blank)"}.'
+    if errors:
+        return _rejected_batch(legs, errors, 'No legs were executed; fix the rejected legs and resubmit.')
+    prices = get_quotes(stocks) # One cache round trip; misses fetched in parallel
+    for index, (symbol, _, _) in enumerate(legs):
+        if prices.get(symbol) is None:
+            errors[index] = 'Could not fetch current price for trading.'
+    if errors:
+        return _rejected_batch(legs, errors, 'No legs were executed; some prices are unavailable.', status=500)
+
+    try:
+        result = execute_batch(user_profile.pk, [BatchLeg(stocks[symbol], side, quantity, prices[symbol]) for symbol, side, quantity in legs])
+    except BatchRejected as e:
+        return _rejected_batch(legs, e.errors, str(e))
+    except TradeError as e:
+        return JsonResponse({'success': False, 'message': str(e), 'results': [
+            _leg_json(index, *leg, 'NOT_EXECUTED') for index, leg in enumerate(legs)
+        ]}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Transaction failed: {str(e)}'}, status=500)
+    return JsonResponse({
+        'success': True,
+        'new_cash_balance': float(result.cash_balance),
+        'results': [
+            _leg_json(index, symbol, side, quantity, 'FILLED', price=_money(transaction.price), amount=_money(transaction.quantity * transaction.price))
+            for index, ((symbol, side, quantity), transaction) in enumerate(zip(legs, result.transactions))
+        ],
+    })
+
+@login_required
+@require_POST
+def cancel_order_view(request, order_id):
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    try:
+        order = cancel_order(user_profile.pk, order_id)
+    except TradeError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({'success': True, 'order': _order_json(order)})
 
 
 @login_required
@@ -106,59 +242,199 @@ def reset_account(request):
 @login_required
 def transaction_history_view(request):
     user_profile = get_object_or_404(UserProfile, user=request.user)
-    transactions = Transaction.objects.filter(user_profile=user_profile).order_by('-transaction_date')
-
-    for transaction in transactions:
-        transaction.total_amount = transaction.quantity * transaction.price
-
+    try:
+        transactions, next_cursor = history_page(
+            transaction_history(user_profile), request.GET.get('cursor'),
+            getattr(settings, 'TRANSACTION_HISTORY_PAGE_SIZE', 50),
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
 
     context = {
         'transactions': transactions,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
     }
     return render(request, 'trading/transaction_history.html', context)
 
+@login_required
+def export_transactions_view(request):
+    """Streams the user's full transaction history as ?format=csv (default) or jsonl."""
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return HttpResponseBadRequest('format must be csv or jsonl.')
+    queryset = transaction_history(user_profile)
+    chunk_size = getattr(settings, 'TRANSACTION_EXPORT_CHUNK_SIZE', 2000)
+    if export_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(queryset, chunk_size), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(iter_json_lines(queryset, chunk_size), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="transactions.{export_format}"'
+    return response
+
 @login_required
 def get_stock_details(request, symbol):
-    """API endpoint to get current price and historical data for a stock."""
+    """API endpoint to get current price and historical data for a stock.
+
+    Optional query parameters: start/end (YYYY-MM-DD), interval (daily, weekly, monthly)
+    and points (maximum number of daily points, downsampled with LTTB).
+    """
     stock = get_object_or_404(Stock, symbol=symbol.upper())
-    current_price = fetch_current_price(stock.symbol)
+    try:
+        chart_options = _chart_options(request)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid chart parameters: {e}'}, status=400)
+    current_price = get_quote(stock.symbol)
     if current_price is None:
         return JsonResponse({'error': 'Could not fetch current price.'}, status=500)
 
-    latest_db_date = HistoricalPrice.objects.filter(stock=stock).order_by('-date').first()
-    today = datetime.now().date()
-    if not latest_db_date or (today - latest_db_date.date).days > 0: # Fetch if no data or data is old
-        historical_api_data = fetch_daily_historical_data(stock.symbol)
-        if historical_api_data:
-            # Save new historical data to DB
-            for data_point in historical_api_data:
-                # Use update_or_create to avoid duplicates on re-fetching
-                HistoricalPrice.objects.update_or_create(
-                    stock=stock,
-                    date=data_point['date'],
-                    defaults={
-                        'open_price': data_point['open_price'],
-                        'high_price': data_point['high_price'],
-                        'low_price': data_point['low_price'],
-                        'close_price': data_point['close_price'],
-                        'volume': data_point['volume'],
-                    }
-                )
-            print(f"Fetched and saved new historical data for {stock.symbol}")
-        else:
-            print(f"Failed to fetch historical data for {stock.symbol}")
-    historical_prices = HistoricalPrice.objects.filter(stock=stock).order_by('date')
-    chart_data = {
-        'labels': [p.date.strftime('%Y-%m-%d') for p in historical_prices],
-        'close_prices': [float(p.close_price) for p in historical_prices],
-    }
-    return JsonResponse({
+    if getattr(settings, 'SYNC_HISTORY_IN_REQUESTS', True):
+        sync_stock_history(stock) # Fetches only when a trading day is missing
+    return JsonResponse(_stock_details_payload(stock, current_price, chart_options))
+
+def _stock_details_payload(stock, current_price, chart_options):
+    return {
         'symbol': stock.symbol,
         'name': stock.name,
         'current_price': float(current_price),
-        'historical_data': chart_data
+        'historical_data': chart_data(stock, **chart_options)
+    }
+
+def _chart_options(request):
+    return parse_chart_options(request.GET, default_points=getattr(settings, 'CHART_DEFAULT_POINTS', 1000))
+
+def _money(value):
+    return None if value is None else round(float(value), 2)
+
+@login_required
+def quotes_view(request):
+    """API endpoint returning cached quotes for ?symbols=A,B,C in one request."""
+    symbols = list(dict.fromkeys(s.strip().upper() for s in request.GET.get('symbols', '').split(',') if s.strip()))
+    if not symbols:
+        return JsonResponse({'error': 'Pass one or more symbols, e.g. ?symbols=IBM,AAPL.'}, status=400)
+    max_symbols = getattr(settings, 'QUOTES_MAX_SYMBOLS', 100)
+    if len(symbols) > max_symbols:
+        return JsonResponse({'error': f'At most {max_symbols} symbols per request.'}, status=400)
+    known = set(Stock.objects.filter(symbol__in=symbols).values_list('symbol', flat=True))
+    prices = get_quotes(known) if known else {}
+    return JsonResponse({
+        'quotes': {symbol: _money(prices.get(symbol)) for symbol in symbols if symbol in known},
+        'unknown': [symbol for symbol in symbols if symbol not in known],
+    })
+
+@login_required
+def search_view(request):
+    """API endpoint for symbol autocomplete: ?q=ibm returns the best matching stocks from the in-memory index."""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(int(request.GET.get('limit', '')), getattr(settings, 'SEARCH_RESULTS_LIMIT', 10))
+    except ValueError:
+        limit = getattr(settings, 'SEARCH_RESULTS_LIMIT', 10)
+    results = get_symbol_index().search(query, limit)
+    return JsonResponse({
+        'query': query,
+        'results': [{'symbol': symbol, 'name': name} for symbol, name in results],
+    })
+
+@login_required
+def portfolio_view(request):
+    """API endpoint with server-side market value, equity and unrealized P&L for every holding."""
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    portfolio = value_portfolio(user_profile)
+    return JsonResponse({
+        'cash_balance': _money(portfolio['cash_balance']),
+        'reserved_cash': _money(portfolio['reserved_cash']),
+        'positions_value': _money(portfolio['positions_value']),
+        'total_equity': _money(portfolio['total_equity']),
+        'unrealized_pnl': _money(portfolio['unrealized_pnl']),
+        'positions': [
+            {
+                'symbol': position['symbol'],
+                'name': position['name'],
+                'quantity': position['quantity'],
+                'reserved_quantity': position['reserved_quantity'],
+                'price': _money(position['price']),
+                'market_value': _money(position['market_value']),
+                'cost_basis': _money(position['cost_basis']),
+                'unrealized_pnl': _money(position['unrealized_pnl']),
+            }
+            for position in portfolio['positions']
+        ],
+    })
+
+@login_required
+def portfolio_history_view(request):
+    """API endpoint with daily equity snapshots and cumulative time-weighted return.
+
+    Optional start/end (YYYY-MM-DD) limit the range; returns are measured from its first day.
+    Snapshots are written by the build_portfolio_snapshots management command.
+    """
+    user_profile = get_object_or_404(UserProfile, user=request.user)
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid date: {e}'}, status=400)
+    history = portfolio_history(user_profile, start, end)
+    return JsonResponse({
+        'snapshots': [
+            {
+                'date': row['date'].isoformat(),
+                'cash_balance': _money(row['cash_balance']),
+                'positions_value': _money(row['positions_value']),
+                'total_equity': _money(row['total_equity']),
+                'time_weighted_return': round(float(row['time_weighted_return']), 6),
+            }
+            for row in history
+        ],
+        'time_weighted_return': round(float(history[-1]['time_weighted_return']), 6) if history else None,
+    })
+
+def _json_floats(values):
+    """Array -> list for JsonResponse, with NaN (warm-up bars) as null."""
+    return [None if math.isnan(value) else round(value, 4) for value in values.tolist()]
+
+@login_required
+def indicators_view(request, symbol):
+    """API endpoint for a technical indicator over a stock's stored history.
+
+    ?name=sma|ema|rsi|macd|bollinger|volatility|drawdown plus that indicator's parameters
+    (e.g. window=50), and optional start/end (YYYY-MM-DD) to trim the returned range.
+    """
+    stock = get_object_or_404(Stock, symbol=symbol.upper())
+    params = request.GET.dict()
+    name = params.pop('name', 'sma')
+    start, end = params.pop('start', ''), params.pop('end', '')
+    try:
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+        outputs, series = get_indicator_engine().compute(stock.symbol, name, **params)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid indicator request: {e}'}, status=400)
+    window = series.between(start, end)
+    offset = int(np.searchsorted(series.days, window.days[0])) if len(window) else 0
+    return JsonResponse({
+        'symbol': stock.symbol,
+        'indicator': name,
+        'labels': np.datetime_as_string(window.dates).tolist(),
+        'values': {key: _json_floats(values[offset:offset + len(window)]) for key, values in outputs.items()},
     })
 
 def logout_view(request):
     auth_logout(request)
     return redirect('login')
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for this worker process's request metrics (see metrics.py).
+
+    Scrapers must send METRICS_TOKEN as "Authorization: Bearer <token>". Without a token
+    configured the endpoint doesn't exist (404): latencies and profiles aren't public.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        raise Http404('Metrics are disabled; set METRICS_TOKEN to enable them.')
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(get_metrics_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')